@@ -0,0 +1,195 @@
+"""Airport autocomplete: an in-memory prefix index over names, codes and aliases
+
+Every searchable term of an airport (IATA code, city, full label, each
+later word of a multi-word name, and its aliases from
+flight_utils.AIRPORT_ALIASES) is normalized into one sorted list, so a
+prefix lookup is two bisects. Suggestions rank by how they matched, then
+by route popularity (bookings and searches from the analytics tables).
+When the prefix finds too few airports, terms starting with one of the
+query's first two letters are tried with a bounded edit distance, so
+"Mumabi" or "dlehi" still find their airport.
+
+The index starts from flight_utils.AIRPORTS and is rebuilt from the
+airports table at most every AIRPORT_INDEX_REFRESH seconds; keystrokes in
+between never touch the database.
+"""
+import bisect
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from flight_utils import AIRPORT_ALIASES, AIRPORTS
+from search_engine import parse_airport
+
+REFRESH_SECONDS = float(os.environ.get('AIRPORT_INDEX_REFRESH', 300))
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+MAX_QUERY_LENGTH = 64
+
+# Match ranks, best first; a fuzzy match ranks FUZZY + its edit distance
+EXACT_CODE, EXACT_NAME, PREFIX, WORD_PREFIX, ALIAS, FUZZY = range(6)
+RANKS = {
+    # term kind: (rank when the query is the whole term, rank as a prefix)
+    'code': (EXACT_CODE, PREFIX),
+    'name': (EXACT_NAME, PREFIX),
+    'word': (WORD_PREFIX, WORD_PREFIX),
+    'alias': (ALIAS, ALIAS),
+}
+
+POPULARITY_SQL = '''
+    SELECT airport_id, SUM(n) FROM (
+        SELECT source_id AS airport_id, bookings AS n FROM analytics_routes
+        UNION ALL SELECT destination_id, bookings FROM analytics_routes
+        UNION ALL SELECT source_id, searches FROM analytics_searches
+        UNION ALL SELECT destination_id, searches FROM analytics_searches
+    )
+    GROUP BY airport_id
+'''
+
+
+def normalize(text):
+    """Lowercase, accents stripped, punctuation folded to single spaces"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in text).split())
+
+
+def max_typos(query):
+    """Edits tolerated for a query of this length"""
+    if len(query) < 3:
+        return 0
+    return 1 if len(query) < 6 else 2
+
+
+def prefix_distance(query, term, bound):
+    """Edit distance (with adjacent transpositions) from `query` to the closest prefix of `term`
+
+    Stops as soon as every prefix is known to be more than `bound` edits
+    away, and then returns bound + 1.
+    """
+    n = len(query)
+    before, row = None, list(range(n + 1))
+    best = row[n]
+    for i in range(1, min(len(term), n + bound) + 1):
+        current = [i] + [0] * n
+        for j in range(1, n + 1):
+            current[j] = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + (query[j - 1] != term[i - 1]))
+            if before is not None and j > 1 and query[j - 1] == term[i - 2] and query[j - 2] == term[i - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        best = min(best, current[n])
+        if min(current) > bound:
+            break
+        before, row = row, current
+    return best if best <= bound else bound + 1
+
+
+def _terms(airport):
+    """(normalized term, kind, display text) for everything that should find this airport"""
+    city, code = airport['city'], airport['code']
+    yield normalize(airport['label']), 'name', airport['label']
+    yield normalize(city), 'name', city
+    if code:
+        yield code.lower(), 'code', code
+    for word in normalize(city).split()[1:]:
+        yield word, 'word', city
+    for alias in AIRPORT_ALIASES.get(code, ()):
+        yield normalize(alias), 'alias', alias
+        for word in normalize(alias).split()[1:]:
+            yield word, 'alias', alias
+
+
+def static_airports():
+    """Airports from flight_utils.AIRPORTS, for serving before the first refresh"""
+    airports = []
+    for region, labels in AIRPORTS.items():
+        for label in labels:
+            city, code = parse_airport(label)
+            airports.append({'airport_id': None, 'code': code, 'city': city, 'label': label, 'region': region})
+    return airports
+
+
+class AirportIndex:
+    """Sorted-array prefix index, swapped atomically on each rebuild"""
+
+    def __init__(self, airports=None):
+        self._lock = threading.Lock()
+        self._built_at = float('-inf')
+        self._build(airports or static_airports(), {})
+
+    def _build(self, airports, popularity):
+        entries = sorted(
+            (term, kind, pos, display)
+            for pos, airport in enumerate(airports)
+            for term, kind, display in _terms(airport)
+            if term
+        )
+        ranked = [
+            dict(airport, popularity=popularity.get(airport['airport_id'], 0)) for airport in airports
+        ]
+        # One tuple so readers always see a consistent index
+        self._state = ([entry[0] for entry in entries], entries, ranked)
+
+    def refresh(self, connect):
+        """Rebuild from the database once REFRESH_SECONDS have passed; `connect` is only called then"""
+        if time.monotonic() - self._built_at < REFRESH_SECONDS:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is rebuilding; keep serving the current index
+        try:
+            conn = connect()
+            try:
+                airports = [dict(row) for row in conn.execute(
+                    'SELECT airport_id, code, city, label, region FROM airports')]
+                popularity = dict(conn.execute(POPULARITY_SQL).fetchall())
+            except sqlite3.Error as e:
+                print(f"Airport index Warning: refresh failed: {e}")
+            else:
+                self._build(airports or static_airports(), popularity)
+            self._built_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _range(self, keys, prefix):
+        return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + '\uffff')
+
+    def suggest(self, text, limit=DEFAULT_LIMIT):
+        """Best matching airports for what the user has typed so far"""
+        keys, entries, airports = self._state
+        query = normalize(text[:MAX_QUERY_LENGTH])
+        if not query:
+            return []
+
+        matches = {}  # airport position -> (rank, display text of the matching term)
+        lo, hi = self._range(keys, query)
+        for term, kind, pos, display in entries[lo:hi]:
+            rank = RANKS[kind][0 if term == query else 1]
+            if pos not in matches or rank < matches[pos][0]:
+                matches[pos] = (rank, display)
+
+        bound = max_typos(query)
+        if len(matches) < limit and bound:
+            for first in dict.fromkeys(query[:2]):
+                lo, hi = self._range(keys, first)
+                for term, kind, pos, display in entries[lo:hi]:
+                    if pos in matches and matches[pos][0] < FUZZY:
+                        continue
+                    distance = prefix_distance(query, term, bound)
+                    if distance <= bound and (pos not in matches or FUZZY + distance < matches[pos][0]):
+                        matches[pos] = (FUZZY + distance, display)
+
+        order = sorted(matches, key=lambda pos: (matches[pos][0], -airports[pos]['popularity'], airports[pos]['label']))
+        return [
+            {
+                'code': airports[pos]['code'],
+                'city': airports[pos]['city'],
+                'label': airports[pos]['label'],
+                'region': airports[pos]['region'],
+                'matched': matches[pos][1],
+            }
+            for pos in order[:limit]
+        ]
+
+
+index = AirportIndex()
@@ -0,0 +1,311 @@
+"""Materialized admin analytics: load factor, revenue and route popularity
+
+Small aggregate tables (per route, per airline, per cabin class) are kept
+up to date inside the transactions that create flights, move seats and
+book them, so the admin endpoints read a few hundred pre-summed rows
+instead of grouping the whole flights/bookings tables.
+
+Seat and flight counts cover the flights currently in the table (the
+archive job subtracts what it moves); bookings and revenue are lifetime
+totals that include archived bookings. Search counts are buffered in
+memory per worker and flushed on the scheduler tick.
+
+Rebuild from scratch with `python analytics.py --rebuild`.
+"""
+import argparse
+import os
+import threading
+
+import db
+
+FLUSH_MAX_ROUTES = int(os.environ.get('ANALYTICS_SEARCH_BUFFER', 5000))
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+INVENTORY_COLUMNS = ('flights', 'total_seats', 'available_seats')
+DEFAULT_AIRLINE = 'Standard Air'
+
+# Load factor is 1 - available/total over the group's current flights
+LOAD_FACTOR = 'ROUND(1.0 - CAST(r.available_seats AS REAL) / r.total_seats, 4)'
+
+# (aggregate table, key columns, matching expressions over flights)
+FLIGHT_GROUPS = [
+    ('analytics_routes', ('source_id', 'destination_id'), ('source_id', 'destination_id')),
+    ('analytics_airlines', ('airline',), ("COALESCE(airline, 'Standard Air')",)),
+]
+
+
+def _bump(conn, table, keys, **deltas):
+    """Add `deltas` to one aggregate row, creating it on first use"""
+    columns = [*keys, *deltas]
+    conn.execute(f'''
+        INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT({', '.join(keys)}) DO UPDATE SET
+            {', '.join(f'{c} = {c} + excluded.{c}' for c in deltas)}
+    ''', (*keys.values(), *deltas.values()))
+
+# ==================== INCREMENTAL UPDATES ====================
+
+def record_flights(conn, rows):
+    """Fold new (source_id, destination_id, airline, total_seats, available_seats) rows"""
+    routes, airlines = {}, {}
+    for source_id, destination_id, airline, total_seats, available_seats in rows:
+        for groups, key in ((routes, (source_id, destination_id)), (airlines, airline or DEFAULT_AIRLINE)):
+            flights, total, available = groups.get(key, (0, 0, 0))
+            groups[key] = (flights + 1, total + total_seats, available + available_seats)
+
+    # One upsert per route/airline however many flights the batch holds
+    for (source_id, destination_id), counts in routes.items():
+        _bump(conn, 'analytics_routes', {'source_id': source_id, 'destination_id': destination_id},
+              **dict(zip(INVENTORY_COLUMNS, counts)))
+    for airline, counts in airlines.items():
+        _bump(conn, 'analytics_airlines', {'airline': airline}, **dict(zip(INVENTORY_COLUMNS, counts)))
+
+
+def seats_changed(conn, flight, delta):
+    """available_seats of `flight` moved by `delta` (negative when seats are taken)"""
+    if not delta:
+        return
+    _bump(conn, 'analytics_routes', {'source_id': flight['source_id'], 'destination_id': flight['destination_id']},
+          available_seats=delta)
+    _bump(conn, 'analytics_airlines', {'airline': flight['airline'] or DEFAULT_AIRLINE}, available_seats=delta)
+
+
+def record_booking(conn, flight, booking_class, seats, total_price):
+    """Count one confirmed booking (call in the booking's transaction)"""
+    sales = {'bookings': 1, 'seats_sold': seats, 'revenue': total_price}
+    _bump(conn, 'analytics_routes', {'source_id': flight['source_id'], 'destination_id': flight['destination_id']},
+          **sales)
+    _bump(conn, 'analytics_airlines', {'airline': flight['airline'] or DEFAULT_AIRLINE}, **sales)
+    _bump(conn, 'analytics_classes', {'booking_class': booking_class or 'Economy'}, **sales)
+
+
+def forget_flights(conn, flight_ids):
+    """Subtract flights that are about to be deleted from the inventory counts"""
+    if not flight_ids:
+        return
+    marks = ','.join('?' * len(flight_ids))
+    for table, keys, exprs in FLIGHT_GROUPS:
+        for row in conn.execute(f'''
+            SELECT {', '.join(exprs)}, COUNT(*), SUM(total_seats), SUM(available_seats)
+            FROM flights WHERE flight_id IN ({marks}) AND source_id IS NOT NULL
+            GROUP BY {', '.join(exprs)}
+        ''', flight_ids).fetchall():
+            counts = row[len(keys):]
+            _bump(conn, table, dict(zip(keys, row)), **{c: -n for c, n in zip(INVENTORY_COLUMNS, counts)})
+        # A group with no flights and no sales left would not survive a rebuild either
+        conn.execute(f'DELETE FROM {table} WHERE flights = 0 AND bookings = 0')
+
+
+class SearchCounter:
+    """Per-worker search counts per route, written out in one short transaction"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, source_ids, destination_ids):
+        with self._lock:
+            for source_id in source_ids:
+                for destination_id in destination_ids:
+                    key = (source_id, destination_id)
+                    self._counts[key] = self._counts.get(key, 0) + 1
+            full = len(self._counts) >= FLUSH_MAX_ROUTES
+        # A flood of distinct routes is dropped rather than held without bound
+        if full:
+            self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._counts = {}
+
+    def flush(self, conn):
+        """Write buffered counts; returns the number of routes written"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+        db.begin_immediate(conn)
+        try:
+            conn.executemany('''
+                INSERT INTO analytics_searches (source_id, destination_id, searches) VALUES (?, ?, ?)
+                ON CONFLICT(source_id, destination_id) DO UPDATE SET searches = searches + excluded.searches
+            ''', [(s, d, n) for (s, d), n in counts.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                for key, n in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + n
+            raise
+        return len(counts)
+
+
+searches = SearchCounter()
+
+# ==================== REBUILD ====================
+
+PARTITION_SALES = '''
+    SELECT source_id, destination_id, COALESCE(airline, 'Standard Air'), COALESCE(booking_class, 'Economy'),
+           COUNT(*), SUM(seats_booked), SUM(total_price)
+    FROM bookings WHERE status = 'confirmed'
+    GROUP BY 1, 2, 3, 4
+'''
+
+
+def rebuild(conn):
+    """Recompute flight and booking aggregates from scratch (search counts are kept)
+
+    Each source table is read once: bookings (live, legacy archive and
+    every archive partition) are grouped by route/airline/class into a
+    temp table, and the three aggregate tables are rolled up from that
+    and one pass over flights.
+    """
+    import partitions
+
+    conn.execute('DROP TABLE IF EXISTS temp.analytics_sales')
+    conn.execute('''
+        CREATE TEMP TABLE analytics_sales AS
+        SELECT f.source_id, f.destination_id, COALESCE(f.airline, 'Standard Air') AS airline,
+               COALESCE(b.booking_class, 'Economy') AS booking_class,
+               COUNT(*) AS bookings, SUM(b.seats_booked) AS seats_sold, SUM(b.total_price) AS revenue
+        FROM bookings b JOIN flights f ON b.flight_id = f.flight_id
+        WHERE b.status = 'confirmed'
+        GROUP BY 1, 2, 3, 4
+        UNION ALL
+        SELECT s.airport_id, d.airport_id, COALESCE(a.airline, 'Standard Air'), COALESCE(a.booking_class, 'Economy'),
+               COUNT(*), SUM(a.seats_booked), SUM(a.total_price)
+        FROM bookings_archive a
+        JOIN airports s ON s.label = a.source
+        JOIN airports d ON d.label = a.destination
+        WHERE a.status = 'confirmed'
+        GROUP BY 1, 2, 3, 4
+    ''')
+    for month in partitions.months(conn):
+        conn.executemany('INSERT INTO temp.analytics_sales VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         partitions.query(conn, month, PARTITION_SALES))
+
+    conn.execute('DELETE FROM analytics_routes')
+    conn.execute('''
+        INSERT INTO analytics_routes (source_id, destination_id, flights, total_seats, available_seats)
+        SELECT source_id, destination_id, COUNT(*), SUM(total_seats), SUM(available_seats)
+        FROM flights WHERE source_id IS NOT NULL AND destination_id IS NOT NULL
+        GROUP BY source_id, destination_id
+    ''')
+    conn.execute('DELETE FROM analytics_airlines')
+    conn.execute('''
+        INSERT INTO analytics_airlines (airline, flights, total_seats, available_seats)
+        SELECT COALESCE(airline, 'Standard Air'), COUNT(*), SUM(total_seats), SUM(available_seats)
+        FROM flights WHERE source_id IS NOT NULL
+        GROUP BY 1
+    ''')
+    conn.execute('DELETE FROM analytics_classes')
+
+    for table, group in (('analytics_routes', ('source_id', 'destination_id')),
+                         ('analytics_airlines', ('airline',)),
+                         ('analytics_classes', ('booking_class',))):
+        keys = ', '.join(group)
+        # (the WHERE also lets SQLite parse ON CONFLICT after INSERT ... SELECT)
+        conn.execute(f'''
+            INSERT INTO {table} ({keys}, bookings, seats_sold, revenue)
+            SELECT {keys}, SUM(bookings), SUM(seats_sold), SUM(revenue)
+            FROM temp.analytics_sales WHERE source_id IS NOT NULL
+            GROUP BY {keys}
+            ON CONFLICT({keys}) DO UPDATE SET
+                bookings = excluded.bookings, seats_sold = excluded.seats_sold, revenue = excluded.revenue
+        ''')
+    conn.execute('DROP TABLE temp.analytics_sales')
+
+# ==================== QUERIES ====================
+
+ROUTE_LABELS = '''
+    FROM {table} r
+    JOIN airports s ON s.airport_id = r.source_id
+    JOIN airports d ON d.airport_id = r.destination_id
+'''
+
+
+def summary(conn):
+    """Network-wide totals"""
+    row = conn.execute('''
+        SELECT SUM(flights) AS flights, SUM(total_seats) AS total_seats,
+               SUM(available_seats) AS available_seats, SUM(bookings) AS bookings,
+               SUM(seats_sold) AS seats_sold, SUM(revenue) AS revenue
+        FROM analytics_airlines
+    ''').fetchone()
+    totals = {key: row[key] or 0 for key in row.keys()}
+    totals['load_factor'] = (round(1 - totals['available_seats'] / totals['total_seats'], 4)
+                             if totals['total_seats'] else None)
+    totals['searches'] = conn.execute('SELECT COALESCE(SUM(searches), 0) FROM analytics_searches').fetchone()[0]
+    return totals
+
+
+def load_factor(conn, by='route', limit=DEFAULT_LIMIT, ascending=False):
+    """Groups ordered by load factor (fullest first unless `ascending`)"""
+    direction = 'ASC' if ascending else 'DESC'
+    if by == 'airline':
+        query = f'''
+            SELECT r.airline, r.flights, r.total_seats, r.available_seats, {LOAD_FACTOR} AS load_factor
+            FROM analytics_airlines r WHERE r.total_seats > 0
+        '''
+    else:
+        query = f'''
+            SELECT s.label AS source, d.label AS destination, r.flights, r.total_seats, r.available_seats,
+                   {LOAD_FACTOR} AS load_factor
+            {ROUTE_LABELS.format(table='analytics_routes')}
+            WHERE r.total_seats > 0
+        '''
+    return [dict(row) for row in conn.execute(f'{query} ORDER BY load_factor {direction} LIMIT ?', (limit,))]
+
+
+def revenue(conn, by='route', limit=DEFAULT_LIMIT):
+    """Bookings, seats and revenue per route, airline or class, highest revenue first"""
+    if by == 'airline':
+        query = 'SELECT airline, bookings, seats_sold, revenue FROM analytics_airlines'
+    elif by == 'class':
+        query = 'SELECT booking_class, bookings, seats_sold, revenue FROM analytics_classes'
+    else:
+        query = f'''
+            SELECT s.label AS source, d.label AS destination, r.bookings, r.seats_sold, r.revenue
+            {ROUTE_LABELS.format(table='analytics_routes')}
+        '''
+    return [dict(row) for row in conn.execute(f'{query} WHERE bookings > 0 ORDER BY revenue DESC LIMIT ?',
+                                              (limit,))]
+
+
+def top_routes(conn, by='bookings', limit=DEFAULT_LIMIT):
+    """Most searched or most booked routes"""
+    if by == 'searches':
+        query = f'''
+            SELECT s.label AS source, d.label AS destination, r.searches
+            {ROUTE_LABELS.format(table='analytics_searches')}
+            ORDER BY r.searches DESC LIMIT ?
+        '''
+    else:
+        query = f'''
+            SELECT s.label AS source, d.label AS destination, r.bookings, r.seats_sold, r.revenue
+            {ROUTE_LABELS.format(table='analytics_routes')}
+            WHERE r.bookings > 0
+            ORDER BY r.bookings DESC LIMIT ?
+        '''
+    return [dict(row) for row in conn.execute(query, (limit,))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Admin analytics aggregates')
+    parser.add_argument('--db', default=db.DATABASE)
+    parser.add_argument('--rebuild', action='store_true', help='recompute the aggregates from scratch')
+    args = parser.parse_args()
+
+    conn = db.connect(args.db)
+    if args.rebuild:
+        db.begin_immediate(conn)
+        try:
+            rebuild(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    print(summary(conn))
+    conn.close()
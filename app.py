@@ -1,21 +1,51 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
 from datetime import datetime
+import json
 import os
+import threading
+
+import airport_index
+import analytics
+import bookings
+import db
+import fare_calendar
+import flight_import
+import group_commit
+import history
+import holds
+import http_cache
+import instrumentation
+import inventory
+import pagination
+import passwords
+import pricing
+import route_graph
+import schedule_snapshot
+import scheduler
+import schema
+import search_cache
+import search_engine
+import seat_stream
+import seatmap
+from db import DATABASE, get_db
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 CORS(app)
+instrumentation.init_app(app)
+db.init_app(app)
+http_cache.init_app(app)
+app.jinja_env.globals.update(seat_stream_enabled=lambda: seat_stream.enabled)
 
-DATABASE = 'flight_reservation.db'
-
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Bring existing databases up to the current schema; background maintenance
+# (pool top-up, archival; one leader across all workers) starts in each
+# worker on its first request
+if os.path.exists(DATABASE):
+    with db.pooled_connection() as conn:
+        schema.ensure_schema(conn)
+    scheduler.init_app(app)
 
 # ==================== AUTHENTICATION ROUTES ====================
 
@@ -35,8 +65,8 @@ def signup():
         if len(password) < 6:
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
         
-        # Hash password
-        password_hash = generate_password_hash(password)
+        # Hash password (in the bounded hash pool)
+        password_hash = passwords.hash_password(password)
         
         conn = get_db()
         cursor = conn.cursor()
@@ -62,9 +92,9 @@ def signup():
             
         except sqlite3.IntegrityError:
             return jsonify({'error': 'Email already registered'}), 400
-        finally:
-            conn.close()
             
+    except passwords.HashPoolBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -84,9 +114,12 @@ def login():
         
         cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
         user = cursor.fetchone()
-        conn.close()
         
-        if user and check_password_hash(user['password_hash'], password):
+        if user and passwords.verify_password(user['password_hash'], password):
+            # Re-hash with the current parameters while we have the plaintext
+            if passwords.needs_rehash(user['password_hash']):
+                passwords.upgrade_hash(conn, user['user_id'], user['password_hash'], password)
+            
             session['user_id'] = user['user_id']
             session['user_name'] = user['name']
             session['user_email'] = user['email']
@@ -104,6 +137,8 @@ def login():
         else:
             return jsonify({'error': 'Invalid email or password'}), 401
             
+    except passwords.HashPoolBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -131,6 +166,23 @@ def check_auth():
 
 # ==================== FLIGHT ROUTES ====================
 
+@app.route('/api/airports/suggest', methods=['GET'])
+def suggest_airports():
+    """Airport autocomplete by city, code or alias, served from memory without a query per keystroke"""
+    try:
+        limit = pagination.parse_limit(request.args.get('limit'), default=airport_index.DEFAULT_LIMIT,
+                                       maximum=airport_index.MAX_LIMIT)
+        airport_index.index.refresh(get_db)
+        airports = airport_index.index.suggest(request.args.get('q', ''), limit)
+        
+        response = jsonify({'airports': airports})
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response, 200
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/flights/search', methods=['GET'])
 def search_flights():
     """Search flights by source, destination, and date"""
@@ -150,31 +202,90 @@ def search_flights():
         if date < current_date_str:
              return jsonify({'flights': []}), 200
 
+        # If searching for today, only show future flights
+        after_time = current_time_str if date == current_date_str else None
+        
+        # Resolve free text to airport IDs; the ETag comes from their route/date version counters
         conn = get_db()
-        cursor = conn.cursor()
+        source_ids, destination_ids = search_engine.resolve_route(conn, source, destination)
+        stamp = http_cache.stamp(conn, http_cache.route_scopes(source_ids, destination_ids, date))
+        tag = http_cache.etag('search', sorted(source_ids), sorted(destination_ids), date, after_time, stamp)
+        if http_cache.is_fresh(tag):
+            return http_cache.not_modified(tag)
+        
+        if schedule_snapshot.ENABLED:
+            # This worker's in-memory schedule, caught up from the change log after the stamp was read
+            flights = schedule_snapshot.search(conn, source_ids, destination_ids, date, after_time)
+        else:
+            # Hit the cache or the route/date index
+            flights = search_cache.cache.search(conn, source, destination, date, after_time=after_time, version=stamp)
         
-        query = '''
-            SELECT * FROM flights
-            WHERE LOWER(source) LIKE LOWER(?)
-            AND LOWER(destination) LIKE LOWER(?)
-            AND date = ?
-            AND available_seats > 0
-        '''
-        params = [f'%{source}%', f'%{destination}%', date]
+        return http_cache.tagged(jsonify({'flights': flights}), tag), 200
         
-        # If searching for today, only show future flights
-        if date == current_date_str:
-            query += ' AND departure_time > ?'
-            params.append(current_time_str)
-            
-        query += ' ORDER BY departure_time'
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/flights/connections', methods=['GET'])
+def search_connections():
+    """Direct and connecting itineraries, ranked by total duration or price"""
+    try:
+        source = request.args.get('source', '').strip()
+        destination = request.args.get('destination', '').strip()
+        date = request.args.get('date', '').strip()
+        
+        if not source or not destination or not date:
+            return jsonify({'error': 'Source, destination, and date are required'}), 400
         
-        cursor.execute(query, tuple(params))
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
         
-        flights = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        try:
+            max_stops = min(max(int(request.args.get('max_stops', 1)), 0), route_graph.MAX_STOPS_LIMIT)
+            k = min(max(int(request.args.get('k', 5)), 1), route_graph.MAX_RESULTS_LIMIT)
+            min_connection = max(int(request.args.get('min_connection', route_graph.MIN_CONNECTION)), 0)
+            seats = max(int(request.args.get('seats', 1)), 1)
+        except ValueError:
+            return jsonify({'error': 'max_stops, k, min_connection and seats must be integers'}), 400
+        
+        rank = request.args.get('sort', 'duration')
+        if rank not in ('duration', 'price'):
+            return jsonify({'error': 'sort must be duration or price'}), 400
+        
+        conn = get_db()
+        source_ids, destination_ids = search_engine.resolve_route(conn, source, destination)
+        itineraries = route_graph.find_itineraries(
+            conn, source_ids, destination_ids, date, seats=seats,
+            max_stops=max_stops, k=k, rank=rank, min_connection=min_connection
+        )
         
-        return jsonify({'flights': flights}), 200
+        return jsonify({'itineraries': itineraries}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/fares/calendar', methods=['GET'])
+def fares_calendar():
+    """Cheapest fare and available flights per day of a month for a route"""
+    try:
+        source = request.args.get('source', '').strip()
+        destination = request.args.get('destination', '').strip()
+        month = request.args.get('month', '').strip()
+        
+        if not source or not destination or not month:
+            return jsonify({'error': 'Source, destination, and month are required'}), 400
+        
+        try:
+            fare_calendar.month_range(month)
+        except ValueError:
+            return jsonify({'error': 'month must be YYYY-MM'}), 400
+        
+        conn = get_db()
+        source_ids, destination_ids = search_engine.resolve_route(conn, source, destination)
+        days = fare_calendar.month_calendar(conn, source_ids, destination_ids, month)
+        
+        return jsonify({'month': month, 'days': days}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -185,12 +296,40 @@ def manage_flights():
     
     if request.method == 'GET':
         try:
+            filters = {
+                'source': request.args.get('source', '').strip(),
+                'destination': request.args.get('destination', '').strip(),
+                'date_from': request.args.get('date_from', '').strip(),
+                'date_to': request.args.get('date_to', '').strip(),
+                'airline': request.args.get('airline', '').strip(),
+            }
+            cursor_token = request.args.get('cursor')
+            after = pagination.decode_cursor(cursor_token, 3) if cursor_token else None
+            
+            # NDJSON mode streams every matching row with constant memory
+            if request.args.get('format') == 'ndjson':
+                limit = pagination.parse_limit(request.args.get('limit'), default=None, maximum=None)
+                return Response(stream_flights(filters, after, limit), mimetype='application/x-ndjson')
+            
+            limit = pagination.parse_limit(request.args.get('limit'))
             conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM flights ORDER BY date, departure_time')
-            flights = [dict(row) for row in cursor.fetchall()]
-            conn.close()
-            return jsonify({'flights': flights}), 200
+            tag = http_cache.etag('flights', request.query_string, http_cache.stamp(conn, ['flights']))
+            if http_cache.is_fresh(tag):
+                return http_cache.not_modified(tag)
+            
+            query, params = search_engine.listing_query(conn, after=after, limit=limit + 1, **filters)
+            flights = [dict(row) for row in conn.execute(query, params).fetchall()]
+            
+            # Fetched one extra row to know whether another page exists
+            next_cursor = None
+            if len(flights) > limit:
+                flights = flights[:limit]
+                last = flights[-1]
+                next_cursor = pagination.encode_cursor([last[c] for c in search_engine.LISTING_ORDER])
+            
+            return http_cache.tagged(jsonify({'flights': flights, 'next_cursor': next_cursor}), tag), 200
+        except pagination.CursorError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -200,27 +339,28 @@ def manage_flights():
             return jsonify({'error': 'Admin access required'}), 403
         
         try:
-            data = request.get_json()
-            
-            # Validation
-            required_fields = ['flight_number', 'source', 'destination', 'date', 
-                             'departure_time', 'arrival_time', 'price', 'total_seats']
-            for field in required_fields:
-                if not data.get(field):
-                    return jsonify({'error': f'{field} is required'}), 400
+            # Same checks as the bulk import; numbers may arrive as JSON strings
+            try:
+                data = flight_import.validate(request.get_json() or {})
+            except flight_import.RowError as e:
+                return jsonify({'error': str(e)}), 400
             
             conn = get_db()
             cursor = conn.cursor()
             
             try:
+                source_id = search_engine.get_or_create_airport(conn, data['source'])
+                destination_id = search_engine.get_or_create_airport(conn, data['destination'])
                 cursor.execute('''
-                    INSERT INTO flights (flight_number, source, destination, date, 
+                    INSERT INTO flights (flight_number, source, destination, source_id, destination_id, date, 
                                        departure_time, arrival_time, price, total_seats, available_seats)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     data['flight_number'],
                     data['source'],
                     data['destination'],
+                    source_id,
+                    destination_id,
                     data['date'],
                     data['departure_time'],
                     data['arrival_time'],
@@ -228,8 +368,15 @@ def manage_flights():
                     data['total_seats'],
                     data['total_seats']  # Initially all seats are available
                 ))
-                conn.commit()
                 flight_id = cursor.lastrowid
+                fare_calendar.record_flight(conn, source_id, destination_id, data['date'],
+                                            data['price'], data['total_seats'])
+                analytics.record_flights(conn, [(source_id, destination_id, None,
+                                                 data['total_seats'], data['total_seats'])])
+                http_cache.touch_flights(conn, [(source_id, destination_id, data['date'])])
+                pricing.reprice(conn, flight_id, flight_id)
+                conn.commit()
+                search_cache.cache.invalidate(source_id, destination_id, data['date'])
                 
                 return jsonify({
                     'message': 'Flight added successfully',
@@ -238,12 +385,97 @@ def manage_flights():
                 
             except sqlite3.IntegrityError:
                 return jsonify({'error': 'Flight number already exists'}), 400
-            finally:
-                conn.close()
                 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+@app.route('/api/flights/bulk', methods=['POST'])
+def import_flights():
+    """Bulk-load flights from a CSV or NDJSON body (admin only)"""
+    
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson' if request.mimetype == 'application/x-ndjson' else None
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)'}), 415
+    
+    try:
+        # The body is parsed as it streams in; it is never held in memory whole
+        rows = flight_import.read_rows(request.stream, fmt)
+        summary = flight_import.import_flights(get_db(), rows)
+        return jsonify(summary), 200 if not summary['failed'] else 207
+    
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Body must be UTF-8'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/flights/<int:flight_id>/seats', methods=['GET'])
+def flight_seats(flight_id):
+    """Seat availability for every cabin of a flight"""
+    try:
+        conn = get_db()
+        flight = conn.execute('SELECT flight_id FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+        if not flight:
+            return jsonify({'error': 'Flight not found'}), 404
+        
+        return jsonify({
+            'flight_id': flight_id,
+            'cabins': seatmap.get_seat_map(conn, flight_id)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/flights/<int:flight_id>/fares', methods=['GET'])
+def flight_fares(flight_id):
+    """Current fare of every cabin, as precomputed by the pricing job"""
+    try:
+        fares = pricing.flight_fares(get_db(), flight_id)
+        if fares is None:
+            return jsonify({'error': 'Flight not found'}), 404
+        
+        return jsonify({'flight_id': flight_id, 'fares': fares}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/flights/stream', methods=['GET'])
+def flight_stream():
+    """Server-sent seat-count and seat-map changes for the flights in ?ids="""
+    try:
+        try:
+            flight_ids = seat_stream.parse_ids(request.args.get('ids', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Sync workers would be held for the life of the stream; 204 tells EventSource not to reconnect
+        if not seat_stream.enabled:
+            return '', 204
+        
+        wake = threading.Event()
+        subscription = seat_stream.broadcaster.subscribe(get_db(), flight_ids, wake.set)
+        return Response(seat_stream.iter_events(subscription, wake), mimetype='text/event-stream',
+                        headers=seat_stream.HEADERS)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def stream_flights(filters, after, limit, batch_size=500):
+    """Yield flights as NDJSON lines, holding at most one batch in memory"""
+    # Runs after the request context is gone, so borrow a connection of our own
+    with db.pooled_connection() as conn:
+        query, params = search_engine.listing_query(conn, after=after, limit=limit, **filters)
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield ''.join(json.dumps(dict(row)) + '\n' for row in rows)
+
 # ==================== BOOKING ROUTES ====================
 
 @app.route('/api/bookings', methods=['POST'])
@@ -251,6 +483,90 @@ def create_booking():
     """Create a new booking with seat availability check"""
     
     # Check authentication
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login to book flights'}), 401
+    
+    try:
+        data = request.get_json()
+        
+        try:
+            if group_commit.ENABLED:
+                # Committed together with the other bookings that arrived in the same few ms
+                result, flight = group_commit.writer.submit(bookings.book, session['user_id'], data)
+            else:
+                conn = get_db()
+                db.begin_immediate(conn)
+                try:
+                    result, flight = bookings.book(conn, session['user_id'], data)
+                except Exception:
+                    conn.rollback()
+                    raise
+                conn.commit()
+        except bookings.BookingError as e:
+            return jsonify(e.to_dict()), e.status
+        
+        search_cache.cache.invalidate_flight(flight)
+        route_graph.on_seats_changed(flight['flight_id'], flight['available_seats'])
+        
+        return jsonify({
+            'message': 'Booking confirmed successfully',
+            'booking_id': result['booking_id'],
+            'total_price': result['total_price'],
+            'seats_booked': result['seats_booked']
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/bookings/batch', methods=['POST'])
+def create_bookings_batch():
+    """Create many bookings (across flights) in one transaction with per-item results"""
+    
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login to book flights'}), 401
+    
+    try:
+        data = request.get_json()
+        items = data.get('bookings')
+        atomic = bool(data.get('atomic', False))
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'bookings must be a non-empty list'}), 400
+        if len(items) > bookings.MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {bookings.MAX_BATCH_SIZE} bookings per batch'}), 400
+        
+        conn = get_db()
+        db.begin_immediate(conn)
+        try:
+            results, flights = bookings.book_batch(conn, session['user_id'], items, atomic)
+        except Exception:
+            conn.rollback()
+            raise
+        
+        failed = sum(1 for r in results if r['status'] != 201)
+        if atomic and failed:
+            # All or nothing: report the failing item, book none
+            conn.rollback()
+            return jsonify({'error': 'Batch rejected, no bookings were made', 'results': results}), 400
+        conn.commit()
+        
+        for flight in flights:
+            search_cache.cache.invalidate_flight(flight)
+            route_graph.on_seats_changed(flight['flight_id'], flight['available_seats'])
+        
+        return jsonify({
+            'booked': len(results) - failed,
+            'failed': failed,
+            'results': results
+        }), 200 if not failed else 207
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/holds', methods=['POST'])
+def create_hold():
+    """Hold seats on a flight for a few minutes while the user finishes booking"""
+    
     if 'user_id' not in session:
         return jsonify({'error': 'Please login to book flights'}), 401
     
@@ -258,98 +574,235 @@ def create_booking():
         data = request.get_json()
         flight_id = data.get('flight_id')
         seats_booked = data.get('seats_booked')
-        passenger_names = data.get('passenger_names', '')
         booking_class = data.get('booking_class', 'Economy')
-        seat_numbers = data.get('seat_numbers', '')
         
-        # Validation
         if not flight_id or not seats_booked:
             return jsonify({'error': 'Flight ID and number of seats are required'}), 400
         
         if seats_booked < 1:
             return jsonify({'error': 'At least 1 seat must be booked'}), 400
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Get flight details and check seat availability
-        cursor.execute('SELECT * FROM flights WHERE flight_id = ?', (flight_id,))
-        flight = cursor.fetchone()
-        
-        if not flight:
-            conn.close()
-            return jsonify({'error': 'Flight not found'}), 404
-        
-        # SEAT AVAILABILITY LOGIC
-        if flight['available_seats'] < seats_booked:
-            conn.close()
-            return jsonify({
-                'error': f'Not enough seats available. Only {flight["available_seats"]} seats remaining'
-            }), 400
-        
-        # Calculate total price with class multiplier
-        multiplier = 1.0
-        if booking_class == 'Business': multiplier = 2.5
-        elif booking_class == 'First': multiplier = 4.0
-        
-        total_price = (flight['price'] * multiplier) * seats_booked
+        try:
+            seats = seatmap.parse_seat_request(booking_class, data.get('seat_numbers', ''), seats_booked)
+        except seatmap.SeatError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Create booking
-        cursor.execute('''
-            INSERT INTO bookings (user_id, flight_id, seats_booked, passenger_names, total_price, booking_class, seat_numbers)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], flight_id, seats_booked, passenger_names, total_price, booking_class, seat_numbers))
+        conn = get_db()
+        db.begin_immediate(conn)
+        try:
+            hold, flight = holds.create_hold(conn, session['user_id'], flight_id, seats_booked, booking_class, seats)
+        except inventory.FlightNotFound as e:
+            conn.rollback()
+            return jsonify({'error': str(e)}), 404
+        except inventory.SoldOut as e:
+            conn.rollback()
+            return jsonify({'error': str(e), 'available_seats': e.available}), 400
+        except seatmap.SeatTaken as e:
+            conn.rollback()
+            return jsonify({'error': str(e), 'seat': e.seat}), 409
+        except seatmap.SeatError as e:
+            conn.rollback()
+            return jsonify({'error': str(e)}), 400
+        except holds.TooManyHolds as e:
+            conn.rollback()
+            return jsonify({'error': str(e)}), 429
+        conn.commit()
         
-        booking_id = cursor.lastrowid
+        search_cache.cache.invalidate_flight(flight)
+        route_graph.on_seats_changed(flight_id, flight['available_seats'])
         
-        # Update available seats
-        new_available_seats = flight['available_seats'] - seats_booked
-        cursor.execute('''
-            UPDATE flights
-            SET available_seats = ?
-            WHERE flight_id = ?
-        ''', (new_available_seats, flight_id))
+        return jsonify({'hold': holds.to_dict(hold)}), 201
         
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/holds/<hold_id>', methods=['DELETE'])
+def release_hold(hold_id):
+    """Give a hold's seats back before it expires"""
+    
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login to book flights'}), 401
+    
+    try:
+        conn = get_db()
+        db.begin_immediate(conn)
+        try:
+            flight = holds.release_hold(conn, hold_id, session['user_id'])
+        except holds.HoldNotFound as e:
+            conn.rollback()
+            return jsonify({'error': str(e)}), 404
         conn.commit()
-        conn.close()
         
-        return jsonify({
-            'message': 'Booking confirmed successfully',
-            'booking_id': booking_id,
-            'total_price': total_price,
-            'seats_booked': seats_booked
-        }), 201
+        if flight is not None:
+            search_cache.cache.invalidate_flight(flight)
+            route_graph.on_seats_changed(flight['flight_id'], flight['available_seats'])
+        
+        return jsonify({'message': 'Hold released'}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/bookings/history', methods=['GET'])
 def booking_history():
-    """Get user's booking history"""
+    """Get user's booking history, newest first, one keyset page at a time"""
     
     # Check authentication
     if 'user_id' not in session:
         return jsonify({'error': 'Please login to view bookings'}), 401
     
     try:
+        status = request.args.get('status') or None
+        if status and status not in history.STATUSES:
+            return jsonify({'error': f"status must be one of: {', '.join(history.STATUSES)}"}), 400
+        
+        cursor_token = request.args.get('cursor')
+        after = pagination.decode_cursor(cursor_token, len(history.HISTORY_ORDER)) if cursor_token else None
+        limit = pagination.parse_limit(request.args.get('limit'), default=history.DEFAULT_LIMIT,
+                                       maximum=history.MAX_LIMIT)
+        
         conn = get_db()
-        cursor = conn.cursor()
+        user_id = session['user_id']
+        tag = http_cache.etag('history', user_id, request.query_string,
+                              http_cache.stamp(conn, [http_cache.user_scope(user_id)]))
+        if http_cache.is_fresh(tag):
+            return http_cache.not_modified(tag)
+        
+        rows, next_key = history.history_page(conn, user_id, status, after, limit)
+        next_cursor = pagination.encode_cursor(next_key) if next_key else None
         
-        # SELECT * returns all updated columns including booking_class and seat_numbers
-        cursor.execute('''
-            SELECT b.*, f.flight_number, f.source, f.destination, f.date, 
-                   f.departure_time, f.arrival_time
-            FROM bookings b
-            JOIN flights f ON b.flight_id = f.flight_id
-            WHERE b.user_id = ?
-            ORDER BY b.booking_date DESC
-        ''', (session['user_id'],))
+        return http_cache.tagged(jsonify({'bookings': rows, 'next_cursor': next_cursor}), tag), 200
+        
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/bookings/upcoming', methods=['GET'])
+def upcoming_trips():
+    """Get user's upcoming confirmed trips, soonest first (no joins)"""
+    
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login to view bookings'}), 401
+    
+    try:
+        cursor_token = request.args.get('cursor')
+        after = pagination.decode_cursor(cursor_token, len(history.UPCOMING_ORDER)) if cursor_token else None
+        limit = pagination.parse_limit(request.args.get('limit'), default=history.DEFAULT_LIMIT,
+                                       maximum=history.MAX_LIMIT)
         
-        bookings = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        trips, next_key = history.upcoming_trips(get_db(), session['user_id'], after, limit)
+        next_cursor = pagination.encode_cursor(next_key) if next_key else None
         
-        return jsonify({'bookings': bookings}), 200
+        return jsonify({'trips': trips, 'next_cursor': next_cursor}), 200
         
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ==================== METRICS ====================
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker process (admin session or METRICS_TOKEN)"""
+    if not session.get('is_admin') and not instrumentation.scrape_authorized(request.headers):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return Response(instrumentation.render(), mimetype=instrumentation.CONTENT_TYPE)
+
+# ==================== ADMIN ROUTES ====================
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+def cache_stats():
+    """Search cache hit/miss counters (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        return jsonify(search_cache.cache.stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/snapshot-stats', methods=['GET'])
+def snapshot_stats():
+    """In-memory schedule snapshot size and memory use of this worker (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        return jsonify(schedule_snapshot.snapshot.stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/summary', methods=['GET'])
+def analytics_summary():
+    """Network-wide flights, seats, load factor, bookings, revenue and searches (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        conn = get_db()
+        # Include this worker's buffered searches
+        analytics.searches.flush(conn)
+        return jsonify(analytics.summary(conn)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/load-factor', methods=['GET'])
+def analytics_load_factor():
+    """Load factor per route or airline, fullest first (?order=asc for emptiest) (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        by = request.args.get('by', 'route')
+        if by not in ('route', 'airline'):
+            return jsonify({'error': 'by must be route or airline'}), 400
+        limit = pagination.parse_limit(request.args.get('limit'), default=analytics.DEFAULT_LIMIT,
+                                       maximum=analytics.MAX_LIMIT)
+        rows = analytics.load_factor(get_db(), by, limit, ascending=request.args.get('order') == 'asc')
+        return jsonify({'by': by, 'rows': rows}), 200
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/revenue', methods=['GET'])
+def analytics_revenue():
+    """Revenue per route, airline or booking class (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        by = request.args.get('by', 'route')
+        if by not in ('route', 'airline', 'class'):
+            return jsonify({'error': 'by must be route, airline or class'}), 400
+        limit = pagination.parse_limit(request.args.get('limit'), default=analytics.DEFAULT_LIMIT,
+                                       maximum=analytics.MAX_LIMIT)
+        return jsonify({'by': by, 'rows': analytics.revenue(get_db(), by, limit)}), 200
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/top-routes', methods=['GET'])
+def analytics_top_routes():
+    """Most booked (?by=bookings) or most searched (?by=searches) routes (admin only)"""
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        by = request.args.get('by', 'bookings')
+        if by not in ('bookings', 'searches'):
+            return jsonify({'error': 'by must be bookings or searches'}), 400
+        limit = pagination.parse_limit(request.args.get('limit'), default=analytics.DEFAULT_LIMIT,
+                                       maximum=analytics.MAX_LIMIT)
+        conn = get_db()
+        if by == 'searches':
+            analytics.searches.flush(conn)
+        return jsonify({'by': by, 'rows': analytics.top_routes(conn, by, limit)}), 200
+    except pagination.CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -398,29 +851,5 @@ if __name__ == '__main__':
     # Initialize database if it doesn't exist
     if not os.path.exists(DATABASE):
         print("Database not found. Please run 'python init_db.py' first.")
-    else:
-        # Maintain flight pool
-        try:
-            from flight_utils import generate_flights
-            conn = get_db()
-            cursor = conn.cursor()
-            
-            # Optional: Clear very old flights (e.g., older than yesterday) to keep DB clean
-            # cursor.execute("DELETE FROM flights WHERE date < date('now', '-1 day')")
-            # conn.commit()
-            
-            # Count valid future flights
-            cursor.execute("SELECT COUNT(*) FROM flights WHERE date >= date('now')")
-            count = cursor.fetchone()[0]
-            print(f"✈️ Current valid flights: {count}")
-            
-            if count < 500:
-                needed = 500 - count
-                print(f"⚠️ Flight pool low. Generering {needed} new flights...")
-                generate_flights(conn, needed)
-            
-            conn.close()
-        except Exception as e:
-            print(f"Server Startup Warning: Could not maintain flight pool: {e}")
 
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,298 @@
+"""ASGI entry point: the same Flask routes, with async I/O and a bounded read pool
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+Under `gunicorn app:app` a sync worker is busy for the whole life of a
+request, including trickling the body out to a slow client. Here every
+connection is a coroutine on the event loop: the request body is read
+and the response written asynchronously, and a thread is held only while
+the Flask view itself runs.
+
+GET requests to READ_PATHS run on a small pool of threads that each own
+a read-only SQLite connection (db.bind_thread_connection), so thousands
+of open keep-alive clients cost coroutines, not threads or connections.
+At most MAX_PENDING_READS may wait for that pool; past that, readers get
+an immediate 503 + Retry-After. Everything else (writes, pages, static
+files) runs on a separate pool with the usual pooled connections, so a
+burst of searches can never starve bookings.
+
+GET /api/flights/stream (server-sent seat changes) is the one route
+served natively: each open stream is a coroutine woken by the
+seat_stream broadcaster, so thousands of them hold no threads at all.
+Importing this module turns seat_stream.enabled on, so pages served
+from here open the stream.
+
+Other routes are not duplicated: both pools call the Flask WSGI app, so
+`gunicorn app:app` keeps working unchanged. No ASGI server is a hard
+dependency; install uvicorn (or any ASGI 3 server) to use this module.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import db
+import seat_stream
+from app import app as flask_app
+
+READ_THREADS = int(os.environ.get('ASGI_READ_THREADS', 8))
+WRITE_THREADS = int(os.environ.get('ASGI_WRITE_THREADS', 4))
+MAX_PENDING_READS = int(os.environ.get('ASGI_MAX_PENDING_READS', 2048))
+RETRY_AFTER = 1
+# Request bodies above this spill to a temp file (bulk flight imports)
+BODY_SPOOL_SIZE = 1024 * 1024
+
+READ_PATHS = frozenset({
+    '/api/flights/search',
+    '/api/flights/connections',
+    '/api/fares/calendar',
+    '/api/flights',
+    '/api/airports/suggest',
+    '/api/bookings/history',
+    '/api/bookings/upcoming',
+})
+
+
+def _open_read_connection():
+    """Executor initializer: give this thread its own read-only connection"""
+    db.bind_thread_connection(db.connect_readonly())
+
+
+def _subscribe(flight_ids, wake):
+    with db.pooled_connection() as conn:
+        return seat_stream.broadcaster.subscribe(conn, flight_ids, wake)
+
+# ==================== WSGI BRIDGE ====================
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI http scope"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The whole body is already buffered, so it can be read to EOF without a Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    """Run the Flask app on this thread: (status, headers, body chunks, streaming iterator or None)
+
+    Responses with a Content-Length are read out here in one go; only
+    streamed ones (NDJSON exports) hand back an iterator for the caller
+    to pull chunk by chunk.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    iterable = flask_app(environ, start_response)
+    status, headers = started
+    if any(name.lower() == 'content-length' for name, _ in headers):
+        try:
+            return status, headers, [b''.join(iterable)], None
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+    return status, headers, [], iterable
+
+
+def _next_chunk(iterator):
+    return next(iterator, None)
+
+
+def _close(iterable):
+    if hasattr(iterable, 'close'):
+        iterable.close()
+
+# ==================== ASGI APP ====================
+
+class AsgiApp:
+    """ASGI 3 callable serving the Flask app from two bounded thread pools"""
+
+    def __init__(self, read_threads=READ_THREADS, write_threads=WRITE_THREADS, max_pending=MAX_PENDING_READS):
+        self.max_pending = max_pending
+        self.pending_reads = 0
+        self.rejected = 0
+        self._pools = None
+        self._pool_sizes = (read_threads, write_threads)
+        self._lock = threading.Lock()
+
+    def _executors(self):
+        # Created on first use so a forking server builds them in each worker
+        if self._pools is None:
+            with self._lock:
+                if self._pools is None:
+                    read_threads, write_threads = self._pool_sizes
+                    self._pools = (
+                        ThreadPoolExecutor(read_threads, 'asgi-read', initializer=_open_read_connection),
+                        ThreadPoolExecutor(write_threads, 'asgi-write'),
+                    )
+        return self._pools
+
+    def shutdown(self):
+        if self._pools is not None:
+            for pool in self._pools:
+                pool.shutdown(wait=True)
+            self._pools = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._executors()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        read_pool, write_pool = self._executors()
+        if scope['path'] == seat_stream.STREAM_PATH and scope['method'] == 'GET':
+            await self.seat_stream(scope, receive, send, read_pool)
+            return
+        is_read = scope['method'] in ('GET', 'HEAD') and scope['path'] in READ_PATHS
+        if is_read and self.pending_reads >= self.max_pending:
+            self.rejected += 1
+            await self._busy(send)
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+
+            pool = read_pool if is_read else write_pool
+            loop = asyncio.get_running_loop()
+            if is_read:
+                self.pending_reads += 1
+            try:
+                status, headers, chunks, stream = await loop.run_in_executor(
+                    pool, _call_wsgi, _environ(scope, body))
+            finally:
+                if is_read:
+                    self.pending_reads -= 1
+        finally:
+            body.close()
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        if stream is None:
+            await send({'type': 'http.response.body', 'body': chunks[0] if chunks else b''})
+            return
+        try:
+            while True:
+                chunk = await loop.run_in_executor(pool, _next_chunk, stream)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await loop.run_in_executor(pool, _close, stream)
+
+    async def seat_stream(self, scope, receive, send, read_pool):
+        """Server-sent seat changes, woken by the broadcaster thread instead of holding a pool thread"""
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        try:
+            flight_ids = seat_stream.parse_ids(query.get('ids', [''])[0])
+        except ValueError as e:
+            await self._json(send, 400, {'error': str(e)})
+            return
+
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        subscription = await loop.run_in_executor(
+            read_pool, _subscribe, flight_ids, lambda: loop.call_soon_threadsafe(wake.set))
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+            headers += [(name.lower().encode(), value.encode()) for name, value in seat_stream.HEADERS.items()]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': f'retry: {seat_stream.RETRY_MS}\n\n'.encode(),
+                        'more_body': True})
+            while not subscription.overflowed and not disconnected.done():
+                events = subscription.drain()
+                if events:
+                    await send({'type': 'http.response.body', 'body': b''.join(events), 'more_body': True})
+                woken = asyncio.ensure_future(wake.wait())
+                done, _ = await asyncio.wait({woken, disconnected}, timeout=seat_stream.HEARTBEAT_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                wake.clear()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': seat_stream.HEARTBEAT, 'more_body': True})
+            if not disconnected.done():
+                # Fell too far behind: end the stream, EventSource reconnects with a fresh state
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await loop.run_in_executor(read_pool, seat_stream.broadcaster.unsubscribe, subscription)
+
+    async def _busy(self, send):
+        await self._json(send, 503, {'error': 'Server busy, please retry shortly'},
+                         [(b'retry-after', str(RETRY_AFTER).encode())])
+
+    async def _json(self, send, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                        *headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+seat_stream.enabled = True
+app = AsgiApp()
@@ -0,0 +1,144 @@
+"""Search tail latency vs concurrent clients: sync gunicorn (app:app) vs ASGI (asgi:app).
+
+Each mode runs the same number of worker processes on a fresh database.
+N keep-alive clients loop over /api/flights/search; a share of them are
+slow, trickling their request headers out over --slow-ms the way a
+phone on a bad link does. A sync worker is stuck reading such a request
+for the whole time, while under ASGI it is only a waiting coroutine, so
+the fast clients' p99 shows how much the slow ones cost everybody else.
+
+The ASGI mode needs uvicorn (`pip install uvicorn`) and is skipped without it.
+
+Usage: python -m benchmarks.bench_asgi [--workers 4] [--clients 16,256,1024] [--slow-share 0.25]
+"""
+import argparse
+import asyncio
+import importlib.util
+import random
+import resource
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from benchmarks.bench_login_storm import free_port, start_server
+from benchmarks.common import percentile, print_table, temp_database
+
+from flight_utils import AIRPORTS
+from init_db import init_database
+
+MODES = {
+    # mode: (gunicorn worker class, app)
+    'sync': ('sync', 'app:app'),
+    'asgi': ('uvicorn.workers.UvicornWorker', 'asgi:app'),
+}
+
+
+async def read_response(reader):
+    """Status of one HTTP/1.1 response, with its body consumed"""
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def client(port, slow_ms, deadline, samples, errors):
+    cities = [label.split(' (')[0] for label in AIRPORTS['Domestic']]
+    date = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        source, destination = random.sample(cities, 2)
+        query = urlencode({'source': source, 'destination': destination, 'date': date})
+        request = f'GET /api/flights/search?{query} HTTP/1.1\r\nHost: bench\r\nConnection: keep-alive\r\n'.encode()
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            if slow_ms:
+                # Trickle the headers out, holding whatever serves this connection
+                for part in (request, b'X-Slow: 1\r\n'):
+                    writer.write(part)
+                    await writer.drain()
+                    await asyncio.sleep(slow_ms / 2000)
+            else:
+                writer.write(request)
+            writer.write(b'\r\n')
+            await writer.drain()
+            status = await read_response(reader)
+            if samples is not None:
+                samples.append(time.perf_counter() - t0)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            # Sync gunicorn closes keep-alive connections; reconnect and carry on
+            errors['reconnect'] = errors.get('reconnect', 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def measure(port, clients, slow_share, slow_ms, duration):
+    samples, errors = [], {}
+    slow = int(clients * slow_share)
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        # Only the fast clients' latency is reported
+        client(port, slow_ms if i < slow else 0, deadline, None if i < slow else samples, errors)
+        for i in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        'fast_rps': len(samples) / elapsed,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'non_200': sum(v for k, v in errors.items() if k != 'reconnect'),
+        'reconnects': errors.get('reconnect', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4, help='worker processes in both modes')
+    parser.add_argument('--clients', default='16,256,1024')
+    parser.add_argument('--slow-share', type=float, default=0.25, help='fraction of clients that are slow')
+    parser.add_argument('--slow-ms', type=float, default=200.0, help='how long a slow client takes to send a request')
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    # Every client holds a socket
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    path = temp_database()
+    init_database(path)
+
+    rows = []
+    for mode, (worker_class, target) in MODES.items():
+        if mode == 'asgi' and importlib.util.find_spec('uvicorn') is None:
+            print('uvicorn is not installed; skipping the ASGI mode')
+            continue
+        port = free_port()
+        proc = start_server(path, port, args.workers, 1, extra=['-k', worker_class], target=target)
+        try:
+            for clients in (int(c) for c in args.clients.split(',')):
+                result = asyncio.run(measure(port, clients, args.slow_share, args.slow_ms, args.duration))
+                rows.append({'mode': mode, 'clients': clients, **result})
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print_table(f'Fast-client search latency, {args.workers} workers, {args.slow_share:.0%} slow clients', rows,
+                ['mode', 'clients', 'fast_rps', 'p50_ms', 'p99_ms', 'non_200', 'reconnects'])
+
+
+if __name__ == '__main__':
+    main()
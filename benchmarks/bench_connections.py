@@ -0,0 +1,55 @@
+"""Search throughput with per-request connections vs the pooled WAL layer.
+
+Usage: python -m benchmarks.bench_connections [--duration 5]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.common import print_table, run_concurrent, temp_database, use_database
+
+import db
+from app import app
+from flight_utils import AIRPORTS
+from init_db import init_database
+
+
+def search_worker(clients):
+    routes = AIRPORTS['Domestic'] + AIRPORTS['International']
+    date = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+
+    def work(index):
+        source, destination = random.sample(routes, 2)
+        resp = clients[index].get('/api/flights/search', query_string={
+            'source': source.split(' (')[0],
+            'destination': destination.split(' (')[0],
+            'date': date,
+        })
+        assert resp.status_code == 200
+    return work
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = temp_database()
+    init_database(path)
+    use_database(path)
+
+    rows = []
+    for mode, pool_size in (('per-request', 0), ('pooled', db.POOL_SIZE or 8)):
+        db.POOL_SIZE = pool_size
+        db._pool = None
+        for concurrency in (1, 4, 16):
+            clients = [app.test_client() for _ in range(concurrency)]
+            result = run_concurrent(search_worker(clients), concurrency, args.duration)
+            rows.append({'mode': mode, 'clients': concurrency, **result})
+
+    print_table('GET /api/flights/search', rows,
+                ['mode', 'clients', 'throughput', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Booking throughput: one transaction per request vs the group-commit writer.
+
+Clients book one seat at a time on random future flights through
+POST /api/bookings, with BOOKING_GROUP_COMMIT off (each request commits
+its own transaction) and on (group_commit.writer batches them).
+With --synchronous FULL every commit waits for an fsync, which is where
+sharing one commit across a batch pays off most.
+
+Usage: python -m benchmarks.bench_group_commit [--duration 5] [--clients 1,8,64]
+"""
+import argparse
+import random
+
+from benchmarks.common import print_table, run_concurrent, temp_database, use_database
+
+import db
+import group_commit
+from app import app
+from init_db import init_database
+
+
+def booking_worker(clients, flight_ids):
+    def work(index):
+        resp = clients[index].post('/api/bookings', json={
+            'flight_id': random.choice(flight_ids), 'seats_booked': 1, 'passenger_names': 'Bench'
+        })
+        # 400 = that flight sold out, still a full write attempt
+        assert resp.status_code in (201, 400), resp.get_json()
+    return work
+
+
+def logged_in_client():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--clients', default='1,8,64')
+    parser.add_argument('--synchronous', default=db.SYNCHRONOUS, help='NORMAL, or FULL for an fsync per commit')
+    args = parser.parse_args()
+    db.SYNCHRONOUS = args.synchronous
+    concurrencies = [int(c) for c in args.clients.split(',')]
+
+    path = temp_database()
+    init_database(path)
+    use_database(path)
+    # Enough connections that the pool is not what per-request commits wait on
+    db.POOL_SIZE = max(concurrencies)
+    with db.pooled_connection() as conn:
+        flight_ids = [row[0] for row in conn.execute(
+            "SELECT flight_id FROM flights WHERE date > date('now') AND available_seats > 0")]
+
+    rows = []
+    for mode, enabled in (('per-request', False), ('group', True)):
+        group_commit.ENABLED = enabled
+        for concurrency in concurrencies:
+            before = group_commit.writer.stats()
+            clients = [logged_in_client() for _ in range(concurrency)]
+            result = run_concurrent(booking_worker(clients, flight_ids), concurrency, args.duration)
+            after = group_commit.writer.stats()
+            batches = after['batches'] - before['batches']
+            rows.append({
+                'mode': mode,
+                'clients': concurrency,
+                **result,
+                'avg_batch': (after['items'] - before['items']) / batches if batches else 1.0,
+            })
+
+    print_table(f'POST /api/bookings (bookings/sec), synchronous={args.synchronous}', rows,
+                ['mode', 'clients', 'throughput', 'p50_ms', 'p99_ms', 'avg_batch'])
+
+
+if __name__ == '__main__':
+    main()
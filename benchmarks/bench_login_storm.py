@@ -0,0 +1,127 @@
+"""Search latency during a login storm: inline hashing vs the bounded hash pool.
+
+Starts gunicorn (sync workers) on a fresh database for each mode, measures
+search latency alone, then again while many clients hammer /api/login.
+
+Usage: python -m benchmarks.bench_login_storm [--workers 4] [--storm 16] [--duration 10]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from benchmarks.common import ROOT, percentile, print_table, temp_database
+
+from flight_utils import AIRPORTS
+from init_db import init_database
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(path, port, workers, hash_workers, extra=(), target='app:app'):
+    env = dict(os.environ, DATABASE=path, SCHEDULER_ENABLED='0', PASSWORD_HASH_WORKERS=str(hash_workers))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+         *extra, target],
+        cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/check-auth')
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def search_loop(port, stop, samples):
+    cities = [label.split(' (')[0] for label in AIRPORTS['Domestic']]
+    date = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        source, destination = random.sample(cities, 2)
+        query = urlencode({'source': source, 'destination': destination, 'date': date})
+        t0 = time.perf_counter()
+        conn.request('GET', f'/api/flights/search?{query}')
+        conn.getresponse().read()
+        samples.append(time.perf_counter() - t0)
+
+
+def login_loop(port, stop, outcomes, lock):
+    body = json.dumps({'email': 'admin@flight.com', 'password': 'admin123'})
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        conn.request('POST', '/api/login', body, {'Content-Type': 'application/json'})
+        resp = conn.getresponse()
+        resp.read()
+        with lock:
+            outcomes[resp.status] = outcomes.get(resp.status, 0) + 1
+        if resp.status == 503:
+            time.sleep(float(resp.getheader('Retry-After', 1)) / 10)
+
+
+def measure(port, searchers, storm, duration):
+    stop, lock = threading.Event(), threading.Lock()
+    samples, outcomes = [], {}
+    threads = [threading.Thread(target=search_loop, args=(port, stop, samples)) for _ in range(searchers)]
+    threads += [threading.Thread(target=login_loop, args=(port, stop, outcomes, lock)) for _ in range(storm)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        'searches': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'login_ok': outcomes.get(200, 0),
+        'login_503': outcomes.get(503, 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn sync workers')
+    parser.add_argument('--hash-workers', type=int, default=1, help='hash processes per worker in pooled mode')
+    parser.add_argument('--searchers', type=int, default=2)
+    parser.add_argument('--storm', type=int, default=16, help='concurrent login clients')
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    path = temp_database()
+    init_database(path)
+
+    rows = []
+    for mode, hash_workers in (('inline', 0), ('pooled', args.hash_workers)):
+        port = free_port()
+        proc = start_server(path, port, args.workers, hash_workers)
+        try:
+            for storm in (0, args.storm):
+                result = measure(port, args.searchers, storm, args.duration)
+                rows.append({'mode': mode, 'storm': storm, **result})
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print_table(f'Search latency with {args.workers} gunicorn workers', rows,
+                ['mode', 'storm', 'searches', 'p50_ms', 'p99_ms', 'login_ok', 'login_503'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Full repricing pass time vs flight count.
+
+`first` prices every future flight from scratch, `unchanged` is the
+steady-state pass where nothing moved (rows are compared but not
+written), and `1%_sold` reprices after seats were sold on 1% of flights.
+
+Usage: python -m benchmarks.bench_reprice [--sizes 100000,1000000]
+"""
+import argparse
+import time
+
+from benchmarks.common import print_table, temp_database
+
+import db
+import flight_utils
+import pricing
+import schema
+from init_db import init_database
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100000,1000000')
+    args = parser.parse_args()
+
+    rows = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        path = temp_database()
+        init_database(path)
+        conn = db.connect(path)
+        schema.ensure_schema(conn)
+        flight_utils.bulk_load(conn, size, seed=size, progress=False)
+
+        with conn:
+            conn.execute('DELETE FROM fares')
+        for label, prepare in (
+            ('first', None),
+            ('unchanged', None),
+            ('1%_sold', "UPDATE flights SET available_seats = available_seats / 4 WHERE flight_id % 100 = 0"),
+        ):
+            if prepare:
+                with conn:
+                    conn.execute(prepare)
+            seconds, batches = timed(pricing.reprice_all, conn)
+            rows.append({'flights': size, 'pass': label, 'seconds': seconds, 'batches_changed': batches})
+        conn.close()
+
+    print_table('Repricing every future flight', rows, ['flights', 'pass', 'seconds', 'batches_changed'])
+
+
+if __name__ == '__main__':
+    main()
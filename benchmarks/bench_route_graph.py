@@ -0,0 +1,61 @@
+"""Connecting-flight query latency on a synthetic 100k-flight schedule.
+
+Usage: python -m benchmarks.bench_route_graph [--flights 100000] [--queries 200]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, print_table
+
+from route_graph import RouteGraph
+
+
+def synthetic_schedule(graph, flights, airports=18, days=30):
+    start = date.today()
+    for flight_id in range(1, flights + 1):
+        source, destination = random.sample(range(1, airports + 1), 2)
+        dep = random.randrange(24 * 60)
+        graph.add_flight({
+            'flight_id': flight_id,
+            'source_id': source,
+            'destination_id': destination,
+            'date': (start + timedelta(days=random.randrange(days))).isoformat(),
+            'departure_time': f'{dep // 60:02d}:{dep % 60:02d}',
+            'arrival_time': f'{(dep + random.randint(90, 900)) % 1440 // 60:02d}:{dep % 60:02d}',
+            'price': float(random.randint(3000, 40000)),
+            'available_seats': random.randint(0, 180),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--flights', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    graph = RouteGraph()
+    t0 = time.perf_counter()
+    synthetic_schedule(graph, args.flights)
+    print(f'Built graph of {args.flights} flights in {time.perf_counter() - t0:.2f}s')
+
+    rows = []
+    for max_stops in (0, 1, 2):
+        for rank in ('duration', 'price'):
+            samples = []
+            for _ in range(args.queries):
+                source, destination = random.sample(range(1, 19), 2)
+                day = (date.today() + timedelta(days=random.randrange(28))).isoformat()
+                t0 = time.perf_counter()
+                graph.search([source], [destination], day, max_stops=max_stops, k=5, rank=rank)
+                samples.append(time.perf_counter() - t0)
+            rows.append({'max_stops': max_stops, 'rank': rank,
+                         'p50_ms': percentile(samples, 50) * 1000,
+                         'p99_ms': percentile(samples, 99) * 1000})
+
+    print_table('RouteGraph.search (k=5)', rows, ['max_stops', 'rank', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Search latency vs table size: legacy LIKE scan vs the airport-ID index.
+
+Usage: python -m benchmarks.bench_search_scaling [--sizes 1000,10000,100000,1000000,10000000]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, print_table, temp_database
+
+import db
+import flight_utils
+import schema
+import search_engine
+from flight_utils import AIRPORTS
+from init_db import init_database
+
+# NOT INDEXED stands in for the pre-airports schema, which had no secondary
+# indexes (ANALYZE would otherwise let SQLite skip-scan the new route index)
+LEGACY_QUERY = '''
+    SELECT * FROM flights NOT INDEXED
+    WHERE LOWER(source) LIKE LOWER(?)
+    AND LOWER(destination) LIKE LOWER(?)
+    AND date = ?
+    AND available_seats > 0
+    ORDER BY departure_time
+'''
+
+
+def fill_flights(conn, total, days=365):
+    """Top the flights table up to `total` synthetic rows"""
+    have = conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0]
+    if have < total:
+        flight_utils.bulk_load(conn, total - have, seed=have, end_day=days - 1, progress=False)
+
+
+def time_queries(fn, queries):
+    samples = []
+    for args in queries:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return percentile(samples, 50) * 1000, percentile(samples, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    path = temp_database()
+    init_database(path)
+    conn = db.connect(path)
+    schema.ensure_schema(conn)
+
+    cities = [label.split(' (')[0] for label in AIRPORTS['Domestic'] + AIRPORTS['International']]
+    rows = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        fill_flights(conn, size)
+        conn.execute('ANALYZE')
+        queries = [
+            (*random.sample(cities, 2), (date.today() + timedelta(days=random.randrange(30))).isoformat())
+            for _ in range(args.queries)
+        ]
+        legacy_p50, legacy_p99 = time_queries(
+            lambda s, d, day: conn.execute(LEGACY_QUERY, (f'%{s}%', f'%{d}%', day)).fetchall(), queries)
+        indexed_p50, indexed_p99 = time_queries(
+            lambda s, d, day: search_engine.search(conn, s, d, day), queries)
+        rows.append({'flights': size, 'like_p50_ms': legacy_p50, 'like_p99_ms': legacy_p99,
+                     'index_p50_ms': indexed_p50, 'index_p99_ms': indexed_p99})
+
+    print_table('Search latency by table size', rows,
+                ['flights', 'like_p50_ms', 'like_p99_ms', 'index_p50_ms', 'index_p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
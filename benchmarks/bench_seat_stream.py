@@ -0,0 +1,87 @@
+"""Seat stream fan-out: cost of one booking reaching N subscribers.
+
+Subscribes N in-process clients to the same flight, books a seat on it,
+and times the broadcaster poll that reads the change once and queues the
+encoded event for every subscriber. No sockets are involved; this is the
+per-change work the server does regardless of how streams are served.
+
+Usage: python -m benchmarks.bench_seat_stream [--subscribers 100,1000,10000]
+"""
+import argparse
+import base64
+import time
+
+from benchmarks.common import print_table, temp_database
+
+import db
+import inventory
+import schema
+import seat_stream
+import seatmap
+from init_db import init_database
+
+
+def free_seat(conn, flight_id):
+    """First unoccupied Economy seat (generated flights start partly sold)"""
+    cabin = seatmap.get_seat_map(conn, flight_id)['Economy']
+    occupied = base64.b64decode(cabin['occupied'])
+    index = next(i for i in range(cabin['seats']) if not occupied[i >> 3] & (1 << (i & 7)))
+    return seatmap.seat_label('Economy', index)
+
+
+def book_seat(conn, flight_id, seat):
+    db.begin_immediate(conn)
+    try:
+        inventory.reserve_seats(conn, flight_id, 1)
+        seatmap.claim_seats(conn, flight_id, 'Economy', [seat])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', default='100,1000,10000')
+    args = parser.parse_args()
+
+    path = temp_database()
+    init_database(path)
+    conn = db.connect(path)
+    schema.ensure_schema(conn)
+    flight_id = conn.execute(
+        "SELECT flight_id FROM flights WHERE date > date('now') ORDER BY available_seats DESC LIMIT 1").fetchone()[0]
+
+    rows = []
+    for count in sorted(int(s) for s in args.subscribers.split(',')):
+        # Long poll interval: the benchmark drives poll() itself
+        broadcaster = seat_stream.Broadcaster(poll_seconds=3600)
+        t0 = time.perf_counter()
+        subscriptions = [broadcaster.subscribe(conn, [flight_id], lambda: None) for _ in range(count)]
+        subscribe_seconds = time.perf_counter() - t0
+        for subscription in subscriptions:
+            subscription.drain()
+
+        book_seat(conn, flight_id, free_seat(conn, flight_id))
+        t0 = time.perf_counter()
+        broadcaster.poll(conn)
+        poll_seconds = time.perf_counter() - t0
+        delivered = sum(len(subscription.drain()) for subscription in subscriptions)
+
+        rows.append({
+            'subscribers': count,
+            'subscribe_us': subscribe_seconds / count * 1e6,
+            'fanout_ms': poll_seconds * 1e3,
+            'per_sub_us': poll_seconds / count * 1e6,
+            'delivered': delivered,
+        })
+        for subscription in subscriptions:
+            broadcaster.unsubscribe(subscription)
+    conn.close()
+
+    print_table('One booking fanned out to N subscribers', rows,
+                ['subscribers', 'subscribe_us', 'fanout_ms', 'per_sub_us', 'delivered'])
+
+
+if __name__ == '__main__':
+    main()
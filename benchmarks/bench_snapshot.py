@@ -0,0 +1,73 @@
+"""Route/date search from SQLite vs the in-memory schedule snapshot.
+
+For each size, loads the snapshot, reports its memory use (and what that
+comes to per million flights), then times the same random route/date
+lookups through search_engine.query_route and the snapshot, including
+the change-log poll the snapshot makes on every search.
+
+Usage: python -m benchmarks.bench_snapshot [--sizes 100000,1000000] [--lookups 20000]
+"""
+import argparse
+import time
+
+from benchmarks.common import percentile, print_table, temp_database
+
+import db
+import flight_utils
+import schedule_snapshot
+import schema
+import search_engine
+from init_db import init_database
+
+
+def time_lookups(fn, conn, routes):
+    samples = []
+    for source_id, destination_id, date in routes:
+        t0 = time.perf_counter()
+        fn(conn, [source_id], [destination_id], date)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        path = temp_database()
+        init_database(path)
+        conn = db.connect(path)
+        schema.ensure_schema(conn)
+        flight_utils.bulk_load(conn, size, seed=size, progress=False)
+
+        snapshot = schedule_snapshot.ScheduleSnapshot()
+        t0 = time.perf_counter()
+        snapshot.sync(conn)
+        load_seconds = time.perf_counter() - t0
+        stats = snapshot.stats()
+
+        routes = conn.execute('''
+            SELECT source_id, destination_id, date FROM flights
+            WHERE date >= date('now') ORDER BY random() LIMIT ?
+        ''', (args.lookups,)).fetchall()
+        for mode, fn in (('sqlite', search_engine.query_route), ('snapshot', snapshot.query_route)):
+            samples = time_lookups(fn, conn, routes)
+            rows.append({
+                'flights': stats['flights'],
+                'mode': mode,
+                'p50_us': percentile(samples, 50) * 1e6,
+                'p99_us': percentile(samples, 99) * 1e6,
+                'load_s': load_seconds if mode == 'snapshot' else 0.0,
+                'mb': stats['bytes']['total'] / 2 ** 20 if mode == 'snapshot' else 0.0,
+                'mb_per_m': stats['mb_per_million_flights'] if mode == 'snapshot' else 0.0,
+            })
+        conn.close()
+
+    print_table('Route/date search', rows, ['flights', 'mode', 'p50_us', 'p99_us', 'load_s', 'mb', 'mb_per_m'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+import time
+
+# Benchmarks drive their own databases; keep background maintenance out of the timings
+os.environ.setdefault('SCHEDULER_ENABLED', '0')
+
+# Run as `python -m benchmarks.<script>` from the project root, which puts the app modules on sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (milliseconds)"""
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_concurrent(worker, clients, duration):
+    """Call worker(client_index) in a loop from N threads for `duration` seconds"""
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+    start_barrier = threading.Barrier(clients)
+
+    def loop(index):
+        start_barrier.wait()
+        samples = latencies[index]
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            worker(index)
+            samples.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return summarize([s for samples in latencies for s in samples], elapsed)
+
+
+def temp_database(name='bench.db'):
+    """Path for a throwaway benchmark database"""
+    return os.path.join(tempfile.mkdtemp(prefix='flight-bench-'), name)
+
+
+def use_database(path):
+    """Point the app's connection layer at a benchmark database"""
+    import db
+    db.DATABASE = path
+    db._pool = None
+
+
+def print_table(title, rows, columns):
+    """Print results as a fixed-width table"""
+    print(f'\n{title}')
+    print('  '.join(f'{c:>12}' for c in columns))
+    for row in rows:
+        print('  '.join(
+            f'{row[c]:>12.1f}' if isinstance(row[c], float) else f'{row[c]:>12}'
+            for c in columns
+        ))
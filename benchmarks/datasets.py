@@ -0,0 +1,112 @@
+"""Seeded benchmark databases at several sizes, reused between runs.
+
+Usage: python -m benchmarks.datasets --profile medium [--data-dir .bench-data]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime
+
+from benchmarks.common import ROOT
+
+import analytics
+import db
+import flight_utils
+from init_db import init_database
+from werkzeug.security import generate_password_hash
+
+# name -> (flights, users, bookings)
+PROFILES = {
+    'small': (10_000, 10_000, 100_000),
+    'medium': (1_000_000, 100_000, 1_000_000),
+    'large': (10_000_000, 100_000, 5_000_000),
+}
+
+DEFAULT_DATA_DIR = os.path.join(ROOT, '.bench-data')
+PASSWORD = 'bench123'
+CHUNK = 100_000
+
+
+def dataset_path(profile, data_dir=DEFAULT_DATA_DIR):
+    return os.path.join(data_dir, f'{profile}.db')
+
+
+def seed_users(conn, count):
+    """bench1@bench.test ... benchN@bench.test, all sharing one password hash"""
+    password_hash = generate_password_hash(PASSWORD)
+    for start in range(1, count + 1, CHUNK):
+        conn.executemany('''
+            INSERT INTO users (name, email, password_hash) VALUES (?, ?, ?)
+        ''', [(f'Bench User {i}', f'bench{i}@bench.test', password_hash)
+              for i in range(start, min(start + CHUNK, count + 1))])
+        conn.commit()
+
+
+def seed_bookings(conn, count, rng):
+    """Bookings spread uniformly over users and flights"""
+    max_user = conn.execute('SELECT MAX(user_id) FROM users').fetchone()[0]
+    max_flight = conn.execute('SELECT MAX(flight_id) FROM flights').fetchone()[0]
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for start in range(0, count, CHUNK):
+        rows = []
+        for _ in range(min(CHUNK, count - start)):
+            seats = rng.randint(1, 3)
+            rows.append((rng.randint(1, max_user), rng.randint(1, max_flight), seats,
+                         'Economy', ', '.join(['Bench Passenger'] * seats), 5000.0 * seats, now))
+        conn.executemany('''
+            INSERT INTO bookings (user_id, flight_id, seats_booked, booking_class,
+                                  passenger_names, total_price, booking_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+
+def build(profile, data_dir=DEFAULT_DATA_DIR, seed=42):
+    """Create the profile's database from scratch; returns its path"""
+    flights, users, bookings = PROFILES[profile]
+    os.makedirs(data_dir, exist_ok=True)
+    path = dataset_path(profile, data_dir)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    init_database(path)
+    conn = db.connect(path)
+    conn.execute('PRAGMA synchronous=OFF')
+    try:
+        have = conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0]
+        if flights > have:
+            flight_utils.bulk_load(conn, flights - have, seed=seed, end_day=364)
+        print(f'  seeding {users:,} users and {bookings:,} bookings...')
+        seed_users(conn, users)
+        seed_bookings(conn, bookings, rng)
+        analytics.rebuild(conn)
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f'✅ {profile}: {flights:,} flights, {users:,} users, {bookings:,} bookings '
+          f'in {time.perf_counter() - started:.0f}s -> {path}')
+    return path
+
+
+def ensure(profile, data_dir=DEFAULT_DATA_DIR, rebuild=False):
+    """Path of the profile's database, building it on first use"""
+    path = dataset_path(profile, data_dir)
+    if rebuild or not os.path.exists(path):
+        build(profile, data_dir)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+    print(ensure(args.profile, args.data_dir, args.rebuild))
+
+
+if __name__ == '__main__':
+    main()
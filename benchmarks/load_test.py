@@ -0,0 +1,210 @@
+"""End-to-end load test: a search/history/booking mix against the WSGI app.
+
+Drives the real Flask app in-process with one test client (and one logged-in
+user) per thread, reports throughput and p50/p95/p99 per endpoint, writes
+the results as JSON and, given a baseline, exits 1 on any regression.
+
+Usage:
+    python -m benchmarks.load_test --profile small --output results.json
+    python -m benchmarks.load_test --profile small --baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --profile small --output benchmarks/baseline.json  # new baseline
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import datasets
+from benchmarks.common import print_table, summarize, use_database
+
+import search_cache
+from app import app
+from flight_utils import AIRPORTS
+
+# endpoint -> share of requests
+DEFAULT_MIX = {'search': 0.8, 'history': 0.1, 'booking': 0.1}
+
+# Statuses that are normal business outcomes rather than failures
+EXPECTED_STATUS = {
+    'search': {200},
+    'history': {200},
+    'booking': {201, 400, 409},  # sold out / seat already taken
+}
+
+
+def parse_mix(text):
+    """'search=80,history=10,booking=10' -> normalized shares"""
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        if name not in EXPECTED_STATUS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint: {name}')
+        mix[name] = float(weight)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+class Workload:
+    """Builds one request per call, drawn from the endpoint mix"""
+
+    def __init__(self, conn, mix, days=30):
+        self.mix = mix
+        self.cities = [label.split(' (')[0] for label in AIRPORTS['Domestic'] + AIRPORTS['International']]
+        today = datetime.now()
+        self.dates = [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(1, days + 1)]
+        self.max_user = conn.execute('SELECT MAX(user_id) FROM users').fetchone()[0]
+        self.flight_ids = [row[0] for row in conn.execute('''
+            SELECT flight_id FROM flights WHERE date BETWEEN ? AND ? AND available_seats > 0
+            ORDER BY RANDOM() LIMIT 10000
+        ''', (self.dates[0], self.dates[-1]))]
+
+    def pick(self, rng):
+        return rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def request(self, client, endpoint, rng):
+        if endpoint == 'search':
+            source, destination = rng.sample(self.cities, 2)
+            return client.get('/api/flights/search', query_string={
+                'source': source, 'destination': destination, 'date': rng.choice(self.dates),
+            })
+        if endpoint == 'history':
+            return client.get('/api/bookings/history')
+        row, column = rng.randint(1, 8), rng.choice('ABCDEF')
+        return client.post('/api/bookings', json={
+            'flight_id': rng.choice(self.flight_ids),
+            'seats_booked': 1,
+            'passenger_names': 'Load Test',
+            'booking_class': 'Economy',
+            'seat_numbers': f'{row}{column}',
+        })
+
+
+def run_load(workload, clients, duration, warmup=2.0, seed=0):
+    """Run the mix from N threads; returns {endpoint: summary} plus 'all'"""
+    samples = [[] for _ in range(clients)]
+    errors = [{} for _ in range(clients)]
+    start_barrier = threading.Barrier(clients + 1)
+    timing = {}
+
+    def loop(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = rng.randint(1, workload.max_user)
+            sess['user_name'] = 'Load Test'
+        start_barrier.wait()
+        while time.perf_counter() < timing['deadline']:
+            endpoint = workload.pick(rng)
+            t0 = time.perf_counter()
+            resp = workload.request(client, endpoint, rng)
+            elapsed = time.perf_counter() - t0
+            if t0 < timing['measure_from']:
+                continue
+            if resp.status_code in EXPECTED_STATUS[endpoint]:
+                samples[index].append((endpoint, elapsed))
+            else:
+                errors[index][endpoint] = errors[index].get(endpoint, 0) + 1
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    now = time.perf_counter()
+    timing['measure_from'] = now + warmup
+    timing['deadline'] = now + warmup + duration
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+
+    results = {}
+    flat = [s for per_client in samples for s in per_client]
+    for endpoint in workload.mix:
+        latencies = [elapsed for name, elapsed in flat if name == endpoint]
+        results[endpoint] = summarize(latencies, duration)
+        results[endpoint]['errors'] = sum(e.get(endpoint, 0) for e in errors)
+    results['all'] = summarize([elapsed for _, elapsed in flat], duration)
+    results['all']['errors'] = sum(sum(e.values()) for e in errors)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages: p95 above, or throughput below, baseline +/- tolerance"""
+    regressions = []
+    for endpoint, base in baseline['endpoints'].items():
+        current = results['endpoints'].get(endpoint)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {current['p95_ms']:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput {current['throughput']:.1f}/s "
+                               f"vs baseline {base['throughput']:.1f}/s")
+        if current['errors'] > base.get('errors', 0):
+            regressions.append(f"{endpoint}: {current['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(datasets.PROFILES), default='small')
+    parser.add_argument('--data-dir', default=datasets.DEFAULT_DATA_DIR)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='e.g. search=80,history=10,booking=10')
+    parser.add_argument('--no-cache', action='store_true', help='run with the search cache disabled')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='compare against this results JSON; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    path = datasets.ensure(args.profile, args.data_dir)
+    use_database(path)
+    search_cache.cache = search_cache.SearchCache(search_cache.make_backend('none' if args.no_cache else 'memory'))
+
+    import db
+    with db.pooled_connection() as conn:
+        workload = Workload(conn, args.mix)
+
+    endpoints = run_load(workload, args.clients, args.duration, args.warmup, args.seed)
+    results = {
+        'profile': args.profile,
+        'dataset': dict(zip(('flights', 'users', 'bookings'), datasets.PROFILES[args.profile])),
+        'clients': args.clients,
+        'duration': args.duration,
+        'mix': args.mix,
+        'search_cache': not args.no_cache,
+        'python': platform.python_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'endpoints': endpoints,
+    }
+
+    print_table(f'Load test: {args.profile}, {args.clients} clients, {args.duration:.0f}s',
+                [{'endpoint': name, **summary} for name, summary in endpoints.items()],
+                ['endpoint', 'requests', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'errors'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('profile') != args.profile:
+            print(f"\n⚠️ Baseline profile is {baseline.get('profile')}, this run is {args.profile}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\n❌ Regressions against baseline:')
+            for message in regressions:
+                print(f'  - {message}')
+            sys.exit(1)
+        print(f'\n✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+
+if __name__ == '__main__':
+    main()
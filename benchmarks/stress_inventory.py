@@ -0,0 +1,117 @@
+"""Multi-process booking stress test: many workers race for one flight's seats.
+
+Asserts that the flight is never oversold and reports throughput and p99.
+
+Usage: python -m benchmarks.stress_inventory [--processes 8] [--threads 4] [--bookings 4000] [--seats 1000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import threading
+import time
+from multiprocessing import Pool
+
+from benchmarks.common import percentile, temp_database, use_database
+
+
+def book_many(job):
+    """Worker process: fire `count` bookings at one flight from several threads"""
+    path, flight_id, count, threads, total_seats = job
+    use_database(path)
+    import seatmap
+    from app import app
+
+    # Spread bookings over the cabins by size, so the whole flight can sell out
+    cabins = seatmap.cabin_sizes(total_seats)
+    cabin_classes, weights = list(cabins), [seats for _, _, seats in cabins.values()]
+
+    latencies, outcomes = [], {'ok': 0, 'sold_out': 0, 'error': 0}
+    lock = threading.Lock()
+    per_thread = [count // threads + (1 if i < count % threads else 0) for i in range(threads)]
+
+    def run(n):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        for _ in range(n):
+            seats = random.randint(1, 3)
+            booking_class = random.choices(cabin_classes, weights)[0]
+            t0 = time.perf_counter()
+            resp = client.post('/api/bookings', json={
+                'flight_id': flight_id, 'seats_booked': seats, 'booking_class': booking_class,
+                'passenger_names': 'Stress Test'
+            })
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if resp.status_code == 201:
+                    outcomes['ok'] += 1
+                elif resp.status_code == 400:
+                    outcomes['sold_out'] += 1
+                else:
+                    outcomes['error'] += 1
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in per_thread]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--bookings', type=int, default=4000)
+    parser.add_argument('--seats', type=int, default=1000)
+    args = parser.parse_args()
+
+    path = temp_database()
+    from init_db import init_database
+    init_database(path)
+
+    conn = sqlite3.connect(path)
+    flight_id = conn.execute('SELECT flight_id FROM flights ORDER BY flight_id LIMIT 1').fetchone()[0]
+    conn.execute('UPDATE flights SET total_seats = ?, available_seats = ? WHERE flight_id = ?',
+                 (args.seats, args.seats, flight_id))
+    # Every seat free again, to match the reset counts (bookings are assigned seats from the map)
+    conn.execute('DELETE FROM seat_maps WHERE flight_id = ?', (flight_id,))
+    conn.commit()
+
+    share = args.bookings // args.processes
+    jobs = [(path, flight_id, share + (1 if i < args.bookings % args.processes else 0), args.threads, args.seats)
+            for i in range(args.processes)]
+
+    started = time.perf_counter()
+    with Pool(args.processes) as pool:
+        results = pool.map(book_many, jobs)
+    elapsed = time.perf_counter() - started
+
+    latencies = [s for samples, _ in results for s in samples]
+    outcomes = {k: sum(o[k] for _, o in results) for k in ('ok', 'sold_out', 'error')}
+
+    available = conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0]
+    booked, booking_rows = conn.execute(
+        'SELECT COALESCE(SUM(seats_booked), 0), COUNT(*) FROM bookings WHERE flight_id = ?', (flight_id,)
+    ).fetchone()
+    conn.close()
+
+    print(f'Processes x threads : {args.processes} x {args.threads} (pid {os.getpid()})')
+    print(f'Attempts            : {len(latencies)}  ok={outcomes["ok"]}  '
+          f'sold_out={outcomes["sold_out"]}  error={outcomes["error"]}')
+    print(f'Seats               : total={args.seats}  booked={booked}  available={available}')
+    print(f'Throughput          : {len(latencies) / elapsed:.1f} req/s')
+    print(f'Latency             : p50={percentile(latencies, 50) * 1000:.1f} ms  '
+          f'p99={percentile(latencies, 99) * 1000:.1f} ms')
+
+    assert available >= 0, 'available_seats went negative'
+    assert booked + available == args.seats, f'oversold: booked {booked} + available {available} != {args.seats}'
+    assert booking_rows == outcomes['ok'], 'booking rows do not match successful responses'
+    assert outcomes['error'] == 0, 'unexpected errors during stress run'
+    print('OK: zero oversell')
+
+
+if __name__ == '__main__':
+    main()
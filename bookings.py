@@ -0,0 +1,133 @@
+"""Booking creation shared by POST /api/bookings and POST /api/bookings/batch
+
+book() does the whole reserve -> claim seats -> price -> insert sequence
+inside the caller's write transaction and raises BookingError (with the
+HTTP status to answer) instead of returning responses, so a batch can run
+each item under a savepoint and keep going after a failed one.
+"""
+import analytics
+import fare_calendar
+import history
+import holds
+import http_cache
+import inventory
+import pricing
+import seatmap
+
+MAX_BATCH_SIZE = 500
+
+
+class BookingError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+    def to_dict(self):
+        return {'error': str(self), **self.details}
+
+
+def book(conn, user_id, data):
+    """Create one booking from a request payload; returns (result dict, flight row)
+
+    Must run inside a write transaction (see db.begin_immediate).
+    """
+    hold_id = data.get('hold_id')
+    passenger_names = data.get('passenger_names', '')
+
+    if hold_id:
+        # The hold already reserved and claimed the seats; it only has to be converted
+        try:
+            hold = holds.take_hold(conn, hold_id, user_id)
+        except holds.HoldNotFound as e:
+            raise BookingError(str(e), 410)
+        flight_id, seats_booked = hold['flight_id'], hold['seats']
+        booking_class, seat_numbers = hold['cabin_class'], hold['seat_numbers']
+        flight = conn.execute('SELECT * FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+        if flight is None:
+            raise BookingError('Flight not found', 404)
+    else:
+        flight_id = data.get('flight_id')
+        seats_booked = data.get('seats_booked')
+        booking_class = data.get('booking_class', 'Economy')
+
+        # Validation
+        if not flight_id or not seats_booked:
+            raise BookingError('Flight ID and number of seats are required')
+        if not isinstance(seats_booked, int) or seats_booked < 1:
+            raise BookingError('At least 1 seat must be booked')
+        try:
+            seats = seatmap.parse_seat_request(booking_class, data.get('seat_numbers', ''), seats_booked)
+        except seatmap.SeatError as e:
+            raise BookingError(str(e))
+
+        # SEAT AVAILABILITY LOGIC: check-and-decrement is one conditional UPDATE
+        try:
+            flight = inventory.reserve_seats(conn, flight_id, seats_booked)
+        except inventory.FlightNotFound as e:
+            raise BookingError(str(e), 404)
+        except inventory.SoldOut as e:
+            raise BookingError(str(e), 400, available_seats=e.available)
+
+        # Sold out: the day's cheapest fare / flight count changes
+        if flight['available_seats'] == 0:
+            fare_calendar.refresh_day(conn, flight['source_id'], flight['destination_id'], flight['date'])
+
+        # Claim the chosen seats (or the first free ones) in the same transaction
+        try:
+            if seats:
+                seatmap.claim_seats(conn, flight_id, booking_class, seats)
+            else:
+                seats = seatmap.claim_free_seats(conn, flight_id, booking_class, seats_booked)
+        except seatmap.SeatTaken as e:
+            raise BookingError(str(e), 409, seat=e.seat)
+        except seatmap.SeatError as e:
+            raise BookingError(str(e))
+        seat_numbers = ', '.join(seats)
+
+    # Fares are precomputed per class by the pricing job; booking only reads them
+    total_price = pricing.fare(conn, flight, booking_class) * seats_booked
+
+    cursor = conn.execute('''
+        INSERT INTO bookings (user_id, flight_id, seats_booked, passenger_names, total_price, booking_class, seat_numbers)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, flight_id, seats_booked, passenger_names, total_price, booking_class, seat_numbers))
+    booking_id = cursor.lastrowid
+    history.record_trip(conn, booking_id)
+    analytics.record_booking(conn, flight, booking_class, seats_booked, total_price)
+    http_cache.touch_user(conn, user_id)
+
+    return {
+        'booking_id': booking_id,
+        'flight_id': flight_id,
+        'total_price': total_price,
+        'seats_booked': seats_booked
+    }, flight
+
+
+def book_batch(conn, user_id, items, atomic=False):
+    """Book every item in one transaction, each under its own savepoint
+
+    Returns (per-item results, flights touched). With atomic=True any
+    failure rolls back the whole batch (the caller checks for errors and
+    rolls back); otherwise failed items are skipped and the rest commit.
+    """
+    results, flights = [], {}
+    for index, item in enumerate(items):
+        conn.execute('SAVEPOINT batch_item')
+        try:
+            if not isinstance(item, dict):
+                raise BookingError('Each booking must be an object')
+            result, flight = book(conn, user_id, item)
+        except BookingError as e:
+            conn.execute('ROLLBACK TO batch_item')
+            conn.execute('RELEASE batch_item')
+            results.append({'index': index, 'status': e.status, **e.to_dict()})
+            if atomic:
+                break
+            continue
+        conn.execute('RELEASE batch_item')
+        results.append({'index': index, 'status': 201, **result})
+        # Keep the last (lowest) availability seen per flight
+        flights[flight['flight_id']] = flight
+    return results, list(flights.values())
@@ -0,0 +1,73 @@
+"""Flight change log: which flights changed, in commit order, for in-memory copies to catch up
+
+Every write that changes a bookable flight's seats, fares or existence
+appends its flight_id here inside the same transaction (seat changes in
+inventory, new and repriced flights in pricing). seq only grows
+(AUTOINCREMENT), so MAX(seq) is a cheap version counter: a worker holding
+a copy of the schedule compares it with the last seq it applied and reads
+only the rows after it. A row with a NULL flight_id means "too much
+changed to list, reload everything" (bulk loads, mass repricing).
+
+The scheduler trims rows older than CHANGE_LOG_RETENTION; a copy that
+fell further behind than that reloads instead of replaying.
+"""
+import os
+import time
+
+import db
+
+RETENTION = float(os.environ.get('CHANGE_LOG_RETENTION', 3600))
+
+
+def record(conn, flight_ids):
+    """These flights changed; call inside the write transaction"""
+    now = time.time()
+    conn.executemany('INSERT INTO flight_changes (flight_id, changed_at) VALUES (?, ?)',
+                     [(flight_id, now) for flight_id in flight_ids])
+
+
+def record_query(conn, sql, params=()):
+    """Log every flight_id selected by `sql` (one column), without pulling them into Python"""
+    conn.execute(f'INSERT INTO flight_changes (flight_id, changed_at) SELECT changed.*, ? FROM ({sql}) AS changed',
+                 (time.time(), *params))
+
+
+def record_reset(conn):
+    """Everything may have changed; readers reload"""
+    record(conn, [None])
+
+
+def latest(conn):
+    """Newest seq (0 for an empty log)"""
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM flight_changes').fetchone()[0]
+
+
+def since(conn, seq):
+    """(newest seq, changed flight_ids) after `seq`; flight_ids is None when the caller must reload
+
+    That is the case after a reset row, or when rows after `seq` were
+    already trimmed.
+    """
+    oldest = conn.execute('SELECT MIN(seq) FROM flight_changes').fetchone()[0]
+    if oldest is not None and oldest > seq + 1:
+        return latest(conn), None
+    rows = conn.execute('SELECT seq, flight_id FROM flight_changes WHERE seq > ? ORDER BY seq', (seq,)).fetchall()
+    if not rows:
+        return seq, set()
+    flight_ids = {row[1] for row in rows}
+    return rows[-1][0], None if None in flight_ids else flight_ids
+
+
+def trim(conn, retention=RETENTION):
+    """Scheduler job: drop rows older than `retention` seconds, always keeping the newest"""
+    db.begin_immediate(conn)
+    try:
+        deleted = conn.execute('''
+            DELETE FROM flight_changes
+            WHERE changed_at < ? AND seq < (SELECT MAX(seq) FROM flight_changes)
+        ''', (time.time() - retention,)).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return deleted
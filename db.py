@@ -0,0 +1,222 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g
+
+DATABASE = os.environ.get('DATABASE', 'flight_reservation.db')
+
+# Pool tuning (per gunicorn worker process). DB_POOL_SIZE=0 disables pooling
+# and falls back to one fresh connection per request.
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+# FULL fsyncs the WAL on every commit; NORMAL only at checkpoints (a crash can lose the last commits, never corrupt)
+SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+STATEMENT_CACHE_SIZE = 256
+BEGIN_RETRIES = int(os.environ.get('DB_BEGIN_RETRIES', 8))
+BEGIN_BACKOFF = 0.005
+
+# Swapped for an instrumented subclass by instrumentation.init_app()
+CONNECTION_FACTORY = sqlite3.Connection
+
+
+def connect(database=None):
+    """Open a tuned SQLite connection"""
+    conn = sqlite3.connect(
+        database or DATABASE,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=CONNECTION_FACTORY
+    )
+    conn.row_factory = sqlite3.Row
+    configure_connection(conn)
+    return conn
+
+
+def connect_readonly(database=None):
+    """Open a tuned connection that refuses writes (PRAGMA query_only)"""
+    conn = connect(database)
+    conn.execute('PRAGMA query_only=ON')
+    return conn
+
+
+def configure_connection(conn):
+    """Apply per-connection pragmas"""
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={SYNCHRONOUS}')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+
+def is_busy(exc):
+    """True if an OperationalError is SQLITE_BUSY / SQLITE_LOCKED"""
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def begin_immediate(conn, retries=None):
+    """Start a write transaction, taking the writer lock up front
+
+    busy_timeout already waits inside SQLite; on top of that a busy BEGIN
+    is retried with jittered exponential backoff so a burst of writers
+    spreads out instead of failing together.
+    """
+    retries = BEGIN_RETRIES if retries is None else retries
+    delay = BEGIN_BACKOFF
+    for attempt in range(retries + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == retries:
+                raise
+            time.sleep(delay * (0.5 + random.random()))
+            delay = min(delay * 2, 0.5)
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections for a single process"""
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Check out a connection, opening one if the pool is not yet full"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return connect(self.database)
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError('Database connection pool exhausted')
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Connection owned by the current thread itself (see bind_thread_connection)
+_thread = threading.local()
+
+
+def get_pool():
+    """Get the pool for this process (recreated after a fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(DATABASE)
+                _pool_pid = pid
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection outside of a request (scripts, background work)"""
+    if POOL_SIZE <= 0:
+        conn = connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def bind_thread_connection(conn):
+    """Make get_db() on this thread return `conn` instead of borrowing from the pool
+
+    Used by executor threads that keep one connection for their whole
+    life, e.g. the read-only threads behind the ASGI read endpoints.
+    """
+    _thread.conn = conn
+
+
+def get_db():
+    """Get the database connection bound to the current app context"""
+    if 'db' not in g:
+        bound = getattr(_thread, 'conn', None)
+        if bound is not None:
+            g.db = bound
+        elif POOL_SIZE <= 0:
+            g.db = connect()
+        else:
+            g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    """Release the app context's connection back to the pool"""
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    if conn is getattr(_thread, 'conn', None):
+        # The thread keeps its connection; just end any read transaction left open
+        if conn.in_transaction:
+            conn.rollback()
+        return
+    if POOL_SIZE <= 0:
+        conn.close()
+    else:
+        get_pool().release(conn)
+
+
+def init_app(app):
+    """Register connection teardown on the Flask app"""
+    app.teardown_appcontext(close_db)
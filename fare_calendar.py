@@ -0,0 +1,109 @@
+"""Precomputed per-day fare calendar: cheapest fare and bookable flights per route/date
+
+Rows are maintained incrementally inside the same transactions that
+write flights: a new flight folds its price into the day's minimum, and
+a sell-out recomputes just that route/date from the route index. Prices
+are the current Economy fares (what search quotes and booking charges),
+so repricing recomputes the days whose fares it changed.
+"""
+import calendar
+from datetime import date as date_cls
+
+
+def record_flight(conn, source_id, destination_id, date, price, available_seats):
+    """Fold one newly inserted flight into its day (call before pricing it, which corrects the minimum)"""
+    if available_seats <= 0:
+        return
+    conn.execute('''
+        INSERT INTO fare_calendar (source_id, destination_id, date, min_price, flights_available)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(source_id, destination_id, date) DO UPDATE SET
+            min_price = MIN(min_price, excluded.min_price),
+            flights_available = flights_available + 1
+    ''', (source_id, destination_id, date, price))
+
+
+def record_flights(conn, rows):
+    """Fold many (source_id, destination_id, date, price, available_seats) rows"""
+    for row in rows:
+        record_flight(conn, *row)
+
+
+def refresh_day(conn, source_id, destination_id, date):
+    """Recompute one route/date from flights (used when availability drops to zero)"""
+    min_price, count = conn.execute('''
+        SELECT MIN(COALESCE(p.economy, f.price)), COUNT(*) FROM flights f LEFT JOIN fares p USING (flight_id)
+        WHERE f.source_id = ? AND f.destination_id = ? AND f.date = ? AND f.available_seats > 0
+    ''', (source_id, destination_id, date)).fetchone()
+    if count:
+        conn.execute('''
+            INSERT INTO fare_calendar (source_id, destination_id, date, min_price, flights_available)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(source_id, destination_id, date) DO UPDATE SET
+                min_price = excluded.min_price,
+                flights_available = excluded.flights_available
+        ''', (source_id, destination_id, date, min_price, count))
+    else:
+        conn.execute('''
+            DELETE FROM fare_calendar WHERE source_id = ? AND destination_id = ? AND date = ?
+        ''', (source_id, destination_id, date))
+
+
+def refresh_query(conn, sql, params=()):
+    """Recompute every route/date selected by `sql` (source_id, destination_id, date) in one statement
+
+    Only for changes that keep each day's bookable flights bookable
+    (repricing); a sell-out goes through refresh_day, which also drops
+    days left with nothing to book.
+    """
+    conn.execute(f'''
+        INSERT INTO fare_calendar (source_id, destination_id, date, min_price, flights_available)
+        SELECT f.source_id, f.destination_id, f.date, MIN(COALESCE(p.economy, f.price)), COUNT(*)
+        FROM ({sql}) AS changed
+        JOIN flights f ON f.source_id = changed.source_id AND f.destination_id = changed.destination_id
+                      AND f.date = changed.date
+        LEFT JOIN fares p ON p.flight_id = f.flight_id
+        WHERE f.available_seats > 0
+        GROUP BY f.source_id, f.destination_id, f.date
+        ON CONFLICT(source_id, destination_id, date) DO UPDATE SET
+            min_price = excluded.min_price,
+            flights_available = excluded.flights_available
+    ''', params)
+
+
+def rebuild(conn):
+    """Recompute the whole calendar in one pass over flights"""
+    conn.execute('DELETE FROM fare_calendar')
+    conn.execute('''
+        INSERT INTO fare_calendar (source_id, destination_id, date, min_price, flights_available)
+        SELECT f.source_id, f.destination_id, f.date, MIN(COALESCE(p.economy, f.price)), COUNT(*)
+        FROM flights f LEFT JOIN fares p USING (flight_id)
+        WHERE f.available_seats > 0 AND f.source_id IS NOT NULL AND f.destination_id IS NOT NULL
+        GROUP BY f.source_id, f.destination_id, f.date
+    ''')
+
+
+def month_range(month):
+    """First and last day ('YYYY-MM-DD') of a 'YYYY-MM' month"""
+    year, mon = (int(part) for part in month.split('-'))
+    last_day = calendar.monthrange(year, mon)[1]
+    return date_cls(year, mon, 1).isoformat(), date_cls(year, mon, last_day).isoformat()
+
+
+def month_calendar(conn, source_ids, destination_ids, month):
+    """Cheapest fare and flight count for each bookable day of a month"""
+    if not source_ids or not destination_ids:
+        return []
+    first, last = month_range(month)
+    first = max(first, date_cls.today().isoformat())
+
+    rows = conn.execute(f'''
+        SELECT date, MIN(min_price) AS min_price, SUM(flights_available) AS flights_available
+        FROM fare_calendar
+        WHERE source_id IN ({','.join('?' * len(source_ids))})
+        AND destination_id IN ({','.join('?' * len(destination_ids))})
+        AND date BETWEEN ? AND ?
+        GROUP BY date
+        ORDER BY date
+    ''', (*source_ids, *destination_ids, first, last)).fetchall()
+    return [dict(row) for row in rows]
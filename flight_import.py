@@ -0,0 +1,196 @@
+"""Bulk flight import from streamed CSV or NDJSON (airline schedule feeds)
+
+Rows are parsed as the request body streams in and inserted with
+executemany in chunked transactions. Bad rows (missing fields, bad
+values, duplicate flight numbers) are reported by row number and skipped;
+they never abort the rest of the load.
+"""
+import csv
+import io
+import json
+import math
+import re
+import sqlite3
+from datetime import date as date_cls
+
+import analytics
+import db
+import fare_calendar
+import http_cache
+import pricing
+import search_engine
+
+REQUIRED_FIELDS = ['flight_number', 'source', 'destination', 'date',
+                   'departure_time', 'arrival_time', 'price', 'total_seats']
+CHUNK_SIZE = 1000
+MAX_ERRORS = 1000
+
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
+INSERT_SQL = '''
+    INSERT INTO flights (flight_number, airline, aircraft, source, destination, source_id, destination_id,
+                         date, departure_time, arrival_time, price, total_seats, available_seats)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class RowError(ValueError):
+    """A single import row that cannot be loaded"""
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict) from a binary body stream; fmt is 'csv' or 'ndjson'"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        yield number, row if isinstance(row, dict) else None
+
+
+def validate(row):
+    """Normalized values for one row; raises RowError"""
+    if row is None:
+        raise RowError('Malformed row')
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, ''):
+            raise RowError(f'{field} is required')
+    try:
+        date_cls.fromisoformat(str(row['date']))
+    except ValueError:
+        raise RowError('date must be YYYY-MM-DD')
+    for field in ('departure_time', 'arrival_time'):
+        if not TIME_PATTERN.match(str(row[field])):
+            raise RowError(f'{field} must be HH:MM')
+    try:
+        price = float(row['price'])
+        total_seats = int(row['total_seats'])
+    except (TypeError, ValueError):
+        raise RowError('price and total_seats must be numbers')
+    # float() accepts 'nan' and 'inf', which would only fail at INSERT time
+    if not math.isfinite(price) or price <= 0 or total_seats < 1:
+        raise RowError('price must be > 0 and total_seats >= 1')
+    return {
+        'flight_number': str(row['flight_number']).strip(),
+        'airline': row.get('airline') or 'Standard Air',
+        'aircraft': row.get('aircraft') or 'Boeing 737',
+        'source': str(row['source']).strip(),
+        'destination': str(row['destination']).strip(),
+        'date': str(row['date']),
+        'departure_time': str(row['departure_time']),
+        'arrival_time': str(row['arrival_time']),
+        'price': price,
+        'total_seats': total_seats,
+    }
+
+
+def _existing_numbers(conn, numbers):
+    numbers = list(numbers)
+    taken = set()
+    for i in range(0, len(numbers), 500):
+        part = numbers[i:i + 500]
+        taken.update(row[0] for row in conn.execute(
+            f"SELECT flight_number FROM flights WHERE flight_number IN ({','.join('?' * len(part))})", part))
+    return taken
+
+
+def _load_chunk(conn, chunk, airport_ids, errors):
+    """Insert one chunk of (row number, values) in its own transaction; returns routes touched
+
+    Row errors are added to `errors` only if the chunk commits.
+    """
+    created, rejected = [], []
+    db.begin_immediate(conn)
+    try:
+        # Duplicates are found up front so executemany never trips over one
+        taken = _existing_numbers(conn, {values['flight_number'] for _, values in chunk})
+        rows, calendar_rows, seen = [], [], set()
+        for number, values in chunk:
+            flight_number = values['flight_number']
+            if flight_number in taken or flight_number in seen:
+                rejected.append((number, f'Flight number {flight_number} already exists'))
+                continue
+            seen.add(flight_number)
+            for label in (values['source'], values['destination']):
+                if label not in airport_ids:
+                    airport_ids[label] = search_engine.get_or_create_airport(conn, label)
+                    created.append(label)
+            source_id, destination_id = airport_ids[values['source']], airport_ids[values['destination']]
+            rows.append((flight_number, values['airline'], values['aircraft'], values['source'],
+                         values['destination'], source_id, destination_id, values['date'],
+                         values['departure_time'], values['arrival_time'], values['price'],
+                         values['total_seats'], values['total_seats']))
+            calendar_rows.append((source_id, destination_id, values['date'], values['price'], values['total_seats']))
+
+        before = pricing.max_flight_id(conn)
+        conn.executemany(INSERT_SQL, rows)
+        fare_calendar.record_flights(conn, calendar_rows)
+        pricing.price_new_flights(conn, before)
+        analytics.record_flights(conn, [(r[5], r[6], r[1], r[11], r[12]) for r in rows])
+        http_cache.touch_flights(conn, [(r[0], r[1], r[2]) for r in calendar_rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Airports created in this chunk were rolled back with it
+        for label in created:
+            airport_ids.pop(label, None)
+        raise
+    errors.extend(rejected)
+    return len(rows), {(r[0], r[1], r[2]) for r in calendar_rows}
+
+
+def import_flights(conn, rows, chunk_size=CHUNK_SIZE):
+    """Load (row number, dict) pairs; returns a summary with per-row errors"""
+    from search_cache import cache
+
+    airport_ids, errors, chunk = {}, [], []
+    inserted = total = 0
+    routes = set()
+
+    def flush():
+        nonlocal inserted
+        try:
+            results = [_load_chunk(conn, chunk, airport_ids, errors)]
+        except sqlite3.IntegrityError:
+            # A row the database refuses sinks its whole chunk; load that chunk row by row to isolate it
+            results = []
+            for number, values in chunk:
+                try:
+                    results.append(_load_chunk(conn, [(number, values)], airport_ids, errors))
+                except sqlite3.IntegrityError as e:
+                    errors.append((number, f'Rejected by the database: {e}'))
+        for count, touched in results:
+            inserted += count
+            routes.update(touched)
+        chunk.clear()
+
+    for number, row in rows:
+        total += 1
+        try:
+            chunk.append((number, validate(row)))
+        except RowError as e:
+            errors.append((number, str(e)))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    for source_id, destination_id, date in routes:
+        cache.invalidate(source_id, destination_id, date)
+
+    errors.sort()
+    return {
+        'rows': total,
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': [{'row': number, 'error': message} for number, message in errors[:MAX_ERRORS]],
+        'errors_truncated': len(errors) > MAX_ERRORS,
+    }
@@ -1,6 +1,8 @@
+import argparse
 import random
-from datetime import datetime, timedelta
 import sqlite3
+import time
+from datetime import datetime, timedelta
 
 AIRLINES_DATA = [
     {"name": "Air India", "code": "AI", "models": ["Boeing 787 Dreamliner", "Boeing 777-300ER", "Airbus A321neo"]},
@@ -27,78 +29,289 @@ AIRPORTS = {
     ]
 }
 
-def generate_flights(conn, count=100):
+# Other names people type for an airport (by IATA code), used by autocomplete
+AIRPORT_ALIASES = {
+    "DEL": ["New Delhi", "Indira Gandhi"],
+    "BOM": ["Bombay", "Chhatrapati Shivaji"],
+    "BLR": ["Bengaluru", "Kempegowda"],
+    "MAA": ["Madras"],
+    "CCU": ["Calcutta", "Netaji Subhas Chandra Bose"],
+    "HYD": ["Secunderabad", "Rajiv Gandhi"],
+    "PNQ": ["Poona"],
+    "GOI": ["Dabolim", "Panaji"],
+    "AMD": ["Amdavad", "Sardar Vallabhbhai Patel"],
+    "DXB": ["UAE"],
+    "LHR": ["Heathrow"],
+    "JFK": ["NYC", "New York City", "John F Kennedy"],
+    "SIN": ["Changi"],
+    "BKK": ["Suvarnabhumi", "Krung Thep"],
+    "CDG": ["Charles de Gaulle"],
+    "HND": ["Haneda"],
+}
+
+DOMESTIC_AIRLINES = ["Air India", "IndiGo", "Vistara", "SpiceJet", "Akasa Air"]
+
+# Per-category fare/duration model (base price, min minutes, max minutes)
+ROUTE_PROFILES = {
+    "Domestic": (3000, 90, 180),
+    "International": (15000, 240, 900),
+}
+
+SEAT_CONFIGS = [150, 180, 220, 300]
+DEPARTURE_MINUTES = [h * 60 + m for h in range(24) for m in (0, 15, 30, 45)]
+CLOCK = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+
+INSERT_FLIGHT_SQL = '''
+    INSERT INTO flights (flight_number, airline, aircraft, source, destination, source_id, destination_id, date, departure_time, arrival_time, price, total_seats, available_seats)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# ==================== FLIGHT NUMBERS ====================
+
+class FlightNumberAllocator:
+    """Hands out never-reused flight numbers per airline code
+
+    The next serial for each code lives in flight_number_seq and is first
+    seeded from the highest numeric suffix already in flights, so generated
+    numbers never collide with older generated ones. Numbers entered by
+    hand can still land on a future serial; _insert_batch() checks each
+    batch against the unique index and renumbers those rows.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.next_serial = {
+            row[0]: row[1] for row in conn.execute('SELECT airline_code, next_serial FROM flight_number_seq')
+        }
+
+    def _seed(self, code):
+        # flight_number is UNIQUE, so this prefix range is an index range scan
+        upper = code[:-1] + chr(ord(code[-1]) + 1)
+        highest = 99
+        for (number,) in self.conn.execute(
+                'SELECT flight_number FROM flights WHERE flight_number >= ? AND flight_number < ?', (code, upper)):
+            suffix = number[len(code):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest + 1
+
+    def take(self, code):
+        if code not in self.next_serial:
+            self.next_serial[code] = self._seed(code)
+        serial = self.next_serial[code]
+        self.next_serial[code] = serial + 1
+        return f"{code}{serial}"
+
+    def save(self):
+        """Persist the sequence (call inside the inserting transaction)"""
+        self.conn.executemany('''
+            INSERT INTO flight_number_seq (airline_code, next_serial) VALUES (?, ?)
+            ON CONFLICT(airline_code) DO UPDATE SET next_serial = excluded.next_serial
+        ''', list(self.next_serial.items()))
+
+    def existing(self, numbers, chunk=500):
+        """Which of `numbers` are already taken in flights"""
+        taken = set()
+        for i in range(0, len(numbers), chunk):
+            part = numbers[i:i + chunk]
+            taken.update(row[0] for row in self.conn.execute(
+                f"SELECT flight_number FROM flights WHERE flight_number IN ({','.join('?' * len(part))})", part))
+        return taken
+
+# ==================== GENERATION ====================
+
+def _airline_choices(airlines):
+    """(airline, aircraft) combos weighted so each airline is equally likely"""
+    combos, weights = [], []
+    for airline in airlines:
+        for model in airline["models"]:
+            combos.append((airline, model))
+            weights.append(1 / len(airline["models"]))
+    return combos, weights
+
+
+def iter_flight_batches(count, airport_ids, allocator, seed=None, start_day=1, end_day=45,
+                        domestic_share=0.7, batch_size=50000):
+    """Yield lists of flight rows ready for INSERT_FLIGHT_SQL
+
+    Each column of a batch is drawn in one call (rng.choices(k=n)) from
+    precomputed tables instead of per-row choice/strptime/list filtering.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    dates = [(today + timedelta(days=d)).isoformat() for d in range(start_day, end_day + 1)]
+
+    domestic, international = AIRPORTS["Domestic"], AIRPORTS["International"]
+    routes = {
+        "Domestic": [(s, d) for s in domestic for d in domestic if s != d],
+        # Either end is Indian, split evenly between outbound and inbound
+        "International": [(s, d) for s in domestic for d in international]
+                         + [(s, d) for s in international for d in domestic],
+    }
+    airlines = {
+        "Domestic": _airline_choices([a for a in AIRLINES_DATA if a["name"] in DOMESTIC_AIRLINES]),
+        "International": _airline_choices(AIRLINES_DATA),
+    }
+
+    remaining = count
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        remaining -= n
+        n_dom = sum(1 for _ in range(n) if rng.random() < domestic_share)
+
+        batch = []
+        for kind, k in (("Domestic", n_dom), ("International", n - n_dom)):
+            if not k:
+                continue
+            base_price, duration_min, duration_max = ROUTE_PROFILES[kind]
+            combos, weights = airlines[kind]
+            span = duration_max - duration_min + 1
+
+            route_col = rng.choices(routes[kind], k=k)
+            airline_col = rng.choices(combos, weights=weights, k=k)
+            date_col = rng.choices(dates, k=k)
+            dep_col = rng.choices(DEPARTURE_MINUTES, k=k)
+            seats_col = rng.choices(SEAT_CONFIGS, k=k)
+
+            for (source, dest), (airline, aircraft), date_str, dep, seats in zip(
+                    route_col, airline_col, date_col, dep_col, seats_col):
+                duration = duration_min + int(rng.random() * span)
+                price = round(base_price + duration * 10 + int(rng.random() * 2501) - 500, -1)
+                batch.append((
+                    allocator.take(airline["code"]), airline["name"], aircraft, source, dest,
+                    airport_ids[source], airport_ids[dest], date_str,
+                    CLOCK[dep], CLOCK[(dep + duration) % 1440], price,
+                    seats, int(seats * (0.1 + 0.8 * rng.random()))
+                ))
+        yield batch
+
+
+def _insert_batch(conn, batch, allocator):
+    """Insert one batch, first renumbering rows whose flight number is already taken"""
+    taken = allocator.existing([row[0] for row in batch])
+    if taken:
+        codes = {a["name"]: a["code"] for a in AIRLINES_DATA}
+        for i, row in enumerate(batch):
+            if row[0] in taken:
+                number = allocator.take(codes[row[1]])
+                while number in taken:
+                    number = allocator.take(codes[row[1]])
+                batch[i] = (number,) + row[1:]
+    conn.executemany(INSERT_FLIGHT_SQL, batch)
+
+
+def generate_flights(conn, count=100, seed=None, start_day=1, end_day=45, domestic_share=0.7):
     """Generate 'count' realistic dummy flights"""
     
-    today = datetime.now()
-    all_flights = []
+    import analytics
+    import http_cache
+    import pricing
+    import seatmap
+    from fare_calendar import record_flights
+    from search_engine import airport_ids_by_label, seed_airports
     
     print(f"✈️ Generating {count} new flights...")
     
-    for _ in range(count):
-        # Weighted random date (mostly next 30 days)
-        days_ahead = random.randint(1, 45)
-        current_date_obj = today + timedelta(days=days_ahead)
-        date_str = current_date_obj.strftime('%Y-%m-%d')
-        
-        # 70% Domestic
-        if random.random() < 0.7:
-            flight_type = "Domestic"
-            source = random.choice(AIRPORTS["Domestic"])
-            dest = random.choice([a for a in AIRPORTS["Domestic"] if a != source])
-            valid_airlines = [a for a in AIRLINES_DATA if a["name"] in ["Air India", "IndiGo", "Vistara", "SpiceJet", "Akasa Air"]]
-            base_price = 3000
-            duration_min, duration_max = 90, 180
-        else:
-            flight_type = "International"
-            if random.random() < 0.5:
-                source = random.choice(AIRPORTS["Domestic"])
-                dest = random.choice(AIRPORTS["International"])
-            else:
-                source = random.choice(AIRPORTS["International"])
-                dest = random.choice(AIRPORTS["Domestic"])
-            valid_airlines = AIRLINES_DATA
-            base_price = 15000
-            duration_min, duration_max = 240, 900
-            
-        airline = random.choice(valid_airlines)
-        aircraft = random.choice(airline["models"])
-        
-        # Generate Code
-        flight_code = f"{airline['code']}{random.randint(100, 9999)}"
-        
-        # Time
-        hour = random.randint(0, 23)
-        minute = random.choice([0, 5, 10, 15, 30, 45])
-        dep_time_str = f"{hour:02d}:{minute:02d}"
-        
-        # Arrival
-        duration = random.randint(duration_min, duration_max)
-        dep_dt = datetime.strptime(f"{date_str} {dep_time_str}", '%Y-%m-%d %H:%M')
-        arr_dt = dep_dt + timedelta(minutes=duration)
-        arr_time_str = arr_dt.strftime('%H:%M')
+    try:
+        seed_airports(conn)
+        airport_ids = airport_ids_by_label(conn)
+        allocator = FlightNumberAllocator(conn)
+        before = pricing.max_flight_id(conn)
         
-        # Price & Seats
-        price = base_price + (duration * 10) + random.randint(-500, 2000)
-        price = round(price, -1)
+        all_flights = []
+        for batch in iter_flight_batches(count, airport_ids, allocator, seed=seed, start_day=start_day,
+                                         end_day=end_day, domestic_share=domestic_share):
+            _insert_batch(conn, batch, allocator)
+            all_flights.extend(batch)
         
-        seats = random.choice([150, 180, 220, 300])
-        avail = int(seats * random.uniform(0.1, 0.9))
+        allocator.save()
+        seatmap.seed_sold_seats(conn, before)
+        record_flights(conn, [(f[5], f[6], f[7], f[10], f[12]) for f in all_flights])
+        analytics.record_flights(conn, [(f[5], f[6], f[1], f[11], f[12]) for f in all_flights])
+        http_cache.touch_flights(conn, [(f[5], f[6], f[7]) for f in all_flights])
+        pricing.price_new_flights(conn, before)
+        conn.commit()
         
-        all_flights.append((
-            flight_code, airline["name"], aircraft, source, dest, date_str, 
-            dep_time_str, arr_time_str, price, seats, avail
-        ))
+        # New flights change search results for their route/date
+        from search_cache import cache
+        for source_id, destination_id, date_str in {(f[5], f[6], f[7]) for f in all_flights}:
+            cache.invalidate(source_id, destination_id, date_str)
         
-    try:
-        cursor = conn.cursor()
-        cursor.executemany('''
-            INSERT INTO flights (flight_number, airline, aircraft, source, destination, date, departure_time, arrival_time, price, total_seats, available_seats)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', all_flights)
-        conn.commit()
         print(f"✅ Added {count} flights successfully")
         return True
     except Exception as e:
+        conn.rollback()
         print(f"❌ Error generating flights: {e}")
         return False
+
+
+def bulk_load(conn, count, seed=None, start_day=0, end_day=364, domestic_share=0.7,
+              chunk_size=100000, progress=True):
+    """Stream `count` flights into SQLite for large benchmark datasets
+
+    Secondary flight indexes are dropped first and rebuilt once at the
+    end, rows go in as chunked transactions, and the fare calendar and
+    analytics are rebuilt in a single pass rather than row by row.
+    """
+    import analytics
+    import change_log
+    import fare_calendar
+    import http_cache
+    import pricing
+    import schema
+    import seatmap
+    from search_engine import airport_ids_by_label, seed_airports
+    
+    started = time.perf_counter()
+    conn.execute('PRAGMA synchronous=OFF')
+    schema.drop_flight_indexes(conn)
+    seed_airports(conn)
+    conn.commit()
+    
+    airport_ids = airport_ids_by_label(conn)
+    allocator = FlightNumberAllocator(conn)
+    loaded = 0
+    for batch in iter_flight_batches(count, airport_ids, allocator, seed=seed, start_day=start_day,
+                                     end_day=end_day, domestic_share=domestic_share, batch_size=chunk_size):
+        _insert_batch(conn, batch, allocator)
+        allocator.save()
+        conn.commit()
+        loaded += len(batch)
+        if progress:
+            print(f"  {loaded:,} / {count:,} flights ({time.perf_counter() - started:.1f}s)")
+    
+    if progress:
+        print("  Building indexes, seat maps, fare calendar and analytics...")
+    schema.create_flight_indexes(conn)
+    seatmap.seed_sold_seats(conn)
+    fare_calendar.rebuild(conn)
+    analytics.rebuild(conn)
+    http_cache.touch_all(conn)
+    change_log.record_reset(conn)
+    conn.commit()
+    pricing.reprice_all(conn)
+    conn.execute('PRAGMA synchronous=NORMAL')
+    
+    from search_cache import cache
+    cache.backend and cache.backend.clear()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load a reproducible synthetic flight schedule')
+    parser.add_argument('--db', default='flight_reservation.db')
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start-day', type=int, default=0, help='first day, relative to today')
+    parser.add_argument('--end-day', type=int, default=364, help='last day, relative to today')
+    parser.add_argument('--domestic-share', type=float, default=0.7, help='route mix: fraction of domestic flights')
+    args = parser.parse_args()
+
+    import db
+    import schema
+
+    conn = db.connect(args.db)
+    schema.ensure_schema(conn)
+    elapsed = bulk_load(conn, args.count, seed=args.seed, start_day=args.start_day,
+                        end_day=args.end_day, domestic_share=args.domestic_share)
+    print(f"✅ Loaded {args.count:,} flights in {elapsed:.1f}s")
@@ -0,0 +1,135 @@
+"""Group commit: one writer thread per worker commits concurrent bookings together
+
+With BOOKING_GROUP_COMMIT=1, POST /api/bookings hands its booking to this
+worker's writer thread instead of opening a transaction of its own. The
+writer takes everything queued (waiting up to GROUP_COMMIT_WINDOW_MS for
+more while requests keep arriving), runs each item under its own
+savepoint inside one BEGIN IMMEDIATE ... COMMIT, and only then wakes the
+callers. A sold-out flight or taken seat rolls back that item alone; the
+rest still commit, and every caller gets its own result or exception.
+
+One commit (and one trip through the writer lock) then covers a whole
+batch instead of each booking, and request threads no longer fight over
+the lock among themselves; only the writers of different gunicorn workers
+still take turns. A lone booking does not wait for the window: the writer
+only lingers when the previous batch showed that other bookings are in
+flight.
+"""
+import os
+import queue
+import threading
+import time
+
+import db
+
+ENABLED = os.environ.get('BOOKING_GROUP_COMMIT', '0') == '1'
+WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', 3))
+MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 128))
+
+
+class _Request:
+    __slots__ = ('fn', 'args', 'result', 'error', 'done')
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class GroupCommitWriter:
+    """Single writer thread that batches submitted write functions into shared transactions"""
+
+    def __init__(self, connect=None, window_ms=WINDOW_MS, max_batch=MAX_BATCH):
+        self._connect = connect or db.connect
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Run fn(conn, *args) in the writer's next transaction; returns its result once committed
+
+        Exceptions raised by fn (after its savepoint was rolled back), or
+        by the commit itself, are re-raised in the calling thread.
+        """
+        self._ensure_thread()
+        request = _Request(fn, args)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _ensure_thread(self):
+        # Started on first use (and again after a fork) so each worker has its own writer
+        pid = os.getpid()
+        if self._thread is None or self._pid != pid:
+            with self._lock:
+                if self._thread is None or self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                    self._pid = pid
+                    self._thread.start()
+
+    def _run(self):
+        conn = None
+        linger = False
+        while True:
+            batch = self._collect(linger)
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._commit(conn, batch)
+            except Exception as e:
+                # The whole transaction is gone: everyone still waiting gets the error
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+                for request in batch:
+                    if request.error is None:
+                        request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+            self.batches += 1
+            self.items += len(batch)
+            linger = len(batch) > 1
+
+    def _collect(self, linger):
+        """Block for the first request, then take what is queued (waiting up to the window if lingering)"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + (self.window if linger else 0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, conn, batch):
+        db.begin_immediate(conn)
+        for request in batch:
+            conn.execute('SAVEPOINT group_item')
+            try:
+                request.result = request.fn(conn, *request.args)
+            except Exception as e:
+                conn.execute('ROLLBACK TO group_item')
+                request.error = e
+            conn.execute('RELEASE group_item')
+        conn.commit()
+
+
+writer = GroupCommitWriter()
@@ -0,0 +1,131 @@
+"""Booking history pages and the denormalized upcoming-trips summary
+
+History pages walk idx_bookings_user_date (or idx_bookings_user_status
+when filtered) backwards from a (booking_date, booking_id) cursor, so a
+page costs the same for a user with 5 bookings or 5,000. Live and
+archived bookings are paged separately and merged; monthly archive
+partitions are read newest first and only while they can still reach
+the page (see partitions.user_months).
+
+trip_summaries holds one pre-joined row per live booking, written in the
+booking's own transaction, so "my upcoming trips" is one index range scan
+with no join.
+"""
+from datetime import date as date_cls
+
+import partitions
+
+HISTORY_ORDER = ('booking_date', 'booking_id')
+UPCOMING_ORDER = ('date', 'departure_time', 'booking_id')
+STATUSES = ('confirmed', 'cancelled')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+SELECTS = {
+    'bookings': '''
+        SELECT b.*, f.flight_number, f.source, f.destination, f.date, f.departure_time, f.arrival_time
+        FROM bookings b JOIN flights f ON b.flight_id = f.flight_id
+    ''',
+    # Archived trips carry their own copy of the flight details
+    'bookings_archive': '''
+        SELECT b.booking_id, b.user_id, b.flight_id, b.seats_booked, b.booking_class, b.seat_numbers,
+               b.passenger_names, b.total_price, b.booking_date, b.status, b.flight_number, b.source,
+               b.destination, b.date, b.departure_time, b.arrival_time
+        FROM bookings_archive b
+    ''',
+}
+
+# Same columns, from a partition file's bookings table
+PARTITION_SELECT = SELECTS['bookings_archive'].replace('FROM bookings_archive b', 'FROM bookings b')
+
+
+def _sort_key(row):
+    return (row['booking_date'] or '', row['booking_id'])
+
+
+def _page_query(select, user_id, status, after, limit):
+    where, params = ['b.user_id = ?'], [user_id]
+    if status:
+        where.append('b.status = ?')
+        params.append(status)
+    if after:
+        where.append('(b.booking_date, b.booking_id) < (?, ?)')
+        params.extend(after)
+    query = f"{select} WHERE {' AND '.join(where)} ORDER BY b.booking_date DESC, b.booking_id DESC LIMIT ?"
+    params.append(limit)
+    return query, params
+
+
+def history_page(conn, user_id, status=None, after=None, limit=DEFAULT_LIMIT):
+    """Newest-first bookings (live and archived) after a cursor; returns (rows, next_key)"""
+    rows = []
+    for select in SELECTS.values():
+        query, params = _page_query(select, user_id, status, after, limit + 1)
+        rows.extend(dict(row) for row in conn.execute(query, params))
+    rows.sort(key=_sort_key, reverse=True)
+
+    query, params = _page_query(PARTITION_SELECT, user_id, status, after, limit + 1)
+    for month, first_booking, last_booking in partitions.user_months(conn, user_id):
+        # Page already full with rows newer than anything in this (and every older) partition
+        if len(rows) > limit and (last_booking or '') < _sort_key(rows[limit])[0]:
+            break
+        # Everything in this partition is newer than the cursor
+        if after and (first_booking or '') > (after[0] or ''):
+            continue
+        rows.extend(dict(row) for row in partitions.query(conn, month, query, params))
+        rows.sort(key=_sort_key, reverse=True)
+        del rows[limit + 1:]
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = [rows[-1][c] for c in HISTORY_ORDER]
+    return rows, next_key
+
+
+def upcoming_trips(conn, user_id, after=None, limit=DEFAULT_LIMIT):
+    """Soonest-first confirmed trips from trip_summaries; returns (rows, next_key)"""
+    where, params = ['user_id = ?', 'date >= ?', "status = 'confirmed'"], [user_id, date_cls.today().isoformat()]
+    if after:
+        where.append(f"({', '.join(UPCOMING_ORDER)}) > (?, ?, ?)")
+        params.extend(after)
+    rows = [dict(row) for row in conn.execute(f'''
+        SELECT * FROM trip_summaries
+        WHERE {' AND '.join(where)}
+        ORDER BY {', '.join(UPCOMING_ORDER)}
+        LIMIT ?
+    ''', (*params, limit + 1))]
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = [rows[-1][c] for c in UPCOMING_ORDER]
+    return rows, next_key
+
+# ==================== SUMMARY MAINTENANCE ====================
+
+SUMMARY_SELECT = '''
+    SELECT b.booking_id, b.user_id, b.flight_id, b.seats_booked, b.booking_class, b.seat_numbers,
+           b.total_price, b.booking_date, b.status,
+           f.flight_number, f.source, f.destination, f.date, f.departure_time, f.arrival_time
+    FROM bookings b JOIN flights f ON b.flight_id = f.flight_id
+'''
+
+
+def record_trip(conn, booking_id):
+    """Add or refresh one booking's summary row (call in the booking's transaction)"""
+    conn.execute(f'INSERT OR REPLACE INTO trip_summaries {SUMMARY_SELECT} WHERE b.booking_id = ?',
+                 (booking_id,))
+
+
+def forget_trips(conn, booking_ids):
+    if booking_ids:
+        conn.execute(f"DELETE FROM trip_summaries WHERE booking_id IN ({','.join('?' * len(booking_ids))})",
+                     booking_ids)
+
+
+def rebuild_trips(conn):
+    """Recompute every summary row in one pass"""
+    conn.execute('DELETE FROM trip_summaries')
+    conn.execute(f'INSERT INTO trip_summaries {SUMMARY_SELECT}')
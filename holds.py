@@ -0,0 +1,156 @@
+"""Seat holds: short-lived reservations taken during the booking wizard
+
+A hold takes its seats out of flights.available_seats (and marks its
+seats occupied, the first free ones if none were chosen) the moment it
+is created, so the last wizard step can no longer lose them.
+create_booking converts the hold; abandoned holds are reclaimed in bulk
+by walking idx_seat_holds_expiry from the oldest expiry, so each pass
+touches only the holds that actually expired.
+"""
+import os
+import secrets
+import time
+from datetime import datetime
+
+import db
+import fare_calendar
+import inventory
+import route_graph
+import seatmap
+
+HOLD_TTL = int(os.environ.get('SEAT_HOLD_TTL', 600))
+MAX_HOLDS_PER_USER = int(os.environ.get('SEAT_HOLD_MAX_PER_USER', 5))
+RECLAIM_BATCH_SIZE = int(os.environ.get('SEAT_HOLD_RECLAIM_BATCH', 1000))
+
+
+class HoldError(Exception):
+    """Base class for hold failures"""
+
+
+class HoldNotFound(HoldError):
+    def __init__(self, hold_id):
+        super().__init__('Seat hold not found or expired, please choose your seats again')
+        self.hold_id = hold_id
+
+
+class TooManyHolds(HoldError):
+    def __init__(self):
+        super().__init__(f'You can hold seats on at most {MAX_HOLDS_PER_USER} flights at a time')
+
+
+def to_dict(hold):
+    data = dict(hold)
+    data['expires_in'] = max(0, int(data['expires_at'] - time.time()))
+    data['expires_at'] = datetime.fromtimestamp(data['expires_at']).isoformat(timespec='seconds')
+    data.pop('created_at', None)
+    return data
+
+
+def create_hold(conn, user_id, flight_id, seats, cabin_class='Economy', seat_numbers=(), ttl=HOLD_TTL):
+    """Reserve seats for `ttl` seconds; returns (hold row, updated flight row)
+
+    Must run inside a write transaction. Raises inventory.FlightNotFound /
+    inventory.SoldOut, seatmap.SeatTaken / seatmap.SeatError or TooManyHolds.
+    """
+    now = time.time()
+    active = conn.execute('''
+        SELECT COUNT(*) FROM seat_holds WHERE user_id = ? AND expires_at > ?
+    ''', (user_id, now)).fetchone()[0]
+    if active >= MAX_HOLDS_PER_USER:
+        raise TooManyHolds()
+
+    flight = inventory.reserve_seats(conn, flight_id, seats)
+    if seat_numbers:
+        seatmap.claim_seats(conn, flight_id, cabin_class, list(seat_numbers))
+    else:
+        seat_numbers = seatmap.claim_free_seats(conn, flight_id, cabin_class, seats)
+    if flight['available_seats'] == 0:
+        fare_calendar.refresh_day(conn, flight['source_id'], flight['destination_id'], flight['date'])
+
+    hold_id = secrets.token_urlsafe(16)
+    conn.execute('''
+        INSERT INTO seat_holds (hold_id, user_id, flight_id, seats, cabin_class, seat_numbers, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (hold_id, user_id, flight_id, seats, cabin_class, ', '.join(seat_numbers), now, now + ttl))
+    hold = conn.execute('SELECT * FROM seat_holds WHERE hold_id = ?', (hold_id,)).fetchone()
+    return hold, flight
+
+
+def take_hold(conn, hold_id, user_id):
+    """Remove a live hold so its seats can become a booking; returns the hold row
+
+    Must run inside the booking's write transaction: the seats stay
+    reserved and claimed, they just stop being a hold.
+    """
+    hold = conn.execute('''
+        SELECT * FROM seat_holds WHERE hold_id = ? AND user_id = ? AND expires_at > ?
+    ''', (hold_id, user_id, time.time())).fetchone()
+    if hold is None:
+        raise HoldNotFound(hold_id)
+    conn.execute('DELETE FROM seat_holds WHERE hold_id = ?', (hold_id,))
+    return hold
+
+
+def _restock(conn, holds):
+    """Give held seats back to their flights; returns the affected flight rows"""
+    seats_by_flight, seat_numbers = {}, {}
+    for hold in holds:
+        seats_by_flight[hold['flight_id']] = seats_by_flight.get(hold['flight_id'], 0) + hold['seats']
+        seat_numbers.setdefault((hold['flight_id'], hold['cabin_class']), []).extend(
+            seatmap.parse_seat_numbers(hold['seat_numbers']))
+
+    # One bitmap read/write per cabin and one UPDATE per flight, however many holds
+    for (flight_id, cabin_class), seats in seat_numbers.items():
+        seatmap.release_seats(conn, flight_id, cabin_class, seats)
+    flights = []
+    for flight_id, seats in seats_by_flight.items():
+        flight = inventory.release_seats(conn, flight_id, seats)
+        if flight is not None:
+            fare_calendar.refresh_day(conn, flight['source_id'], flight['destination_id'], flight['date'])
+            flights.append(flight)
+    return flights
+
+
+def release_hold(conn, hold_id, user_id):
+    """Cancel a hold early; returns the flight row whose seats came back
+
+    Must run inside a write transaction.
+    """
+    hold = conn.execute('''
+        SELECT * FROM seat_holds WHERE hold_id = ? AND user_id = ?
+    ''', (hold_id, user_id)).fetchone()
+    if hold is None:
+        raise HoldNotFound(hold_id)
+    conn.execute('DELETE FROM seat_holds WHERE hold_id = ?', (hold_id,))
+    flights = _restock(conn, [hold])
+    return flights[0] if flights else None
+
+
+def reclaim_expired(conn, batch_size=RECLAIM_BATCH_SIZE, between_batches=None):
+    """Release every expired hold, one short transaction per batch; returns holds reclaimed"""
+    from search_cache import cache
+
+    reclaimed = 0
+    while True:
+        db.begin_immediate(conn)
+        try:
+            holds = conn.execute('''
+                SELECT * FROM seat_holds WHERE expires_at <= ? ORDER BY expires_at LIMIT ?
+            ''', (time.time(), batch_size)).fetchall()
+            if holds:
+                ids = [hold['hold_id'] for hold in holds]
+                conn.execute(f"DELETE FROM seat_holds WHERE hold_id IN ({','.join('?' * len(ids))})", ids)
+                flights = _restock(conn, holds)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if holds:
+            for flight in flights:
+                cache.invalidate_flight(flight)
+                route_graph.on_seats_changed(flight['flight_id'], flight['available_seats'])
+        reclaimed += len(holds)
+        if len(holds) < batch_size:
+            return reclaimed
+        if between_batches is not None:
+            between_batches()
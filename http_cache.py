@@ -0,0 +1,205 @@
+"""HTTP caching: version-counter ETags, JSON compression, fingerprinted static assets
+
+Write paths bump counters in data_versions inside their own transaction:
+one per (route, date) and a 'flights' counter whenever a flight's seats
+or existence change, one per user when their bookings change, and an
+'epoch' that bulk loads bump to invalidate everything. A read endpoint
+builds its ETag from the counters its answer depends on, so it can answer
+If-None-Match with 304 after a primary-key lookup instead of running
+(and hashing) the query.
+
+Counters are read before the body is built. A write that commits in
+between only makes the body newer than its tag, and the next revalidation
+fetches it again; a body is never older than its tag.
+
+Static files referenced through asset_url() are served from
+/assets/<path>.<hash>.<ext> with a one-year immutable Cache-Control, so
+repeat visitors never revalidate them and a deploy changes the URL.
+"""
+import gzip
+import hashlib
+import os
+
+from flask import Response, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESSIBLE = ('application/json', 'text/html', 'text/csv', 'text/plain')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well past gzip's ratio at a fraction of brotli's max-quality CPU
+
+# Fresh epoch value, so tags from a previous database (or bulk load) never match
+NEW_EPOCH = 'abs(random() % 1000000000000)'
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+ASSET_HASH_LENGTH = 10
+
+# ==================== VERSION COUNTERS ====================
+
+def route_scope(source_id, destination_id, date):
+    return f'route:{source_id}:{destination_id}:{date}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def route_scopes(source_ids, destination_ids, date):
+    return [route_scope(s, d, date) for s in source_ids for d in destination_ids]
+
+
+def _bump(conn, scopes):
+    conn.executemany('''
+        INSERT INTO data_versions (scope, version) VALUES (?, 1)
+        ON CONFLICT(scope) DO UPDATE SET version = version + 1
+    ''', [(scope,) for scope in scopes])
+
+
+def touch_flights(conn, routes=()):
+    """Flights changed on these (source_id, destination_id, date) routes; call inside the write transaction"""
+    _bump(conn, ['flights', *{route_scope(*route) for route in routes}])
+
+
+def touch_user(conn, user_id):
+    """The user's bookings changed; call inside the write transaction"""
+    _bump(conn, [user_scope(user_id)])
+
+
+def touch_all(conn):
+    """Invalidate every ETag at once (after bulk loads that bypass the counters)"""
+    conn.execute(f"UPDATE data_versions SET version = {NEW_EPOCH} WHERE scope = 'epoch'")
+
+
+def ensure_epoch(conn):
+    conn.execute(f"INSERT OR IGNORE INTO data_versions (scope, version) VALUES ('epoch', {NEW_EPOCH})")
+
+
+def purge_routes(conn, cutoff):
+    """Drop route counters for dates before date('now', cutoff); their flights are archived"""
+    conn.execute('''
+        DELETE FROM data_versions
+        WHERE scope >= 'route:' AND scope < 'route;' AND substr(scope, -10) < date('now', ?)
+    ''', (cutoff,))
+
+# ==================== CONDITIONAL RESPONSES ====================
+
+def stamp(conn, scopes):
+    """Current counters of `scopes` (plus the epoch) as one string"""
+    scopes = ['epoch', *scopes]
+    rows = dict(conn.execute(
+        f"SELECT scope, version FROM data_versions WHERE scope IN ({','.join('?' * len(scopes))})", scopes
+    ).fetchall())
+    return '.'.join(str(rows.get(scope, 0)) for scope in scopes)
+
+
+def etag(*parts):
+    """Opaque tag for a response identified by `parts` (request key plus a stamp())"""
+    return hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def is_fresh(tag):
+    """True if the client already holds the representation tagged `tag`"""
+    return request.if_none_match.contains_weak(tag)
+
+
+def tagged(response, tag):
+    """Attach a weak ETag (the body is re-encoded per Accept-Encoding) and require revalidation"""
+    response.set_etag(tag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(tag):
+    return tagged(Response(status=304), tag)
+
+# ==================== COMPRESSION ====================
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(response):
+    """after_request hook: brotli/gzip-compress large textual bodies"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE or 'Content-Encoding' in response.headers):
+        return response
+    if (response.content_length or 0) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# ==================== FINGERPRINTED ASSETS ====================
+
+class AssetManifest:
+    """Content hashes of static files, recomputed when a file's mtime changes"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}  # filename -> (mtime, hash)
+
+    def digest(self, filename):
+        path = safe_join(self.folder, filename)
+        if path is None:
+            raise FileNotFoundError(filename)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._hashes.get(filename)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:ASSET_HASH_LENGTH])
+            self._hashes[filename] = cached
+        return cached[1]
+
+    def url(self, filename):
+        """/assets/js/main.<hash>.js for static/js/main.js"""
+        stem, ext = os.path.splitext(filename)
+        return f'/assets/{stem}.{self.digest(filename)}{ext}'
+
+    def urls(self, directory):
+        """{relative path: fingerprinted URL} for every file in a static subdirectory (for scripts)"""
+        names = sorted(os.listdir(os.path.join(self.folder, directory)))
+        return {f'{directory}/{name}': self.url(f'{directory}/{name}') for name in names
+                if os.path.isfile(os.path.join(self.folder, directory, name))}
+
+    def send(self, filename):
+        stem, ext = os.path.splitext(filename)
+        stem, _, digest = stem.rpartition('.')
+        filename = stem + ext
+        try:
+            current = self.digest(filename) if stem else None
+        except OSError:
+            current = None
+        if current is None:
+            abort(404)
+        if current != digest:
+            # A page from before the last deploy: serve today's file, but don't pin it
+            return send_from_directory(self.folder, filename)
+        response = send_from_directory(self.folder, filename, max_age=ASSET_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+        return response
+
+
+def init_app(app):
+    assets = AssetManifest(app.static_folder)
+    app.after_request(compress)
+    app.add_url_rule('/assets/<path:filename>', 'assets', assets.send)
+    app.jinja_env.globals.update(asset_url=assets.url, asset_urls=assets.urls)
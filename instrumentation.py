@@ -0,0 +1,370 @@
+"""Per-request timing, SQL statement stats and an opt-in slow-request profiler
+
+Every request records handler time, time and rows for each statement run
+on a get_db() connection, and JSON serialization time. Aggregates are kept
+per process and rendered in the Prometheus text format at /metrics (with
+several gunicorn workers each scrape sees one worker).
+
+Setting PROFILE_SLOW_MS turns on a sampling profiler: a background thread
+samples the stacks of in-flight requests every PROFILE_INTERVAL_MS, and
+requests slower than the threshold get their samples written to
+PROFILE_DIR as folded stacks (flamegraph.pl / speedscope input).
+"""
+import bisect
+import hmac
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+import db
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Bearer token for Prometheus scrapers; without it /metrics is admin-session only
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_STATEMENTS = 500
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class RequestStats:
+    """Counters for the request running on this thread"""
+
+    __slots__ = ('endpoint', 'method', 'status', 'started', 'sql_seconds', 'sql_queries',
+                 'sql_rows', 'json_seconds', 'statements', 'samples')
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.status = 500
+        self.started = time.perf_counter()
+        self.sql_seconds = 0.0
+        self.sql_queries = 0
+        self.sql_rows = 0
+        self.json_seconds = 0.0
+        self.statements = {}  # sql -> [seconds, calls, rows], flushed at teardown
+        self.samples = Counter()
+
+# ==================== METRIC TYPES ====================
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+class Counters:
+    def __init__(self, name, help_text, labels):
+        self.name, self.help, self.labels = name, help_text, labels
+        self.values = {}
+
+    def inc(self, key, amount=1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self.values = {}  # key -> [per-bucket counts..., sum, count]
+
+    def observe(self, key, value):
+        data = self.values.get(key)
+        if data is None:
+            data = self.values[key] = [0] * (len(self.buckets) + 2)
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        for key, data in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(names, key + ("+Inf",))} {data[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {data[-2]:.6f}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {data[-1]}')
+        return lines
+
+
+REQUESTS = Counters('flight_requests_total', 'Requests by endpoint, method and status',
+                    ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = Histogram('flight_request_duration_seconds', 'Handler time per request',
+                            ('endpoint', 'method'))
+SQL_SECONDS = Histogram('flight_request_sql_seconds', 'SQL time (execute + fetch) per request',
+                        ('endpoint',))
+JSON_SECONDS = Histogram('flight_request_json_seconds', 'JSON serialization time per request',
+                         ('endpoint',))
+SQL_QUERIES = Counters('flight_request_sql_queries_total', 'SQL statements run by endpoint', ('endpoint',))
+SQL_ROWS = Counters('flight_request_sql_rows_total', 'Rows fetched by endpoint', ('endpoint',))
+STATEMENT_SECONDS = Counters('flight_sql_statement_seconds_total', 'Time per normalized statement',
+                             ('statement',))
+STATEMENT_CALLS = Counters('flight_sql_statement_calls_total', 'Executions per normalized statement',
+                           ('statement',))
+STATEMENT_ROWS = Counters('flight_sql_statement_rows_total', 'Rows fetched per normalized statement',
+                          ('statement',))
+
+METRICS = [REQUESTS, REQUEST_SECONDS, SQL_SECONDS, JSON_SECONDS, SQL_QUERIES, SQL_ROWS,
+           STATEMENT_SECONDS, STATEMENT_CALLS, STATEMENT_ROWS]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_authorized(headers):
+    """True if the request carries `Authorization: Bearer <METRICS_TOKEN>`"""
+    if not METRICS_TOKEN:
+        return False
+    scheme, _, token = headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), METRICS_TOKEN)
+
+# ==================== SQL ====================
+
+_normalized = {}
+_IN_LIST = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and IN (?, ?, ...) lists so one statement is one label"""
+    label = _normalized.get(sql)
+    if label is None:
+        label = _IN_LIST.sub('?, ...', ' '.join(sql.split()))[:160]
+        if len(_normalized) < MAX_STATEMENTS * 4:
+            _normalized[sql] = label
+    return label
+
+
+def _record_statement(sql, seconds, calls, rows):
+    # caller holds _lock
+    statement = normalize_sql(sql)
+    if statement not in STATEMENT_CALLS.values and len(STATEMENT_CALLS.values) >= MAX_STATEMENTS:
+        statement = 'other'
+    key = (statement,)
+    STATEMENT_SECONDS.inc(key, seconds)
+    STATEMENT_CALLS.inc(key, calls)
+    STATEMENT_ROWS.inc(key, rows)
+
+
+def _record_sql(sql, seconds, rows, executed):
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        with _lock:
+            _record_statement(sql, seconds, executed, rows)
+        return
+    stats.sql_seconds += seconds
+    stats.sql_queries += executed
+    stats.sql_rows += rows
+    totals = stats.statements.get(sql)
+    if totals is None:
+        stats.statements[sql] = [seconds, executed, rows]
+    else:
+        totals[0] += seconds
+        totals[1] += executed
+        totals[2] += rows
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute and fetch calls (SQLite does its work in both)
+
+    Each call is timed as a whole. Iterating the cursor is left to the C
+    implementation: a Python hook per row made bulk readers (seat seeding,
+    bulk load, archival) several times slower, so rows read that way are
+    not counted and only their statement's execute is timed.
+    """
+
+    _sql = ''
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - t0, 0, 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - t0, 0, 1)
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        _record_sql(self._sql, time.perf_counter() - t0, int(row is not None), 0)
+        return row
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record_sql(self._sql, time.perf_counter() - t0, len(rows), 0)
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        _record_sql(self._sql, time.perf_counter() - t0, len(rows), 0)
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute's) are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        t0 = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _record_sql('COMMIT', time.perf_counter() - t0, 0, 1)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that adds serialization time to the request"""
+
+    def dumps(self, obj, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = getattr(_local, 'stats', None)
+            if stats is not None:
+                stats.json_seconds += time.perf_counter() - t0
+
+# ==================== SLOW-REQUEST PROFILER ====================
+
+def fold_stack(frame):
+    """'outer;...;inner' frame names, the folded-stack format"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Samples in-flight request stacks; dumps the samples of slow requests"""
+
+    def __init__(self, threshold_ms, interval_ms=PROFILE_INTERVAL_MS, out_dir=PROFILE_DIR):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.active = {}  # thread id -> RequestStats
+        self._thread = None
+
+    def begin(self, stats):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+        self.active[threading.get_ident()] = stats
+
+    def end(self, stats, elapsed):
+        self.active.pop(threading.get_ident(), None)
+        if elapsed >= self.threshold and stats.samples:
+            self.dump(stats, elapsed)
+
+    def dump(self, stats, elapsed):
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{stats.endpoint}-{elapsed * 1000:.0f}ms-{os.getpid()}.folded"
+        path = os.path.join(self.out_dir, name)
+        with open(path, 'w') as f:
+            for stack, count in stats.samples.most_common():
+                f.write(f'{stack} {count}\n')
+        print(f"Profiler: {stats.method} {stats.endpoint} took {elapsed * 1000:.0f} ms -> {path}")
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stats in list(self.active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stats.samples[fold_stack(frame)] += 1
+
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS) if PROFILE_SLOW_MS > 0 else None
+
+# ==================== FLASK HOOKS ====================
+
+def _before_request():
+    stats = _local.stats = RequestStats(request.endpoint or 'unmatched', request.method)
+    if profiler is not None:
+        profiler.begin(stats)
+
+
+def _after_request(response):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        return
+    _local.stats = None
+    elapsed = time.perf_counter() - stats.started
+    if profiler is not None:
+        profiler.end(stats, elapsed)
+
+    endpoint = (stats.endpoint,)
+    with _lock:
+        REQUESTS.inc((stats.endpoint, stats.method, stats.status))
+        REQUEST_SECONDS.observe((stats.endpoint, stats.method), elapsed)
+        SQL_SECONDS.observe(endpoint, stats.sql_seconds)
+        JSON_SECONDS.observe(endpoint, stats.json_seconds)
+        SQL_QUERIES.inc(endpoint, stats.sql_queries)
+        SQL_ROWS.inc(endpoint, stats.sql_rows)
+        for sql, (seconds, calls, rows) in stats.statements.items():
+            _record_statement(sql, seconds, calls, rows)
+
+
+def init_app(app):
+    """Install the hooks; call before the first database connection is opened"""
+    if not ENABLED:
+        return
+    db.CONNECTION_FACTORY = InstrumentedConnection
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
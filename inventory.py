@@ -0,0 +1,66 @@
+"""Seat inventory: race-free decrement/restock of flights.available_seats"""
+import analytics
+import change_log
+import http_cache
+
+
+class InventoryError(Exception):
+    """Base class for seat inventory failures"""
+
+
+class FlightNotFound(InventoryError):
+    def __init__(self, flight_id):
+        super().__init__('Flight not found')
+        self.flight_id = flight_id
+
+
+class SoldOut(InventoryError):
+    def __init__(self, flight_id, available):
+        if available > 0:
+            message = f'Not enough seats available. Only {available} seats remaining'
+        else:
+            message = 'This flight is sold out'
+        super().__init__(message)
+        self.flight_id = flight_id
+        self.available = available
+
+
+def reserve_seats(conn, flight_id, seats):
+    """Take `seats` from a flight in one conditional UPDATE; return the updated flight row
+
+    Must run inside a write transaction (see db.begin_immediate). The
+    availability check and the decrement are a single statement, so two
+    workers can never both pass the check and oversell.
+    """
+    cursor = conn.execute('''
+        UPDATE flights
+        SET available_seats = available_seats - ?
+        WHERE flight_id = ? AND available_seats >= ?
+    ''', (seats, flight_id, seats))
+
+    flight = conn.execute('SELECT * FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    if flight is None:
+        raise FlightNotFound(flight_id)
+    if cursor.rowcount == 0:
+        raise SoldOut(flight_id, flight['available_seats'])
+    analytics.seats_changed(conn, flight, -seats)
+    http_cache.touch_flights(conn, [(flight['source_id'], flight['destination_id'], flight['date'])])
+    change_log.record(conn, [flight_id])
+    return flight
+
+
+def release_seats(conn, flight_id, seats):
+    """Give `seats` back to a flight (never above total_seats); return the updated row, or None"""
+    before = conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    if before is None:
+        return None
+    conn.execute('''
+        UPDATE flights
+        SET available_seats = MIN(total_seats, available_seats + ?)
+        WHERE flight_id = ?
+    ''', (seats, flight_id))
+    flight = conn.execute('SELECT * FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    analytics.seats_changed(conn, flight, flight['available_seats'] - before[0])
+    http_cache.touch_flights(conn, [(flight['source_id'], flight['destination_id'], flight['date'])])
+    change_log.record(conn, [flight_id])
+    return flight
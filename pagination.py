@@ -0,0 +1,39 @@
+"""Keyset (cursor) pagination helpers"""
+import base64
+import json
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class CursorError(ValueError):
+    """Malformed or tampered pagination cursor"""
+
+
+def encode_cursor(values):
+    """Opaque token for the sort key of the last row on a page"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Sort key values from a cursor token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise CursorError('Invalid cursor')
+    return values
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Clamp a ?limit= query parameter (maximum=None means unbounded)"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = max(1, int(value))
+    except ValueError:
+        raise CursorError('limit must be an integer')
+    return min(limit, maximum) if maximum else limit
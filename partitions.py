@@ -0,0 +1,260 @@
+"""Monthly archive partitions for departed flights and their bookings
+
+The live database keeps only flights that have not yet departed (plus a
+short grace period), so searches, seat maps and the page cache work on a
+small hot set however much history accumulates. Departed flights move,
+together with their bookings, into one SQLite file per departure month
+next to the main database (flight_reservation-archive/2026-09.db).
+
+Two catalog tables in the main database say where history lives:
+archive_partitions (per-month counts, sealed flag) and archive_user_months
+(which months hold a user's bookings, with their booking_date range), so
+a history page opens only the partitions that can contribute to it.
+
+Once a month can no longer receive flights its partition is sealed:
+VACUUMed and switched out of WAL. SQLite has no built-in page
+compression, so sealing compacts the file rather than compressing it.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import analytics
+import db
+import fare_calendar
+import http_cache
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+
+FLIGHT_COLUMNS = ('flight_id, flight_number, airline, aircraft, source, destination, source_id, destination_id, '
+                  'date, departure_time, arrival_time, price, total_seats, available_seats, created_at')
+BOOKING_COLUMNS = ('booking_id, user_id, flight_id, seats_booked, booking_class, seat_numbers, passenger_names, '
+                   'total_price, booking_date, status, flight_number, airline, source, destination, source_id, '
+                   'destination_id, date, departure_time, arrival_time, archived_at')
+
+PARTITION_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS flights (
+        flight_id INTEGER PRIMARY KEY,
+        flight_number TEXT,
+        airline TEXT,
+        aircraft TEXT,
+        source TEXT,
+        destination TEXT,
+        source_id INTEGER,
+        destination_id INTEGER,
+        date TEXT,
+        departure_time TEXT,
+        arrival_time TEXT,
+        price REAL,
+        total_seats INTEGER,
+        available_seats INTEGER,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS bookings (
+        booking_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        flight_id INTEGER NOT NULL,
+        seats_booked INTEGER NOT NULL,
+        booking_class TEXT,
+        seat_numbers TEXT,
+        passenger_names TEXT,
+        total_price REAL NOT NULL,
+        booking_date TIMESTAMP,
+        status TEXT,
+        flight_number TEXT,
+        airline TEXT,
+        source TEXT,
+        destination TEXT,
+        source_id INTEGER,
+        destination_id INTEGER,
+        date TEXT,
+        departure_time TEXT,
+        arrival_time TEXT,
+        archived_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings(user_id, booking_date);
+'''
+
+
+def archive_dir(conn):
+    """Directory holding the partitions of the database `conn` is open on"""
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    main = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    return os.path.splitext(main)[0] + '-archive'
+
+
+def partition_path(conn, month):
+    return os.path.join(archive_dir(conn), f'{month}.db')
+
+
+@contextmanager
+def attached(conn, month):
+    """ATTACH one month's partition (created on first use) as `part`
+
+    ATTACH is not allowed inside a transaction, so callers begin their
+    write transaction inside this block. In WAL mode a commit is atomic
+    per file, not across files: rows are copied into the partition with
+    INSERT OR REPLACE before they are deleted from the main database, so
+    an interrupted move is finished by the next run and never loses rows.
+    """
+    path = partition_path(conn, month)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = sqlite3.connect(path)
+        try:
+            part.executescript(PARTITION_SCHEMA)
+            part.execute('PRAGMA journal_mode=WAL')
+        finally:
+            part.close()
+    conn.execute('ATTACH DATABASE ? AS part', (path,))
+    try:
+        yield
+    finally:
+        conn.execute('DETACH DATABASE part')
+
+
+def _catalog(conn, month, source, where, params, flights=0):
+    """Record archived bookings (selected from `source`) in both catalogs"""
+    conn.execute(f'''
+        INSERT INTO archive_user_months (user_id, month, first_booking, last_booking)
+        SELECT user_id, ?, MIN(booking_date), MAX(booking_date) FROM {source}
+        WHERE {where}
+        GROUP BY user_id
+        ON CONFLICT(user_id, month) DO UPDATE SET
+            first_booking = MIN(first_booking, excluded.first_booking),
+            last_booking = MAX(last_booking, excluded.last_booking)
+    ''', (month, *params))
+    bookings = conn.execute(f'SELECT COUNT(*) FROM {source} WHERE {where}', params).fetchone()[0]
+    conn.execute('''
+        INSERT INTO archive_partitions (month, flights, bookings, sealed) VALUES (?, ?, ?, 0)
+        ON CONFLICT(month) DO UPDATE SET
+            flights = flights + excluded.flights, bookings = bookings + excluded.bookings, sealed = 0
+    ''', (month, flights, bookings))
+
+# ==================== MOVING ====================
+
+def archive_flights(conn, month, cutoff, batch_size):
+    """Move one batch of `month`'s flights departed before date('now', cutoff), with their
+    bookings, into the month's partition; returns the number of flights moved"""
+    first, last = fare_calendar.month_range(month)
+    with attached(conn, month):
+        db.begin_immediate(conn)
+        try:
+            ids = [row[0] for row in conn.execute('''
+                SELECT flight_id FROM main.flights
+                WHERE date BETWEEN ? AND ? AND date < date('now', ?)
+                LIMIT ?
+            ''', (first, last, cutoff, batch_size))]
+            if ids:
+                marks = ','.join('?' * len(ids))
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO part.flights ({FLIGHT_COLUMNS}, archived_at)
+                    SELECT {FLIGHT_COLUMNS}, CURRENT_TIMESTAMP FROM main.flights WHERE flight_id IN ({marks})
+                ''', ids)
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO part.bookings ({BOOKING_COLUMNS})
+                    SELECT b.booking_id, b.user_id, b.flight_id, b.seats_booked, b.booking_class, b.seat_numbers,
+                           b.passenger_names, b.total_price, b.booking_date, b.status, f.flight_number,
+                           f.airline, f.source, f.destination, f.source_id, f.destination_id, f.date,
+                           f.departure_time, f.arrival_time, CURRENT_TIMESTAMP
+                    FROM main.bookings b JOIN main.flights f ON b.flight_id = f.flight_id
+                    WHERE b.flight_id IN ({marks})
+                ''', ids)
+                _catalog(conn, month, 'main.bookings', f'flight_id IN ({marks})', ids, flights=len(ids))
+
+                conn.execute(f'''
+                    DELETE FROM main.trip_summaries WHERE booking_id IN
+                        (SELECT booking_id FROM main.bookings WHERE flight_id IN ({marks}))
+                ''', ids)
+                conn.execute(f'DELETE FROM main.bookings WHERE flight_id IN ({marks})', ids)
+                conn.execute(f'DELETE FROM main.seat_holds WHERE flight_id IN ({marks})', ids)
+                conn.execute(f'DELETE FROM main.seat_maps WHERE flight_id IN ({marks})', ids)
+                conn.execute(f'DELETE FROM main.fares WHERE flight_id IN ({marks})', ids)
+                analytics.forget_flights(conn, ids)
+                http_cache.touch_flights(conn)
+                conn.execute(f'DELETE FROM main.flights WHERE flight_id IN ({marks})', ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(ids)
+
+
+def drain_legacy_archive(conn, batch_size):
+    """Move one batch of the old single bookings_archive table into partitions; returns rows moved"""
+    row = conn.execute('SELECT substr(date, 1, 7) FROM bookings_archive WHERE date IS NOT NULL LIMIT 1').fetchone()
+    if row is None:
+        return 0
+    month = row[0]
+    first, last = fare_calendar.month_range(month)
+    with attached(conn, month):
+        db.begin_immediate(conn)
+        try:
+            ids = [row[0] for row in conn.execute('''
+                SELECT booking_id FROM main.bookings_archive WHERE date BETWEEN ? AND ? LIMIT ?
+            ''', (first, last, batch_size))]
+            if ids:
+                marks = ','.join('?' * len(ids))
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO part.bookings ({BOOKING_COLUMNS})
+                    SELECT a.booking_id, a.user_id, a.flight_id, a.seats_booked, a.booking_class, a.seat_numbers,
+                           a.passenger_names, a.total_price, a.booking_date, a.status, a.flight_number,
+                           a.airline, a.source, a.destination,
+                           (SELECT airport_id FROM main.airports WHERE label = a.source),
+                           (SELECT airport_id FROM main.airports WHERE label = a.destination),
+                           a.date, a.departure_time, a.arrival_time, a.archived_at
+                    FROM main.bookings_archive a WHERE a.booking_id IN ({marks})
+                ''', ids)
+                _catalog(conn, month, 'main.bookings_archive', f'booking_id IN ({marks})', ids)
+                conn.execute(f'DELETE FROM main.bookings_archive WHERE booking_id IN ({marks})', ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(ids)
+
+
+def seal_closed(conn, cutoff):
+    """VACUUM partitions whose month ended before date('now', cutoff); returns the months sealed"""
+    open_month = conn.execute("SELECT strftime('%Y-%m', 'now', ?)", (cutoff,)).fetchone()[0]
+    months = [row[0] for row in conn.execute(
+        'SELECT month FROM archive_partitions WHERE sealed = 0 AND month < ?', (open_month,))]
+    for month in months:
+        part = sqlite3.connect(partition_path(conn, month), timeout=db.BUSY_TIMEOUT_MS / 1000)
+        try:
+            part.execute('PRAGMA journal_mode=DELETE')
+            part.execute('VACUUM')
+        finally:
+            part.close()
+        with conn:
+            conn.execute('UPDATE archive_partitions SET sealed = 1 WHERE month = ?', (month,))
+    return months
+
+# ==================== READING ====================
+
+def user_months(conn, user_id):
+    """(month, first_booking, last_booking) of each partition holding the user's bookings, newest first"""
+    return conn.execute('''
+        SELECT month, first_booking, last_booking FROM archive_user_months
+        WHERE user_id = ? ORDER BY last_booking DESC
+    ''', (user_id,)).fetchall()
+
+
+def months(conn):
+    return [row[0] for row in conn.execute('SELECT month FROM archive_partitions ORDER BY month')]
+
+
+def query(conn, month, sql, params=()):
+    """Run a read-only query against one month's partition"""
+    path = partition_path(conn, month)
+    if not os.path.exists(path):
+        return []
+    part = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=db.BUSY_TIMEOUT_MS / 1000,
+                           factory=db.CONNECTION_FACTORY)
+    part.row_factory = sqlite3.Row
+    try:
+        return part.execute(sql, params).fetchall()
+    finally:
+        part.close()
@@ -0,0 +1,200 @@
+"""Password hashing on a bounded process pool with admission control
+
+Hashing is slow on purpose. Run inline, a burst of logins pins every
+gunicorn worker and searches queue behind them. Here hashes run in a
+small, lower-priority process pool, and at most MAX_PENDING are in flight
+across all workers on the host (flock'd slot files; per process where
+flock is unavailable, e.g. Windows); past that, callers get HashPoolBusy
+(a fast 503 + Retry-After) instead of a worker.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Hash processes per gunicorn worker; 0 hashes inline in the request thread
+POOL_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+# In-flight hashes across every worker on the host
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', max(1, (os.cpu_count() or 2) // 2)))
+POOL_NICE = int(os.environ.get('PASSWORD_HASH_NICE', 10))
+SLOT_DIR = os.environ.get('PASSWORD_HASH_SLOT_DIR', tempfile.gettempdir())
+TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+
+
+class HashPoolBusy(Exception):
+    def __init__(self, retry_after=RETRY_AFTER):
+        super().__init__('Too many sign-ins in progress, please retry shortly')
+        self.retry_after = retry_after
+
+
+def canonical_method(method):
+    """Spell out werkzeug's defaults so stored hashes compare equal to the setting"""
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + params + defaults[len(params):])
+
+
+CURRENT_METHOD = canonical_method(HASH_METHOD)
+
+
+def needs_rehash(stored_hash):
+    """True if the hash was made with other parameters than HASH_METHOD"""
+    return stored_hash.split('$', 1)[0] != CURRENT_METHOD
+
+# ==================== POOL ====================
+
+class HashSlots:
+    """Host-wide limit on in-flight hashes: one flock'd file per slot
+
+    Locks belong to the open file, so a crashed worker's slots free
+    themselves when the kernel closes its descriptors.
+    """
+
+    def __init__(self, count=MAX_PENDING, directory=SLOT_DIR):
+        # One slot set per database, so separate deployments don't share a limit
+        tag = hashlib.sha1(os.path.abspath(db.DATABASE).encode()).hexdigest()[:12]
+        self.paths = [os.path.join(directory, f'flight-hash-{tag}-{i}.lock') for i in range(count)]
+
+    def acquire(self):
+        """A held slot (file descriptor), or None if all are taken"""
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class LocalSlots:
+    """Fallback without flock: the same limit, but per worker process"""
+
+    def __init__(self, count=MAX_PENDING):
+        self._semaphore = threading.BoundedSemaphore(count)
+
+    def acquire(self):
+        """A held slot (True), or None if all are taken"""
+        return True if self._semaphore.acquire(blocking=False) else None
+
+    def release(self, slot):
+        self._semaphore.release()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def _lower_priority():
+    # Hashing yields the CPU to request handling (os.nice is POSIX-only)
+    if hasattr(os, 'nice'):
+        os.nice(POOL_NICE)
+
+
+def get_executor():
+    """The hash pool for this process (recreated after a fork)"""
+    global _executor, _executor_pid, _slots
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, initializer=_lower_priority)
+                _slots = HashSlots() if fcntl is not None else LocalSlots()
+                _executor_pid = pid
+    return _executor
+
+
+def _reset_executor(broken):
+    """Drop a pool whose worker died; the next call starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    # Reap its processes; cancelled hashes release their slots through their done callbacks
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if POOL_WORKERS <= 0:
+        return fn(*args)
+    executor = get_executor()
+    slots = _slots
+    slot = slots.acquire()
+    if slot is None:
+        raise HashPoolBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release(slot)
+        _reset_executor(executor)
+        raise HashPoolBusy()
+    except Exception:
+        slots.release(slot)
+        raise
+    try:
+        return future.result(timeout=TIMEOUT)
+    except FutureTimeout:
+        # Keep the slot until the hash really finishes, not just until we stop waiting
+        future.add_done_callback(lambda _, held=slot: slots.release(held))
+        slot = None
+        raise HashPoolBusy()
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise HashPoolBusy()
+    finally:
+        if slot is not None:
+            slots.release(slot)
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def hash_password(password):
+    return _run(_hash, password, HASH_METHOD)
+
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+
+def upgrade_hash(conn, user_id, stored_hash, password):
+    """Re-hash with the current parameters after a successful login
+
+    Best effort: if the pool is busy the upgrade waits for the next login.
+    """
+    try:
+        new_hash = hash_password(password)
+    except HashPoolBusy:
+        return False
+    conn.execute('''
+        UPDATE users SET password_hash = ? WHERE user_id = ? AND password_hash = ?
+    ''', (new_hash, user_id, stored_hash))
+    conn.commit()
+    return True
@@ -0,0 +1,169 @@
+"""Dynamic fares: per-class prices from base fare, load factor and days to departure
+
+flights.price stays the base (economy, off-peak) fare. The fares table
+holds what each cabin actually costs right now; search results,
+bookings, connecting itineraries and the fare calendar only read it. Fares are recomputed by a scheduler job that
+reprices every future flight with one set-based INSERT ... SELECT per
+flight_id range (SQLite evaluates the curves below for the whole batch,
+no per-row Python), and new flights are priced as they are inserted.
+
+The multipliers below are the single source of truth: the SQL is
+generated from them, and the browser shows the fares the server stored
+(GET /api/flights/<id>/fares) instead of multiplying prices itself.
+"""
+import os
+import time
+
+import change_log
+import db
+import fare_calendar
+import http_cache
+
+CLASSES = ('Economy', 'Business', 'First')
+CLASS_MULTIPLIERS = {'Economy': 1.0, 'Business': 2.5, 'First': 4.0}
+# (share of seats sold below which the multiplier applies, multiplier); above the last step: FULL_MULTIPLIER
+LOAD_FACTOR_STEPS = ((0.5, 1.0), (0.7, 1.1), (0.85, 1.25), (0.95, 1.5))
+FULL_MULTIPLIER = 1.8
+# (days to departure below which the multiplier applies, multiplier); further out: EARLY_MULTIPLIER
+DAYS_OUT_STEPS = ((3, 1.35), (7, 1.2), (14, 1.1), (30, 1.0))
+EARLY_MULTIPLIER = 0.9
+
+BATCH_SIZE = int(os.environ.get('REPRICE_BATCH_SIZE', 50000))
+# Past this many changed flights in one batch, bump every ETag at once instead of per route
+MAX_ROUTE_TOUCHES = 5000
+
+
+def _steps(expression, steps, otherwise):
+    whens = ' '.join(f'WHEN {expression} < {bound!r} THEN {multiplier!r}' for bound, multiplier in steps)
+    return f'(CASE {whens} ELSE {otherwise!r} END)'
+
+
+SOLD_SHARE = '(1.0 - CAST(f.available_seats AS REAL) / MAX(f.total_seats, 1))'
+DAYS_OUT = "(julianday(f.date) - julianday('now'))"
+DEMAND = f'{_steps(SOLD_SHARE, LOAD_FACTOR_STEPS, FULL_MULTIPLIER)} * {_steps(DAYS_OUT, DAYS_OUT_STEPS, EARLY_MULTIPLIER)}'
+
+# Unchanged fares are skipped, so only flights whose price moved are written (and stamped with priced_at)
+REPRICE_SQL = f'''
+    INSERT INTO fares (flight_id, economy, business, first, priced_at)
+    SELECT flight_id, ROUND(base * {CLASS_MULTIPLIERS['Economy']!r}), ROUND(base * {CLASS_MULTIPLIERS['Business']!r}),
+           ROUND(base * {CLASS_MULTIPLIERS['First']!r}), ?
+    FROM (
+        SELECT f.flight_id, f.price * {DEMAND} AS base FROM flights f
+        WHERE f.flight_id BETWEEN ? AND ? AND f.date >= date('now')
+    )
+    WHERE true
+    ON CONFLICT(flight_id) DO UPDATE SET
+        economy = excluded.economy, business = excluded.business, first = excluded.first,
+        priced_at = excluded.priced_at
+    WHERE fares.economy != excluded.economy OR fares.business != excluded.business OR fares.first != excluded.first
+'''
+
+CHANGED_ROUTES_SQL = '''
+    SELECT DISTINCT f.source_id, f.destination_id, f.date
+    FROM fares p JOIN flights f USING (flight_id)
+    WHERE p.flight_id BETWEEN ? AND ? AND p.priced_at = ?
+'''
+
+CHANGED_FLIGHTS_SQL = 'SELECT flight_id FROM fares WHERE flight_id BETWEEN ? AND ? AND priced_at = ?'
+
+FARE_COLUMNS = {'Economy': 'economy', 'Business': 'business', 'First': 'first'}
+
+# ==================== REPRICING ====================
+
+def reprice(conn, first_id, last_id):
+    """Reprice future flights with first_id <= flight_id <= last_id in the caller's write transaction
+
+    Returns the (source_id, destination_id, date) routes whose fares
+    changed, or None when so many changed that every ETag was invalidated
+    instead (the caller should then drop the whole search cache).
+    """
+    stamp = time.time()
+    before = conn.total_changes
+    conn.execute(REPRICE_SQL, (stamp, first_id, last_id))
+    changed = conn.total_changes - before
+    if changed:
+        # The calendar quotes Economy fares, so every day with a repriced flight is recomputed
+        fare_calendar.refresh_query(conn, CHANGED_ROUTES_SQL, (first_id, last_id, stamp))
+    if changed > MAX_ROUTE_TOUCHES:
+        http_cache.touch_all(conn)
+        change_log.record_reset(conn)
+        return None
+    if not changed:
+        return set()
+    routes = {tuple(row) for row in conn.execute(CHANGED_ROUTES_SQL, (first_id, last_id, stamp))}
+    http_cache.touch_flights(conn, routes)
+    change_log.record_query(conn, CHANGED_FLIGHTS_SQL, (first_id, last_id, stamp))
+    return routes
+
+
+def price_new_flights(conn, after_id):
+    """Price flights inserted in this transaction (flight_id > after_id)"""
+    return reprice(conn, after_id + 1, 2 ** 63 - 1)
+
+
+def max_flight_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(flight_id), 0) FROM flights').fetchone()[0]
+
+
+def reprice_all(conn, batch_size=BATCH_SIZE, between_batches=None):
+    """Scheduler job: reprice every future flight, one short transaction per flight_id range;
+    returns the number of batches whose fares changed"""
+    from search_cache import cache
+
+    low = conn.execute("SELECT MIN(flight_id) FROM flights WHERE date >= date('now')").fetchone()[0]
+    if low is None:
+        return 0
+    high = max_flight_id(conn)
+    changed = 0
+    for first_id in range(low, high + 1, batch_size):
+        db.begin_immediate(conn)
+        try:
+            routes = reprice(conn, first_id, first_id + batch_size - 1)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if routes is None:
+            cache.clear()
+        for route in routes or ():
+            cache.invalidate(*route)
+        changed += routes is None or bool(routes)
+        if between_batches is not None:
+            between_batches()
+    return changed
+
+# ==================== READING ====================
+
+def fare(conn, flight, cabin_class):
+    """Current per-seat fare of a cabin (unknown classes pay Economy, as before)"""
+    column = FARE_COLUMNS.get(cabin_class, 'economy')
+    row = conn.execute(f'SELECT {column} FROM fares WHERE flight_id = ?', (flight['flight_id'],)).fetchone()
+    if row is None:
+        # Not priced yet (a flight from before the first pass): price it now, in the caller's transaction
+        reprice(conn, flight['flight_id'], flight['flight_id'])
+        row = conn.execute(f'SELECT {column} FROM fares WHERE flight_id = ?', (flight['flight_id'],)).fetchone()
+    if row is None:
+        return flight['price'] * CLASS_MULTIPLIERS.get(cabin_class, 1.0)
+    return row[0]
+
+
+def attach_fares(flights):
+    """Fold fare_* columns (from a LEFT JOIN on fares) into a 'fares' dict; price becomes the Economy fare"""
+    for flight in flights:
+        fares = {cabin: flight.pop(f'fare_{column}') for cabin, column in FARE_COLUMNS.items()}
+        if fares['Economy'] is None:
+            fares = {cabin: flight['price'] * m for cabin, m in CLASS_MULTIPLIERS.items()}
+        flight['fares'] = fares
+        flight['price'] = fares['Economy']
+    return flights
+
+
+def flight_fares(conn, flight_id):
+    """{class: fare} for one flight, or None if it does not exist"""
+    flight = conn.execute('SELECT flight_id, price FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    if flight is None:
+        return None
+    row = conn.execute('SELECT economy, business, first FROM fares WHERE flight_id = ?', (flight_id,)).fetchone()
+    if row is None:
+        return {cabin: flight['price'] * m for cabin, m in CLASS_MULTIPLIERS.items()}
+    return dict(zip(CLASSES, row))
@@ -0,0 +1,265 @@
+"""In-memory time-expanded route graph for multi-leg (connecting) itineraries"""
+import bisect
+import heapq
+import os
+import threading
+from collections import namedtuple
+from datetime import date as date_cls
+
+import change_log
+import pricing
+
+MIN_CONNECTION = int(os.environ.get('MIN_CONNECTION_MINUTES', 60))
+MAX_LAYOVER = int(os.environ.get('MAX_LAYOVER_MINUTES', 24 * 60))
+MAX_STOPS_LIMIT = 3
+MAX_RESULTS_LIMIT = 20
+FETCH_CHUNK = 500
+
+# Legs are priced at the current Economy fare (what checkout charges), not the base price
+LEGS_SQL = '''
+    SELECT f.flight_id, f.source_id, f.destination_id, f.date, f.departure_time, f.arrival_time,
+           COALESCE(p.economy, f.price) AS price, f.available_seats
+    FROM flights f LEFT JOIN fares p USING (flight_id)
+    WHERE '''
+
+Leg = namedtuple('Leg', 'flight_id source_id destination_id departure arrival price')
+
+
+def to_minutes(date_str, time_str):
+    """Absolute minutes since 0001-01-01 for a date and HH:MM time"""
+    hours, minutes = time_str.split(':')[:2]
+    return date_cls.fromisoformat(date_str).toordinal() * 1440 + int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    """'YYYY-MM-DD HH:MM' for absolute minutes"""
+    day = date_cls.fromordinal(minutes // 1440).isoformat()
+    return f'{day} {minutes % 1440 // 60:02d}:{minutes % 60:02d}'
+
+
+def make_leg(row):
+    departure = to_minutes(row['date'], row['departure_time'])
+    # arrival_time has no date: an earlier clock time means it lands the next day
+    duration = (to_minutes(row['date'], row['arrival_time']) - departure) % 1440
+    return Leg(row['flight_id'], row['source_id'], row['destination_id'],
+               departure, departure + duration, row['price'])
+
+
+class RouteGraph:
+    """Per-airport departure lists sorted by time, plus live seat counts and fares
+
+    New flights are pulled incrementally (flight_id above a high-water
+    mark); seats and fares changed by any worker (bookings, repricing)
+    are re-read from change_log on each sync, and seat counts are
+    re-checked against SQLite for every itinerary returned.
+    """
+
+    def __init__(self):
+        self.legs = {}            # flight_id -> Leg
+        self.seats = {}           # flight_id -> available seats
+        self.departures = {}      # airport_id -> sorted [(departure, flight_id)]
+        self.high_water = 0
+        self.seq = None           # last change_log seq applied
+        self.lock = threading.RLock()
+
+    # ---------- maintenance ----------
+
+    def add_flight(self, row):
+        if row['source_id'] is None or row['destination_id'] is None:
+            return
+        leg = make_leg(row)
+        with self.lock:
+            old = self.legs.get(leg.flight_id)
+            if old is not None and (old.source_id, old.departure) == (leg.source_id, leg.departure):
+                self.legs[leg.flight_id] = leg
+                self.seats[leg.flight_id] = row['available_seats']
+                return
+            if old is not None:
+                self.remove_flight(leg.flight_id)
+            self.legs[leg.flight_id] = leg
+            self.seats[leg.flight_id] = row['available_seats']
+            bisect.insort(self.departures.setdefault(leg.source_id, []), (leg.departure, leg.flight_id))
+            self.high_water = max(self.high_water, leg.flight_id)
+
+    def remove_flight(self, flight_id):
+        with self.lock:
+            leg = self.legs.pop(flight_id, None)
+            self.seats.pop(flight_id, None)
+            if leg is not None:
+                departures = self.departures[leg.source_id]
+                i = bisect.bisect_left(departures, (leg.departure, flight_id))
+                if i < len(departures) and departures[i] == (leg.departure, flight_id):
+                    del departures[i]
+
+    def update_seats(self, flight_id, available):
+        with self.lock:
+            if flight_id in self.seats:
+                self.seats[flight_id] = available
+
+    def sync(self, conn):
+        """Load flights added since the last sync (by any worker), re-read changed ones, drop departed ones"""
+        today = date_cls.today().isoformat()
+        # The seq is read first: anything committed meanwhile is also replayed next time, which is harmless
+        seq = change_log.latest(conn)
+        if self.seq is not None and seq != self.seq:
+            seq, flight_ids = change_log.since(conn, self.seq)
+            if flight_ids is None:
+                self._reset()
+            else:
+                self._refresh(conn, sorted(fid for fid in flight_ids if fid <= self.high_water), today)
+        rows = conn.execute(f'{LEGS_SQL} f.flight_id > ? AND f.date >= ?', (self.high_water, today)).fetchall()
+        for row in rows:
+            self.add_flight(row)
+        self.seq = seq
+        self._prune(to_minutes(today, '00:00'))
+
+    def _refresh(self, conn, flight_ids, today):
+        for i in range(0, len(flight_ids), FETCH_CHUNK):
+            chunk = flight_ids[i:i + FETCH_CHUNK]
+            rows = {row['flight_id']: row for row in conn.execute(
+                f"{LEGS_SQL} f.flight_id IN ({','.join('?' * len(chunk))}) AND f.date >= ?", (*chunk, today))}
+            for flight_id in chunk:
+                if flight_id in rows:
+                    self.add_flight(rows[flight_id])
+                else:
+                    self.remove_flight(flight_id)
+
+    def _reset(self):
+        with self.lock:
+            self.legs, self.seats, self.departures = {}, {}, {}
+            self.high_water = 0
+
+    def _prune(self, cutoff):
+        with self.lock:
+            for airport_id, departures in self.departures.items():
+                cut = bisect.bisect_left(departures, (cutoff, 0))
+                if cut:
+                    for _, flight_id in departures[:cut]:
+                        self.legs.pop(flight_id, None)
+                        self.seats.pop(flight_id, None)
+                    del departures[:cut]
+
+    # ---------- search ----------
+
+    def search(self, source_ids, destination_ids, date, max_stops=1, k=5, rank='duration',
+               min_connection=MIN_CONNECTION, max_layover=MAX_LAYOVER, seats=1):
+        """k best itineraries (lists of Legs) departing on `date`, best first
+
+        Label-setting search over the time-expanded graph: a priority queue
+        of partial itineraries ordered by total duration (or total price),
+        both of which only grow as legs are appended, so the first k
+        itineraries to reach a destination are the k best. Each leg is
+        expanded at most k times.
+        """
+        destinations = set(destination_ids)
+        day_start = to_minutes(date, '00:00')
+        by_price = rank == 'price'
+        heap, results, expanded = [], [], {}
+        counter = 0
+
+        with self.lock:
+            for source_id in source_ids:
+                departures = self.departures.get(source_id, [])
+                lo = bisect.bisect_left(departures, (day_start, 0))
+                hi = bisect.bisect_left(departures, (day_start + 1440, 0))
+                for _, flight_id in departures[lo:hi]:
+                    if self.seats.get(flight_id, 0) < seats:
+                        continue
+                    leg = self.legs[flight_id]
+                    cost = leg.price if by_price else leg.arrival - leg.departure
+                    heapq.heappush(heap, (cost, leg.arrival, counter, (leg,)))
+                    counter += 1
+
+            while heap and len(results) < k:
+                cost, arrival, _, path = heapq.heappop(heap)
+                last = path[-1]
+
+                if last.destination_id in destinations:
+                    results.append(path)
+                    continue
+
+                expanded[last.flight_id] = expanded.get(last.flight_id, 0) + 1
+                if expanded[last.flight_id] > k or len(path) > max_stops:
+                    continue
+
+                visited = {leg.source_id for leg in path}
+                # With no stops left after this leg it must land at a destination
+                final_leg = len(path) == max_stops
+                departures = self.departures.get(last.destination_id, [])
+                lo = bisect.bisect_left(departures, (arrival + min_connection, 0))
+                hi = bisect.bisect_right(departures, (arrival + max_layover, float('inf')))
+                for _, flight_id in departures[lo:hi]:
+                    leg = self.legs[flight_id]
+                    if final_leg and leg.destination_id not in destinations:
+                        continue
+                    if leg.destination_id in visited or expanded.get(flight_id, 0) >= k:
+                        continue
+                    if self.seats.get(flight_id, 0) < seats:
+                        continue
+                    if by_price:
+                        next_cost = cost + leg.price
+                    else:
+                        next_cost = leg.arrival - path[0].departure
+                    heapq.heappush(heap, (next_cost, leg.arrival, counter, path + (leg,)))
+                    counter += 1
+
+        return results
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph(conn):
+    """The process-wide route graph, synced with new flights"""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = RouteGraph()
+        _graph.sync(conn)
+    return _graph
+
+
+def on_seats_changed(flight_id, available):
+    """Keep this worker's graph current after a booking"""
+    if _graph is not None:
+        _graph.update_seats(flight_id, available)
+
+
+def find_itineraries(conn, source_ids, destination_ids, date, seats=1, attempts=3, **options):
+    """Itineraries as JSON-ready dicts, with every leg's seats verified in SQLite"""
+    graph = get_graph(conn)
+    for _ in range(attempts):
+        paths = graph.search(source_ids, destination_ids, date, seats=seats, **options)
+        flight_ids = sorted({leg.flight_id for path in paths for leg in path})
+        rows = {}
+        if flight_ids:
+            rows = {row['flight_id']: row for row in pricing.attach_fares([dict(row) for row in conn.execute(f'''
+                SELECT flights.*, fares.economy AS fare_economy, fares.business AS fare_business,
+                       fares.first AS fare_first
+                FROM flights LEFT JOIN fares USING (flight_id)
+                WHERE flight_id IN ({','.join('?' * len(flight_ids))})
+            ''', flight_ids)])}
+
+        # Another worker may have sold a leg out since this graph last saw it
+        stale = [fid for fid in flight_ids if fid not in rows or rows[fid]['available_seats'] < seats]
+        for fid in flight_ids:
+            graph.update_seats(fid, rows[fid]['available_seats'] if fid in rows else 0)
+        if not stale:
+            break
+
+    itineraries = []
+    for path in paths:
+        if any(leg.flight_id not in rows or rows[leg.flight_id]['available_seats'] < seats for leg in path):
+            continue
+        first, last = path[0], path[-1]
+        itineraries.append({
+            'legs': [rows[leg.flight_id] for leg in path],
+            'stops': len(path) - 1,
+            'total_duration_minutes': last.arrival - first.departure,
+            # From the rows just read, so it is what booking each leg in Economy costs now
+            'total_price': sum(rows[leg.flight_id]['price'] for leg in path),
+            'departure': format_minutes(first.departure),
+            'arrival': format_minutes(last.arrival),
+        })
+    return itineraries
@@ -0,0 +1,425 @@
+"""In-memory columnar snapshot of future flights that answers searches without SQL
+
+With SEARCH_SNAPSHOT=1 each worker keeps every flight from today on in
+flat `array` columns instead of Python objects: airports, airlines,
+aircraft and other repeated strings are interned into small tables and
+stored as indexes, flight numbers as airline prefix + serial, dates as
+ordinals, times as minutes, prices and fares as integer cents and seat
+counts as plain ints. Rows are sorted by a packed (source, destination,
+date) key, so a route/date lookup is two bisects.
+
+Freshness comes from change_log: every search first compares MAX(seq)
+with the last seq applied (one indexed probe) and re-reads only the
+flights logged since then. A flight whose seats or fares changed is
+patched in place; new or rescheduled flights go to a small unsorted
+delta, and past MERGE_THRESHOLD of those (or at the next day) the columns
+are re-sorted in memory, dropping departed and deleted flights. A reset
+row in the log, or a gap after trimming, reloads from SQLite.
+
+The first search in a worker pays for the load (rows are encoded a
+column at a time, roughly 1.5 s per 100k flights). stats() reports memory
+use, also scaled to a million flights.
+"""
+import bisect
+import os
+import sys
+import threading
+from array import array
+from datetime import date as date_cls
+from operator import itemgetter
+
+import analytics
+import change_log
+import pricing
+import search_engine
+
+ENABLED = os.environ.get('SEARCH_SNAPSHOT', '0') == '1'
+MERGE_THRESHOLD = int(os.environ.get('SNAPSHOT_MERGE_THRESHOLD', 4096))
+FETCH_CHUNK = 500
+LOAD_CHUNK = 50000
+
+GONE = 0xFFFFFFFF  # id_pos entry of a flight that left the snapshot
+NO_SERIAL = 0xFFFFFFFF  # flight number kept whole in the prefix table
+NO_FARE = -1
+
+# column: array typecode
+COLUMNS = {
+    'key': 'q',             # source_id << 40 | destination_id << 20 | date ordinal
+    'flight_id': 'q',
+    'number_prefix': 'I',   # interned
+    'number_serial': 'I',
+    'airline': 'I',         # interned
+    'aircraft': 'I',        # interned
+    'source': 'I',          # interned airport label
+    'destination': 'I',     # interned airport label
+    'created_at': 'I',      # interned (bulk loads share one timestamp)
+    'departure': 'H',       # minutes after midnight
+    'arrival': 'H',
+    'price': 'i',           # cents
+    'economy': 'i',         # cents, NO_FARE when not priced yet
+    'business': 'i',
+    'first': 'i',
+    'total_seats': 'I',
+    'available_seats': 'I',
+}
+STRING_COLUMNS = ('number_prefix', 'airline', 'aircraft', 'source', 'destination', 'created_at')
+
+# The flights columns a search returns, then the fares
+FIELDS = ('flight_id', 'flight_number', 'airline', 'aircraft', 'source', 'destination', 'date', 'departure_time',
+          'arrival_time', 'price', 'total_seats', 'available_seats', 'created_at', 'source_id', 'destination_id',
+          'fare_economy', 'fare_business', 'fare_first')
+FLIGHT_ID, DATE, DEPARTURE_TIME = FIELDS.index('flight_id'), FIELDS.index('date'), FIELDS.index('departure_time')
+SOURCE_ID, DESTINATION_ID = FIELDS.index('source_id'), FIELDS.index('destination_id')
+
+FLIGHTS_SQL = f'''
+    SELECT {', '.join(f'flights.{field}' for field in FIELDS[:-3])},
+           fares.economy, fares.business, fares.first
+    FROM flights LEFT JOIN fares USING (flight_id)
+    WHERE source_id IS NOT NULL AND destination_id IS NOT NULL AND
+'''
+
+
+def pack_key(source_id, destination_id, ordinal):
+    return source_id << 40 | destination_id << 20 | ordinal
+
+
+def unpack_key(key):
+    return key >> 40, key >> 20 & 0xFFFFF, key & 0xFFFFF
+
+
+def to_minutes(text):
+    """Minutes for 'HH:MM', or None if the text would not come back unchanged"""
+    hours, _, minutes = text.partition(':')
+    if len(hours) != 2 or len(minutes) != 2 or not (hours + minutes).isdigit():
+        return None
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def to_cents(value):
+    """Integer cents, or None if the value has finer precision"""
+    if value is None:
+        return NO_FARE
+    cents = round(value * 100)
+    return cents if cents / 100 == value and -2 ** 31 < cents < 2 ** 31 else None
+
+
+def to_ordinal(text):
+    try:
+        day = date_cls.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    return day.toordinal() if day.isoformat() == text else None
+
+
+def _take(column, positions):
+    """New array of column[pos] for each position (itemgetter gathers in C)"""
+    if len(positions) < 2:
+        return array(column.typecode, [column[pos] for pos in positions])
+    return array(column.typecode, itemgetter(*positions)(column))
+
+
+class StringTable:
+    """Each distinct value stored once; rows hold its index"""
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def intern(self, value):
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def nbytes(self):
+        return (sys.getsizeof(self.values) + sys.getsizeof(self.ids)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+class ScheduleSnapshot:
+    """Sorted columns plus an unsorted delta, kept current from change_log"""
+
+    def __init__(self, merge_threshold=MERGE_THRESHOLD):
+        self.merge_threshold = merge_threshold
+        self.seq = None
+        self.day = None
+        self.loads = 0
+        self.merges = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.cols = {name: array(code) for name, code in COLUMNS.items()}
+        self.strings = {name: StringTable() for name in STRING_COLUMNS}
+        self.extra = {}          # position -> {field: original value} that does not fit its column
+        self.sorted_count = 0    # rows [0, sorted_count) are ordered by (key, departure, flight_id)
+        self.ids = array('q')    # flight_ids of the sorted rows, ascending...
+        self.id_pos = array('I')  # ...and their positions (GONE once removed)
+        self.delta = {}          # key -> positions appended since the last merge
+        self.delta_ids = {}      # flight_id -> position in the delta
+
+    # ---------- maintenance ----------
+
+    def sync(self, conn):
+        """Apply the changes logged since the last sync (loading everything the first time)"""
+        today = date_cls.today().toordinal()
+        if self.seq is not None and self.day == today and change_log.latest(conn) == self.seq:
+            return
+        with self._lock:
+            if self.seq is None:
+                self._load(conn, today)
+                return
+            seq, flight_ids = change_log.since(conn, self.seq)
+            if flight_ids is None:
+                self._load(conn, today)
+                return
+            flight_ids = sorted(flight_ids)
+            for i in range(0, len(flight_ids), FETCH_CHUNK):
+                chunk = flight_ids[i:i + FETCH_CHUNK]
+                rows = {row[FLIGHT_ID]: row for row in conn.execute(
+                    f"{FLIGHTS_SQL} flight_id IN ({','.join('?' * len(chunk))})", chunk)}
+                for flight_id in chunk:
+                    self._apply(flight_id, rows.get(flight_id), today)
+            self.seq = seq
+            if self.day != today or len(self.delta_ids) > self.merge_threshold:
+                self._merge(today)
+
+    def _load(self, conn, today):
+        # The seq is read first: anything committed meanwhile is also replayed later, which is harmless
+        seq = change_log.latest(conn)
+        self._reset()
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples: rows are only unpacked column-wise
+        # Departed flights are archived, so nearly every row qualifies: scan the table, not idx_flights_schedule
+        cursor.execute(f'{FLIGHTS_SQL} +date >= ?', (date_cls.fromordinal(today).isoformat(),))
+        valid_dates = {}
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK)
+            if not rows:
+                break
+            for row in rows:
+                if row[DATE] not in valid_dates:
+                    valid_dates[row[DATE]] = to_ordinal(row[DATE]) is not None
+            self._append([row for row in rows if valid_dates[row[DATE]]])
+        self._merge(today, range(len(self.cols['key'])))
+        self.seq = seq
+        self.loads += 1
+
+    def _find(self, flight_id):
+        if flight_id in self.delta_ids:
+            return self.delta_ids[flight_id]
+        i = bisect.bisect_left(self.ids, flight_id)
+        if i < len(self.ids) and self.ids[i] == flight_id and self.id_pos[i] != GONE:
+            return self.id_pos[i]
+        return None
+
+    def _apply(self, flight_id, row, today):
+        pos = self._find(flight_id)
+        ordinal = row and to_ordinal(row[DATE])
+        if row is None or ordinal is None or ordinal < today:
+            if pos is not None:
+                self._remove(flight_id, pos)
+            return
+        key = pack_key(row[SOURCE_ID], row[DESTINATION_ID], ordinal)
+        if pos is not None and self.cols['key'][pos] == key and self._departure(pos) == row[DEPARTURE_TIME]:
+            # Same slot in the sort order: seats, fares and the rest are patched in place
+            self._write(pos, row)
+            return
+        if pos is not None:
+            self._remove(flight_id, pos)
+        pos = self._append([row])
+        self.delta.setdefault(key, []).append(pos)
+        self.delta_ids[flight_id] = pos
+
+    def _remove(self, flight_id, pos):
+        self.cols['available_seats'][pos] = 0
+        if self.delta_ids.get(flight_id) == pos:
+            del self.delta_ids[flight_id]
+            self.delta[self.cols['key'][pos]].remove(pos)
+        else:
+            self.id_pos[bisect.bisect_left(self.ids, flight_id)] = GONE
+
+    def _encode(self, rows):
+        """Column values for flight rows (FIELDS order), plus {row index: fields that only fit in `extra`}
+
+        Works a column at a time; times, dates and prices repeat a lot,
+        so each distinct value is converted once.
+        """
+        fields = dict(zip(FIELDS, zip(*rows)))
+        values, extra = {}, {}
+
+        def convert(field, fn):
+            memo = {}
+            codes = [memo[v] if v in memo else memo.setdefault(v, fn(v)) for v in fields[field]]
+            if None in codes:
+                for i, code in enumerate(codes):
+                    if code is None:
+                        extra.setdefault(i, {})[field] = fields[field][i]
+                        codes[i] = 0
+            return codes
+
+        prefixes, serials = [], []
+        for number in fields['flight_number']:
+            prefix = number.rstrip('0123456789')
+            digits = number[len(prefix):]
+            if prefix and digits and digits[0] != '0' and len(digits) <= 9:
+                prefixes.append(prefix)
+                serials.append(int(digits))
+            else:
+                prefixes.append(number)
+                serials.append(NO_SERIAL)
+        fields['number_prefix'] = prefixes
+        values['number_serial'] = serials
+        for name in STRING_COLUMNS:
+            table = self.strings[name]
+            ids = table.ids
+            values[name] = [ids[v] if v in ids else table.intern(v) for v in fields[name]]
+
+        ordinals = convert('date', to_ordinal)
+        values['key'] = [pack_key(s, d, o) for s, d, o in zip(fields['source_id'], fields['destination_id'], ordinals)]
+        values['flight_id'] = fields['flight_id']
+        values['departure'] = convert('departure_time', to_minutes)
+        values['arrival'] = convert('arrival_time', to_minutes)
+        for name, field in (('price', 'price'), ('economy', 'fare_economy'), ('business', 'fare_business'),
+                            ('first', 'fare_first')):
+            values[name] = convert(field, to_cents)
+        values['total_seats'] = fields['total_seats']
+        values['available_seats'] = fields['available_seats']
+        return values, extra
+
+    def _write(self, pos, row):
+        values, extra = self._encode([row])
+        for name, column in values.items():
+            self.cols[name][pos] = column[0]
+        if extra:
+            self.extra[pos] = extra[0]
+        else:
+            self.extra.pop(pos, None)
+
+    def _append(self, rows):
+        """Append rows at the end of the columns; returns the position of the last one"""
+        start = len(self.cols['key'])
+        values, extra = self._encode(rows)
+        for name, column in values.items():
+            self.cols[name].extend(column)
+        for i, fields in extra.items():
+            self.extra[start + i] = fields
+        return len(self.cols['key']) - 1
+
+    def _merge(self, today, live=None):
+        """Re-sort live rows (default: all but removed ones) into the sorted region, dropping departed flights"""
+        keys, departures = self.cols['key'], self.cols['departure']
+        if live is None:
+            live = [pos for pos in self.id_pos if pos != GONE]
+            live.extend(self.delta_ids.values())
+        live = [pos for pos in live if keys[pos] & 0xFFFFF >= today]
+        # Departure minutes fit in 11 bits; ties are re-ordered by flight_id per search
+        order = [key << 11 | departure for key, departure in zip(keys, departures)]
+        live.sort(key=order.__getitem__)
+
+        self.cols = {name: _take(column, live) for name, column in self.cols.items()}
+        moved = {old: new for new, old in enumerate(live) if old in self.extra}
+        self.extra = {moved[old]: fields for old, fields in self.extra.items() if old in moved}
+        flight_ids = self.cols['flight_id']
+        by_id = sorted(range(len(live)), key=flight_ids.__getitem__)
+        self.ids = _take(flight_ids, by_id)
+        self.id_pos = array('I', by_id)
+        self.sorted_count = len(live)
+        self.delta, self.delta_ids = {}, {}
+        self.day = today
+        self.merges += 1
+
+    # ---------- queries ----------
+
+    def _departure(self, pos):
+        extra = self.extra.get(pos)
+        if extra and 'departure_time' in extra:
+            return extra['departure_time']
+        return format_minutes(self.cols['departure'][pos])
+
+    def _flight(self, pos):
+        cols, strings = self.cols, self.strings
+        source_id, destination_id, ordinal = unpack_key(cols['key'][pos])
+        prefix, serial = strings['number_prefix'].values[cols['number_prefix'][pos]], cols['number_serial'][pos]
+        flight = {
+            'flight_id': cols['flight_id'][pos],
+            'flight_number': prefix if serial == NO_SERIAL else f'{prefix}{serial}',
+            'airline': strings['airline'].values[cols['airline'][pos]],
+            'aircraft': strings['aircraft'].values[cols['aircraft'][pos]],
+            'source': strings['source'].values[cols['source'][pos]],
+            'destination': strings['destination'].values[cols['destination'][pos]],
+            'date': date_cls.fromordinal(ordinal).isoformat(),
+            'departure_time': format_minutes(cols['departure'][pos]),
+            'arrival_time': format_minutes(cols['arrival'][pos]),
+            'price': cols['price'][pos] / 100,
+            'total_seats': cols['total_seats'][pos],
+            'available_seats': cols['available_seats'][pos],
+            'created_at': strings['created_at'].values[cols['created_at'][pos]],
+            'source_id': source_id,
+            'destination_id': destination_id,
+        }
+        for name in ('economy', 'business', 'first'):
+            cents = cols[name][pos]
+            flight[f'fare_{name}'] = None if cents == NO_FARE else cents / 100
+        flight.update(self.extra.get(pos, ()))
+        return flight
+
+    def query_route(self, conn, source_ids, destination_ids, date, after_time=None):
+        """Same result as search_engine.query_route, from memory (`date` must be an ISO date)"""
+        self.sync(conn)
+        ordinal = to_ordinal(date)
+        with self._lock:
+            keys, available = self.cols['key'], self.cols['available_seats']
+            flights = []
+            for source_id in source_ids:
+                for destination_id in destination_ids:
+                    key = pack_key(source_id, destination_id, ordinal)
+                    lo = bisect.bisect_left(keys, key, 0, self.sorted_count)
+                    hi = bisect.bisect_right(keys, key, lo, self.sorted_count)
+                    flights.extend(self._flight(pos) for pos in (*range(lo, hi), *self.delta.get(key, ()))
+                                   if available[pos] > 0)
+        if after_time:
+            flights = [f for f in flights if f['departure_time'] > after_time]
+        flights.sort(key=lambda f: (f['departure_time'], f['flight_id']))
+        return pricing.attach_fares(flights)
+
+    def stats(self):
+        """Row counts and memory use (columns, interned strings, by-id index and overflow fields)"""
+        rows = len(self.cols['key'])
+        live = sum(1 for pos in self.id_pos if pos != GONE) + len(self.delta_ids)
+        columns = sum(column.itemsize * len(column) for column in self.cols.values())
+        index = self.ids.itemsize * len(self.ids) + self.id_pos.itemsize * len(self.id_pos)
+        strings = sum(table.nbytes() for table in self.strings.values())
+        other = sys.getsizeof(self.extra) + sys.getsizeof(self.delta) + sys.getsizeof(self.delta_ids)
+        total = columns + index + strings + other
+        return {
+            'enabled': ENABLED,
+            'flights': live,
+            'rows': rows,
+            'delta': len(self.delta_ids),
+            'seq': self.seq,
+            'loads': self.loads,
+            'merges': self.merges,
+            'bytes': {'columns': columns, 'index': index, 'strings': strings, 'other': other, 'total': total},
+            'bytes_per_flight': round(total / rows, 1) if rows else 0.0,
+            'mb_per_million_flights': round(total / rows * 1e6 / 2 ** 20, 1) if rows else 0.0,
+        }
+
+
+snapshot = ScheduleSnapshot()
+
+
+def search(conn, source_ids, destination_ids, date, after_time=None):
+    """Bookable flights for resolved airport IDs, from this worker's snapshot"""
+    if not source_ids or not destination_ids:
+        return []
+    analytics.searches.record(source_ids, destination_ids)
+    if to_ordinal(date) is None:
+        # Not an ISO date: nothing in the snapshot can match it, so ask SQLite as before
+        return search_engine.query_route(conn, source_ids, destination_ids, date, after_time)
+    return snapshot.query_route(conn, source_ids, destination_ids, date, after_time)
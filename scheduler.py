@@ -0,0 +1,241 @@
+"""Background maintenance: hold expiry, flight-pool top-up, repricing, archival, change-log trimming
+
+Every worker process starts a scheduler thread on its first request
+(scheduler.init_app), but only the holder of the
+'maintenance' lease (a row in scheduler_leases) runs jobs, so N gunicorn
+workers never do the same work N times. Jobs write in small batches, one
+short transaction each, so live searches and bookings are never held up
+behind a long write. The lease is renewed on each tick, before each job
+and between batches inside a job, so a job that runs longer than
+SCHEDULER_LEASE keeps it; if renewal fails the job stops at the next
+batch and the tick ends.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+
+import analytics
+import change_log
+import db
+import holds
+import http_cache
+import partitions
+import pricing
+
+ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK', 5))
+LEASE_SECONDS = float(os.environ.get('SCHEDULER_LEASE', 30))
+
+FLIGHT_POOL_MIN = int(os.environ.get('FLIGHT_POOL_MIN', 500))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 1))
+BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', 500))
+BATCH_PAUSE = 0.01
+
+LEASE_NAME = 'maintenance'
+# Renew once this much of the lease has passed, not on every batch
+RENEW_AFTER = LEASE_SECONDS / 3
+
+
+class LeaseLost(Exception):
+    """Another process took the lease while this one was running jobs"""
+
+# ==================== LEADER LEASE ====================
+
+def try_acquire_lease(conn, owner, name=LEASE_NAME, ttl=LEASE_SECONDS):
+    """Take or renew the lease; True if `owner` holds it afterwards"""
+    now = time.time()
+    db.begin_immediate(conn)
+    try:
+        conn.execute('''
+            INSERT INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE scheduler_leases.owner = excluded.owner OR scheduler_leases.expires_at < ?
+        ''', (name, owner, now + ttl, now))
+        holder = conn.execute('SELECT owner FROM scheduler_leases WHERE name = ?', (name,)).fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return holder == owner
+
+
+def release_lease(conn, owner, name=LEASE_NAME):
+    with conn:
+        conn.execute('DELETE FROM scheduler_leases WHERE name = ? AND owner = ?', (name, owner))
+
+# ==================== JOBS ====================
+
+def top_up_flight_pool(conn, minimum=FLIGHT_POOL_MIN, batch_size=100, between_batches=None):
+    """Generate flights until at least `minimum` future flights exist"""
+    from flight_utils import generate_flights
+
+    count = conn.execute("SELECT COUNT(*) FROM flights WHERE date >= date('now')").fetchone()[0]
+    added = 0
+    while count + added < minimum:
+        batch = min(batch_size, minimum - count - added)
+        if not generate_flights(conn, batch):
+            break
+        added += batch
+        _pause(between_batches)
+    return added
+
+
+def archive_departed_flights(conn, days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, between_batches=None):
+    """Move flights that departed `days` ago, with their bookings, into monthly archive partitions"""
+    cutoff = f'-{days} days'
+    moved = 0
+    while True:
+        # Oldest departed flight first; idx_flights_schedule makes this a single probe
+        row = conn.execute('''
+            SELECT date FROM flights WHERE date < date('now', ?) ORDER BY date LIMIT 1
+        ''', (cutoff,)).fetchone()
+        if row is None:
+            break
+        moved += partitions.archive_flights(conn, row[0][:7], cutoff, batch_size)
+        _pause(between_batches)
+
+    # Bookings archived before partitioning existed
+    while partitions.drain_legacy_archive(conn, batch_size):
+        _pause(between_batches)
+
+    with conn:
+        conn.execute("DELETE FROM fare_calendar WHERE date < date('now', ?)", (cutoff,))
+        http_cache.purge_routes(conn, cutoff)
+    partitions.seal_closed(conn, cutoff)
+    return moved
+
+
+def _pause(between_batches):
+    time.sleep(BATCH_PAUSE)
+    if between_batches is not None:
+        between_batches()
+
+
+JOBS = [
+    # (name, interval in seconds, function(conn, between_batches))
+    ('reclaim_expired_holds', float(os.environ.get('HOLD_RECLAIM_INTERVAL', 15)), holds.reclaim_expired),
+    ('top_up_flight_pool', float(os.environ.get('TOP_UP_INTERVAL', 300)), top_up_flight_pool),
+    ('archive_departed_flights', float(os.environ.get('ARCHIVE_INTERVAL', 3600)), archive_departed_flights),
+    ('reprice_flights', float(os.environ.get('REPRICE_INTERVAL', 900)), pricing.reprice_all),
+    ('trim_change_log', float(os.environ.get('CHANGE_LOG_TRIM_INTERVAL', 600)),
+     lambda conn, between_batches=None: change_log.trim(conn)),
+]
+
+# ==================== WORKER ====================
+
+class Scheduler:
+    """Runs due JOBS on a daemon thread while this process holds the lease"""
+
+    def __init__(self, jobs=JOBS, tick=TICK_SECONDS):
+        self.jobs = jobs
+        self.tick = tick
+        self.owner = self._new_owner()
+        self.last_run = {}
+        self.is_leader = False
+        self._renewed = float('-inf')
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @staticmethod
+    def _new_owner():
+        return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def start(self):
+        # Once per process: a thread started before a fork (gunicorn --preload) does not exist in the child
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is None or self._pid != pid:
+                # The lease owner names this process, not the one that imported the module
+                self.owner = self._new_owner()
+                self.is_leader = False
+                self._thread = threading.Thread(target=self._loop, name='flight-scheduler', daemon=True)
+                self._pid = pid
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.is_leader:
+            with db.pooled_connection() as conn:
+                release_lease(conn, self.owner)
+            self.is_leader = False
+
+    def run_due(self, conn, force=False, keep_lease=None):
+        """Run every job whose interval has elapsed; returns {name: result}
+
+        keep_lease(), if given, is called before each job and between its
+        batches and raises LeaseLost to end the run.
+        """
+        results = {}
+        for name, interval, job in self.jobs:
+            now = time.monotonic()
+            if force or now - self.last_run.get(name, float('-inf')) >= interval:
+                try:
+                    if keep_lease is not None:
+                        keep_lease()
+                    results[name] = job(conn, between_batches=keep_lease)
+                except LeaseLost:
+                    print(f"Scheduler Warning: lease lost during {name}; stopping this tick")
+                    break
+                except Exception as e:
+                    results[name] = e
+                    print(f"Scheduler Warning: {name} failed: {e}")
+                self.last_run[name] = time.monotonic()
+        return results
+
+    def keep_lease(self, conn):
+        """Renew the lease if a third of it has passed; raises LeaseLost if another process holds it"""
+        now = time.monotonic()
+        if now - self._renewed < RENEW_AFTER:
+            return
+        self.is_leader = try_acquire_lease(conn, self.owner)
+        if not self.is_leader:
+            raise LeaseLost(LEASE_NAME)
+        self._renewed = now
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with db.pooled_connection() as conn:
+                    # Search counts are buffered per worker, so every worker flushes its own
+                    analytics.searches.flush(conn)
+                    self.is_leader = try_acquire_lease(conn, self.owner)
+                    if self.is_leader:
+                        self._renewed = time.monotonic()
+                        self.run_due(conn, keep_lease=lambda: self.keep_lease(conn))
+            except Exception as e:
+                print(f"Scheduler Warning: {e}")
+            self._stop.wait(self.tick)
+
+
+scheduler = Scheduler()
+
+
+def start():
+    """Start the background scheduler for this process (if enabled)"""
+    if ENABLED:
+        scheduler.start()
+
+
+def init_app(app):
+    """Start the scheduler lazily on each worker's first request
+
+    Not at import: under gunicorn --preload the app is imported in the
+    master, and a thread started there is not inherited by the workers.
+    """
+    app.before_request(start)
+
+
+if __name__ == '__main__':
+    # One-off run of every job, e.g. from cron
+    with db.pooled_connection() as conn:
+        for name, result in Scheduler().run_due(conn, force=True).items():
+            print(f'{name}: {result}')
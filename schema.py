@@ -0,0 +1,266 @@
+"""Schema migrations applied on top of the base tables from init_db.py"""
+import sqlite3
+
+import db
+
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS airports (
+        airport_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT UNIQUE,
+        city TEXT NOT NULL,
+        label TEXT UNIQUE NOT NULL,
+        region TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fare_calendar (
+        source_id INTEGER NOT NULL,
+        destination_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        min_price REAL NOT NULL,
+        flights_available INTEGER NOT NULL,
+        PRIMARY KEY (source_id, destination_id, date)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS scheduler_leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS bookings_archive (
+        booking_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        flight_id INTEGER NOT NULL,
+        seats_booked INTEGER NOT NULL,
+        booking_class TEXT,
+        seat_numbers TEXT,
+        passenger_names TEXT NOT NULL,
+        total_price REAL NOT NULL,
+        booking_date TIMESTAMP,
+        status TEXT,
+        flight_number TEXT,
+        source TEXT,
+        destination TEXT,
+        date TEXT,
+        departure_time TEXT,
+        arrival_time TEXT,
+        archived_at TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS seat_maps (
+        flight_id INTEGER NOT NULL REFERENCES flights(flight_id),
+        cabin_class TEXT NOT NULL,
+        bitmap BLOB NOT NULL,
+        PRIMARY KEY (flight_id, cabin_class)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS trip_summaries (
+        booking_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        flight_id INTEGER NOT NULL,
+        seats_booked INTEGER NOT NULL,
+        booking_class TEXT,
+        seat_numbers TEXT,
+        total_price REAL NOT NULL,
+        booking_date TIMESTAMP,
+        status TEXT,
+        flight_number TEXT,
+        source TEXT,
+        destination TEXT,
+        date TEXT,
+        departure_time TEXT,
+        arrival_time TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS seat_holds (
+        hold_id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        flight_id INTEGER NOT NULL,
+        seats INTEGER NOT NULL,
+        cabin_class TEXT NOT NULL,
+        seat_numbers TEXT,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analytics_routes (
+        source_id INTEGER NOT NULL,
+        destination_id INTEGER NOT NULL,
+        flights INTEGER NOT NULL DEFAULT 0,
+        total_seats INTEGER NOT NULL DEFAULT 0,
+        available_seats INTEGER NOT NULL DEFAULT 0,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (source_id, destination_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analytics_airlines (
+        airline TEXT PRIMARY KEY,
+        flights INTEGER NOT NULL DEFAULT 0,
+        total_seats INTEGER NOT NULL DEFAULT 0,
+        available_seats INTEGER NOT NULL DEFAULT 0,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analytics_classes (
+        booking_class TEXT PRIMARY KEY,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analytics_searches (
+        source_id INTEGER NOT NULL,
+        destination_id INTEGER NOT NULL,
+        searches INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source_id, destination_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS archive_partitions (
+        month TEXT PRIMARY KEY,
+        flights INTEGER NOT NULL DEFAULT 0,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        sealed INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS archive_user_months (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        first_booking TIMESTAMP,
+        last_booking TIMESTAMP,
+        PRIMARY KEY (user_id, month)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fares (
+        flight_id INTEGER PRIMARY KEY,
+        economy REAL NOT NULL,
+        business REAL NOT NULL,
+        first REAL NOT NULL,
+        priced_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS flight_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        flight_id INTEGER,
+        changed_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS flight_number_seq (
+        airline_code TEXT PRIMARY KEY,
+        next_serial INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+]
+
+COLUMNS = [
+    ('flights', 'source_id', 'INTEGER REFERENCES airports(airport_id)'),
+    ('flights', 'destination_id', 'INTEGER REFERENCES airports(airport_id)'),
+    # Archived revenue still needs its airline once the flight is purged
+    ('bookings_archive', 'airline', 'TEXT'),
+]
+
+FLIGHT_INDEXES = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_flights_route_date
+    ON flights(source_id, destination_id, date, departure_time)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_flights_schedule
+    ON flights(date, departure_time)
+    ''',
+]
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_bookings_flight ON bookings(flight_id)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_archive_user ON bookings_archive(user_id, booking_date)',
+    # booking_id is the rowid, so these also order ties for keyset pages
+    'CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings(user_id, booking_date)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_user_status ON bookings(user_id, status, booking_date)',
+    'CREATE INDEX IF NOT EXISTS idx_trip_summaries_upcoming ON trip_summaries(user_id, date, departure_time)',
+    # Expiry sweeps read only the expired prefix of this index
+    'CREATE INDEX IF NOT EXISTS idx_seat_holds_expiry ON seat_holds(expires_at)',
+    'CREATE INDEX IF NOT EXISTS idx_seat_holds_user ON seat_holds(user_id, expires_at)',
+]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def drop_flight_indexes(conn):
+    """Drop secondary flight indexes ahead of a bulk load"""
+    for ddl in FLIGHT_INDEXES:
+        name = ddl.split('EXISTS')[1].split()[0]
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def create_flight_indexes(conn):
+    """(Re)build secondary flight indexes and refresh planner statistics"""
+    for ddl in FLIGHT_INDEXES:
+        conn.execute(ddl)
+    conn.execute('ANALYZE flights')
+
+
+def ensure_schema(conn):
+    """Create missing tables, columns and indexes, then backfill derived data"""
+    import analytics
+    import fare_calendar
+    import history
+    import http_cache
+    import pricing
+    import search_engine
+    import seatmap
+
+    db.begin_immediate(conn)
+    try:
+        for ddl in TABLES:
+            conn.execute(ddl)
+        for table, column, decl in COLUMNS:
+            if column not in _columns(conn, table):
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+        for ddl in FLIGHT_INDEXES + INDEXES:
+            conn.execute(ddl)
+
+        search_engine.seed_airports(conn)
+        search_engine.backfill_flight_airports(conn)
+        http_cache.ensure_epoch(conn)
+        if not conn.execute('SELECT 1 FROM fare_calendar LIMIT 1').fetchone():
+            fare_calendar.rebuild(conn)
+        if not conn.execute('SELECT 1 FROM trip_summaries LIMIT 1').fetchone():
+            history.rebuild_trips(conn)
+        if not conn.execute('SELECT 1 FROM analytics_airlines LIMIT 1').fetchone():
+            analytics.rebuild(conn)
+        if not conn.execute('SELECT 1 FROM fares LIMIT 1').fetchone():
+            pricing.price_new_flights(conn, 0)
+        if not conn.execute('SELECT 1 FROM seat_maps LIMIT 1').fetchone():
+            seatmap.seed_sold_seats(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
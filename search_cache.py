@@ -0,0 +1,278 @@
+"""Route/date search result cache with precise write-through invalidation
+
+Entries are keyed on the *resolved* route (airport ID sets) and date, so
+'delhi', 'Delhi (DEL)' and 'DEL' share one entry, and a write to a flight
+on (source_id, destination_id, date) can drop exactly the entries that
+could contain it.
+
+Backends:
+  memory  - per-process LRU (default; right for a single worker)
+  sqlite  - shared cache file so every gunicorn worker sees the same
+            entries and the same invalidations
+  none    - caching disabled
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import analytics
+import db
+import search_engine
+
+BACKEND = os.environ.get('SEARCH_CACHE_BACKEND', 'memory')
+TTL = float(os.environ.get('SEARCH_CACHE_TTL', 60))
+MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
+CACHE_PATH = os.environ.get('SEARCH_CACHE_PATH', 'search_cache.db')
+
+
+def make_key(source_ids, destination_ids, date, version=None):
+    # The date stays last: backends find an entry's date by splitting it off
+    return '{}|{}|{}{}'.format(
+        ','.join(map(str, sorted(source_ids))),
+        ','.join(map(str, sorted(destination_ids))),
+        '' if version is None else f'{version}|',
+        date
+    )
+
+
+class MemoryBackend:
+    """In-process LRU with TTL and a (route, date) reverse index"""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, routes, value)
+        self._by_date = {}              # date -> set of keys
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, date, routes, value):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, routes, value)
+            self._by_date.setdefault(date, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, source_id, destination_id, date):
+        with self._lock:
+            stale = [
+                key for key in self._by_date.get(date, ())
+                if (source_id, destination_id) in self._entries[key][1]
+            ]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_date.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        date = key.rsplit('|', 1)[1]
+        keys = self._by_date.get(date)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_date[date]
+
+
+class SQLiteBackend:
+    """Cache shared by all workers through a local SQLite file"""
+
+    TOUCH_INTERVAL = 1.0
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.evictions = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = db.connect(self.path)
+            # Entries are disposable, so skip fsync entirely
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+                CREATE TABLE IF NOT EXISTS entry_routes (
+                    source_id INTEGER NOT NULL,
+                    destination_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (source_id, destination_id, date, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_entry_routes_key ON entry_routes(key);
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute('SELECT value, expires_at, last_used FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row['expires_at'] < now:
+            return None
+        # Approximate LRU: only rewrite last_used once per TOUCH_INTERVAL
+        if now - row['last_used'] > self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+        return json.loads(row['value'])
+
+    def set(self, key, date, routes, value):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            self._delete(conn, [key])
+            conn.execute('INSERT INTO entries (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), now + self.ttl, now))
+            conn.executemany('INSERT OR IGNORE INTO entry_routes VALUES (?, ?, ?, ?)',
+                             [(s, d, date, key) for s, d in routes])
+            count = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            if count > self.max_entries:
+                victims = [row[0] for row in conn.execute(
+                    'SELECT key FROM entries ORDER BY last_used LIMIT ?', (count - self.max_entries,))]
+                self._delete(conn, victims)
+                self.evictions += len(victims)
+
+    def invalidate(self, source_id, destination_id, date):
+        conn = self._conn()
+        with conn:
+            keys = [row[0] for row in conn.execute(
+                'SELECT key FROM entry_routes WHERE source_id = ? AND destination_id = ? AND date = ?',
+                (source_id, destination_id, date))]
+            self._delete(conn, keys)
+        return len(keys)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM entry_routes')
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _delete(self, conn, keys):
+        for key in keys:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            conn.execute('DELETE FROM entry_routes WHERE key = ?', (key,))
+
+
+class SearchCache:
+    """Search cache front end with hit/miss counters"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def search(self, conn, source, destination, date, after_time=None, version=None):
+        """search_engine.search, served from the cache when possible
+
+        `version` (an http_cache.stamp() of the route) becomes part of the
+        key, so an entry filled before a write is never served under the
+        version that write created, even in a worker that missed the
+        invalidation.
+        """
+        source_ids, destination_ids = search_engine.resolve_route(conn, source, destination)
+        if not source_ids or not destination_ids:
+            return []
+        analytics.searches.record(source_ids, destination_ids)
+
+        if self.backend is None:
+            return search_engine.query_route(conn, source_ids, destination_ids, date, after_time)
+
+        key = make_key(source_ids, destination_ids, date, version)
+        try:
+            flights = self.backend.get(key)
+        except sqlite3.Error:
+            flights = None
+
+        if flights is None:
+            self.misses += 1
+            # Cache the whole day; the "after now" cut for today is applied per request
+            flights = search_engine.query_route(conn, source_ids, destination_ids, date)
+            routes = {(s, d) for s in source_ids for d in destination_ids}
+            try:
+                self.backend.set(key, date, routes, flights)
+            except sqlite3.Error:
+                pass
+        else:
+            self.hits += 1
+
+        if after_time:
+            flights = [f for f in flights if f['departure_time'] > after_time]
+        return flights
+
+    def invalidate(self, source_id, destination_id, date):
+        """Drop cached searches that could include a flight on this route and date"""
+        if self.backend is None:
+            return
+        self.invalidations += self.backend.invalidate(source_id, destination_id, date)
+
+    def invalidate_flight(self, flight):
+        self.invalidate(flight['source_id'], flight['destination_id'], flight['date'])
+
+    def clear(self):
+        """Drop every cached search (after changes too widespread to track per route)"""
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'evictions': getattr(self.backend, 'evictions', 0),
+            'entries': self.backend.size() if self.backend else 0,
+        }
+
+
+def make_backend(name=BACKEND):
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'none':
+        return None
+    return MemoryBackend()
+
+
+cache = SearchCache(make_backend())
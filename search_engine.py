@@ -0,0 +1,177 @@
+import re
+import threading
+
+import pricing
+from flight_utils import AIRPORTS
+
+AIRPORT_LABEL = re.compile(r'^\s*(?P<city>.*?)\s*\((?P<code>[A-Za-z]{3})\)\s*$')
+
+# ==================== AIRPORTS ====================
+
+def parse_airport(label):
+    """Split a label like 'Delhi (DEL)' into (city, code)"""
+    label = label.strip()
+    match = AIRPORT_LABEL.match(label)
+    if match:
+        return match.group('city'), match.group('code').upper()
+    if len(label) == 3 and label.isalpha():
+        return label.upper(), label.upper()
+    return label, None
+
+
+def seed_airports(conn):
+    """Insert the airports from flight_utils.AIRPORTS (idempotent)"""
+    rows = []
+    for region, labels in AIRPORTS.items():
+        for label in labels:
+            city, code = parse_airport(label)
+            rows.append((code, city, label, region))
+    conn.executemany('''
+        INSERT OR IGNORE INTO airports (code, city, label, region)
+        VALUES (?, ?, ?, ?)
+    ''', rows)
+
+
+def get_or_create_airport(conn, label):
+    """Resolve a free-text airport label to an airport_id, creating it if unknown"""
+    city, code = parse_airport(label)
+
+    row = conn.execute('SELECT airport_id FROM airports WHERE label = ?', (label.strip(),)).fetchone()
+    if row:
+        return row[0]
+    if code:
+        row = conn.execute('SELECT airport_id FROM airports WHERE code = ?', (code,)).fetchone()
+    else:
+        row = conn.execute('SELECT airport_id FROM airports WHERE LOWER(city) = LOWER(?)', (city,)).fetchone()
+    if row:
+        return row[0]
+
+    cursor = conn.execute('''
+        INSERT INTO airports (code, city, label) VALUES (?, ?, ?)
+    ''', (code, city, label.strip()))
+    return cursor.lastrowid
+
+
+def airport_ids_by_label(conn):
+    """Map of airport label -> airport_id"""
+    return {row[0]: row[1] for row in conn.execute('SELECT label, airport_id FROM airports')}
+
+
+def backfill_flight_airports(conn):
+    """Fill source_id/destination_id for flights written before airports existed"""
+    for column, id_column in (('source', 'source_id'), ('destination', 'destination_id')):
+        labels = conn.execute(f'SELECT DISTINCT {column} FROM flights WHERE {id_column} IS NULL').fetchall()
+        for (label,) in labels:
+            conn.execute(f'UPDATE flights SET {id_column} = ? WHERE {column} = ? AND {id_column} IS NULL',
+                         (get_or_create_airport(conn, label), label))
+
+# ==================== RESOLVER ====================
+
+class AirportResolver:
+    """In-memory map from user input to airport IDs, reloaded when airports change"""
+
+    def __init__(self):
+        self._airports = []
+        self._max_id = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, conn):
+        max_id = conn.execute('SELECT MAX(airport_id) FROM airports').fetchone()[0]
+        if max_id == self._max_id:
+            return
+        with self._lock:
+            rows = conn.execute('SELECT airport_id, code, city, label FROM airports').fetchall()
+            self._airports = [
+                (row[0], (row[1] or '').lower(), row[2].lower(), row[3].lower())
+                for row in rows
+            ]
+            self._max_id = max_id
+
+    def resolve(self, conn, text):
+        """Airport IDs matching the input: exact IATA code, else a substring of the label"""
+        self._refresh(conn)
+        needle = text.strip().lower()
+        if not needle:
+            return []
+
+        by_code = [airport_id for airport_id, code, _, _ in self._airports if code == needle]
+        if by_code:
+            return by_code
+        return [airport_id for airport_id, _, _, label in self._airports if needle in label]
+
+
+resolver = AirportResolver()
+
+# ==================== SEARCH ====================
+
+def resolve_route(conn, source, destination):
+    """Airport ID lists for free-text source and destination"""
+    return resolver.resolve(conn, source), resolver.resolve(conn, destination)
+
+
+def query_route(conn, source_ids, destination_ids, date, after_time=None):
+    """Bookable flights between airport ID sets on a date, via the route/date index"""
+    if not source_ids or not destination_ids:
+        return []
+
+    query = f'''
+        SELECT flights.*, fares.economy AS fare_economy, fares.business AS fare_business,
+               fares.first AS fare_first
+        FROM flights LEFT JOIN fares USING (flight_id)
+        WHERE source_id IN ({','.join('?' * len(source_ids))})
+        AND destination_id IN ({','.join('?' * len(destination_ids))})
+        AND date = ?
+        AND available_seats > 0
+    '''
+    params = [*source_ids, *destination_ids, date]
+
+    if after_time:
+        query += ' AND departure_time > ?'
+        params.append(after_time)
+
+    query += ' ORDER BY departure_time'
+
+    return pricing.attach_fares([dict(row) for row in conn.execute(query, params).fetchall()])
+
+
+def search(conn, source, destination, date, after_time=None):
+    """Bookable flights on a route and date for free-text airport input"""
+    source_ids, destination_ids = resolve_route(conn, source, destination)
+    return query_route(conn, source_ids, destination_ids, date, after_time)
+
+# ==================== LISTING ====================
+
+LISTING_ORDER = ('date', 'departure_time', 'flight_id')
+
+
+def listing_query(conn, source=None, destination=None, date_from=None, date_to=None,
+                  airline=None, after=None, limit=None):
+    """SQL and params for a filtered, keyset-ordered scan of flights"""
+    where, params = [], []
+
+    for text, column in ((source, 'source_id'), (destination, 'destination_id')):
+        if text:
+            ids = resolver.resolve(conn, text) or [-1]
+            where.append(f"{column} IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+    if date_from:
+        where.append('date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('date <= ?')
+        params.append(date_to)
+    if airline:
+        where.append('airline = ?')
+        params.append(airline)
+    if after:
+        where.append(f"({', '.join(LISTING_ORDER)}) > (?, ?, ?)")
+        params.extend(after)
+
+    query = 'SELECT * FROM flights'
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += f" ORDER BY {', '.join(LISTING_ORDER)}"
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
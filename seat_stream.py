@@ -0,0 +1,258 @@
+"""Live seat availability over server-sent events (GET /api/flights/stream?ids=1,2,3)
+
+Bookings, holds and cancellations append to change_log in their own
+transaction. One broadcaster thread per worker polls that log every
+STREAM_POLL_MS; when a flight somebody is watching changed, it reads the
+flight's seat count and seat maps once, diffs them against the last
+state it sent, and pushes the same encoded event to every subscriber of
+that flight. A thousand browsers on one flight cost one poll and one
+read per change, not a thousand searches.
+
+A new subscriber first gets a full event per flight (seat count plus
+base64 occupancy bitmaps, as in GET /api/flights/<id>/seats); after that
+only changes arrive, as lists of newly taken and freed seats per cabin.
+A subscriber that falls MAX_PENDING_EVENTS behind is disconnected, and
+EventSource reconnects and starts from a fresh full state.
+
+Under asgi.py each stream is a coroutine, and asgi.py turns the stream
+on. Under gunicorn's sync workers an open stream would hold the whole
+worker, so there the route answers 204 (EventSource stops reconnecting)
+and the page keeps the seat counts from its last search. SEAT_STREAM=1
+enables it anyway for threaded or gevent workers; each WSGI stream then
+ends after STREAM_MAX_SECONDS and EventSource reconnects.
+"""
+import base64
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import change_log
+import db
+import seatmap
+
+STREAM_PATH = '/api/flights/stream'
+POLL_SECONDS = float(os.environ.get('STREAM_POLL_MS', 500)) / 1000
+HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT', 15))
+MAX_STREAM_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 300))
+MAX_STREAM_FLIGHTS = 100
+MAX_PENDING_EVENTS = 256
+RETRY_MS = 3000
+
+# Set by asgi.py, which serves streams as coroutines
+enabled = os.environ.get('SEAT_STREAM', '0') == '1'
+
+HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+HEARTBEAT = b': ping\n\n'
+
+
+def parse_ids(text):
+    """Flight IDs from a comma-separated ?ids= value; raises ValueError with a message for the client"""
+    try:
+        flight_ids = list(dict.fromkeys(int(part) for part in text.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of flight IDs')
+    if not flight_ids:
+        raise ValueError('ids is required')
+    if len(flight_ids) > MAX_STREAM_FLIGHTS:
+        raise ValueError(f'At most {MAX_STREAM_FLIGHTS} flights per stream')
+    return flight_ids
+
+
+def encode(payload):
+    return f"event: seats\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+
+def load_states(conn, flight_ids):
+    """{flight_id: (available_seats, {cabin: bitmap bytes})} for the flights that exist"""
+    flight_ids = list(flight_ids)
+    marks = ','.join('?' * len(flight_ids))
+    total_seats, states = {}, {}
+    for flight_id, available, total in conn.execute(
+            f'SELECT flight_id, available_seats, total_seats FROM flights WHERE flight_id IN ({marks})', flight_ids):
+        total_seats[flight_id] = total
+        states[flight_id] = (available, {cabin: seatmap.empty_bitmap(cabin, total) for cabin in seatmap.CABIN_LAYOUTS})
+    for flight_id, cabin_class, bitmap in conn.execute(
+            f'SELECT flight_id, cabin_class, bitmap FROM seat_maps WHERE flight_id IN ({marks})', flight_ids):
+        if flight_id in states and cabin_class in seatmap.CABIN_LAYOUTS:
+            states[flight_id][1][cabin_class] = bytes(seatmap.fit_bitmap(bitmap, cabin_class, total_seats[flight_id]))
+    return states
+
+
+def full_event(flight_id, state):
+    available, cabins = state
+    return encode({
+        'flight_id': flight_id,
+        'available_seats': available,
+        'cabins': {cabin: {'occupied': base64.b64encode(bitmap).decode('ascii')} for cabin, bitmap in cabins.items()},
+    })
+
+
+def delta_event(flight_id, before, after):
+    """Event for what changed between two states, or None if nothing did"""
+    cabins = {}
+    for cabin, bitmap in after[1].items():
+        taken, freed = seatmap.changed_seats(cabin, before[1].get(cabin, bitmap), bitmap)
+        if taken or freed:
+            cabins[cabin] = {'taken': taken, 'freed': freed}
+    if not cabins and before[0] == after[0]:
+        return None
+    return encode({'flight_id': flight_id, 'available_seats': after[0], 'cabins': cabins})
+
+
+class Subscription:
+    """Events waiting for one client; filled by the broadcaster thread, drained by the stream"""
+
+    def __init__(self, flight_ids, wake):
+        self.flight_ids = flight_ids
+        self.overflowed = False
+        self.closed = False
+        self._events = deque()
+        self._wake = wake
+
+    def push(self, event):
+        if len(self._events) >= MAX_PENDING_EVENTS:
+            self.overflowed = True
+        else:
+            self._events.append(event)
+        self._wake()
+
+    def drain(self):
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+
+class Broadcaster:
+    """Polls change_log for the whole worker and fans seat changes out to subscriptions"""
+
+    def __init__(self, poll_seconds=POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.seq = None
+        self.polls = 0
+        self.events = 0
+        self._states = {}     # watched flight_id -> last state sent
+        self._watchers = {}   # flight_id -> set of subscriptions
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, conn, flight_ids, wake):
+        """Register a client; its first events (full state of each existing flight) are already queued"""
+        subscription = Subscription(flight_ids, wake)
+        with self._lock:
+            if self.seq is None:
+                self.seq = change_log.latest(conn)
+            missing = [flight_id for flight_id in flight_ids if flight_id not in self._states]
+            if missing:
+                self._states.update(load_states(conn, missing))
+            for flight_id in flight_ids:
+                self._watchers.setdefault(flight_id, set()).add(subscription)
+                if flight_id in self._states:
+                    subscription.push(full_event(flight_id, self._states[flight_id]))
+        self._ensure_thread()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            for flight_id in subscription.flight_ids:
+                watchers = self._watchers.get(flight_id)
+                if watchers is None:
+                    continue
+                watchers.discard(subscription)
+                if not watchers:
+                    del self._watchers[flight_id]
+                    self._states.pop(flight_id, None)
+
+    def poll(self, conn):
+        """Push events for watched flights changed since the last poll"""
+        self.polls += 1
+        if change_log.latest(conn) == self.seq:
+            return
+        with self._lock:
+            seq, changed = change_log.since(conn, self.seq)
+            # After a reset every watched flight is re-read; unchanged ones produce no event
+            flight_ids = set(self._watchers) if changed is None else changed & self._watchers.keys()
+            states = load_states(conn, flight_ids) if flight_ids else {}
+            for flight_id in flight_ids:
+                before, after = self._states.get(flight_id), states.get(flight_id)
+                if after is None:
+                    continue  # archived or deleted; nothing more will change
+                event = full_event(flight_id, after) if before is None else delta_event(flight_id, before, after)
+                self._states[flight_id] = after
+                if event is None:
+                    continue
+                self.events += 1
+                for subscription in self._watchers[flight_id]:
+                    subscription.push(event)
+            self.seq = seq
+
+    def stats(self):
+        with self._lock:
+            subscriptions = {id(s) for watchers in self._watchers.values() for s in watchers}
+            return {
+                'subscriptions': len(subscriptions),
+                'flights': len(self._watchers),
+                'seq': self.seq,
+                'polls': self.polls,
+                'events': self.events,
+            }
+
+    def _ensure_thread(self):
+        # One poller per worker process (started again after a fork), exiting when nobody listens
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='seat-stream', daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                time.sleep(self.poll_seconds)
+                with self._lock:
+                    if not self._watchers:
+                        self._thread = None
+                        return
+                try:
+                    if conn is None:
+                        conn = db.connect_readonly()
+                    self.poll(conn)
+                except Exception as e:
+                    print(f"Seat stream Warning: poll failed: {e}")
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+broadcaster = Broadcaster()
+
+
+def iter_events(subscription, wake, max_seconds=MAX_STREAM_SECONDS):
+    """WSGI body for a subscription: queued events as they arrive, a comment line as heartbeat
+
+    Ends after max_seconds so a worker thread is never held for good;
+    EventSource reconnects and starts from a fresh full state.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while not subscription.overflowed:
+            yield from subscription.drain()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not wake.wait(min(HEARTBEAT_SECONDS, remaining)):
+                yield HEARTBEAT
+            wake.clear()
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,278 @@
+"""Per-flight seat maps stored as one occupancy bitmap per cabin class"""
+import base64
+import random
+import re
+from functools import lru_cache
+
+# Seat letters and share of flights.total_seats per cabin; First and Business
+# are rounded to whole rows and Economy takes the rest (its last row may be
+# partial). Matches the grid drawn by static/js/main.js
+CABIN_LAYOUTS = {
+    'First': ('ABCD', 0.04),
+    'Business': ('ABCDEF', 0.12),
+    'Economy': ('ABCDEF', None),
+}
+SEED_PATTERNS = 64
+
+SEAT_LABEL = re.compile(r'^(?P<row>\d{1,3})(?P<col>[A-Z])$')
+
+
+class SeatError(ValueError):
+    """Invalid seat label or cabin"""
+
+
+class SeatTaken(Exception):
+    def __init__(self, seat):
+        super().__init__(f'Seat {seat} is already taken')
+        self.seat = seat
+
+
+@lru_cache(maxsize=None)
+def cabin_sizes(total_seats):
+    """{cabin: (rows, columns, seats)} for a flight with `total_seats` seats (shared; do not modify)"""
+    sizes, premium = {}, 0
+    for cabin_class, (columns, share) in CABIN_LAYOUTS.items():
+        if share is None:
+            seats = max(total_seats - premium, 0)
+            rows = -(-seats // len(columns))
+        else:
+            rows = max(1, round(total_seats * share / len(columns)))
+            seats = rows * len(columns)
+            premium += seats
+        sizes[cabin_class] = (rows, columns, seats)
+    return sizes
+
+
+def layout(cabin_class, total_seats):
+    """(rows, columns, seats) of one cabin"""
+    if cabin_class not in CABIN_LAYOUTS:
+        raise SeatError(f'Unknown cabin class: {cabin_class}')
+    return cabin_sizes(total_seats)[cabin_class]
+
+
+def check_seat(cabin_class, seat):
+    """Validate a seat label's format and letter; whether its row exists depends on the flight"""
+    if cabin_class not in CABIN_LAYOUTS:
+        raise SeatError(f'Unknown cabin class: {cabin_class}')
+    match = SEAT_LABEL.match(seat)
+    if not match or int(match.group('row')) < 1:
+        raise SeatError(f'Invalid seat number: {seat}')
+    if match.group('col') not in CABIN_LAYOUTS[cabin_class][0]:
+        raise SeatError(f'Seat {seat} does not exist in {cabin_class}')
+    return int(match.group('row')), match.group('col')
+
+
+def seat_index(cabin_class, seat, total_seats):
+    """Bit position of a seat label like '12C' on a flight with `total_seats` seats"""
+    row, col = check_seat(cabin_class, seat)
+    _, columns, seats = layout(cabin_class, total_seats)
+    index = (row - 1) * len(columns) + columns.index(col)
+    if index >= seats:
+        raise SeatError(f'Seat {seat} does not exist in {cabin_class}')
+    return index
+
+
+def seat_label(cabin_class, index):
+    """'12C' for a bit position (inverse of seat_index)"""
+    columns = CABIN_LAYOUTS[cabin_class][0]
+    return f'{index // len(columns) + 1}{columns[index % len(columns)]}'
+
+
+def changed_seats(cabin_class, before, after):
+    """(newly taken, newly freed) seat labels between two bitmaps of a cabin"""
+    taken, freed = [], []
+    for byte, (old, new) in enumerate(zip(before, after)):
+        if old == new:
+            continue
+        for bit in range(8):
+            mask = 1 << bit
+            if new & mask and not old & mask:
+                taken.append(seat_label(cabin_class, byte * 8 + bit))
+            elif old & mask and not new & mask:
+                freed.append(seat_label(cabin_class, byte * 8 + bit))
+    return taken, freed
+
+
+def parse_seat_numbers(text):
+    """Normalize a '1A, 1B' string into a list of unique labels"""
+    seats = [s.strip().upper() for s in (text or '').split(',') if s.strip()]
+    if len(set(seats)) != len(seats):
+        raise SeatError('Duplicate seat numbers')
+    return seats
+
+
+def parse_seat_request(cabin_class, text, seats_booked):
+    """Validated seat labels for a booking or hold of `seats_booked` seats (may be empty)"""
+    seats = parse_seat_numbers(text)
+    for seat in seats:
+        check_seat(cabin_class, seat)
+    if seats and len(seats) != seats_booked:
+        raise SeatError('Number of seat numbers must match seats booked')
+    return seats
+
+
+def _load(conn, flight_id, cabin_class):
+    """(total_seats, bitmap) of a flight's cabin"""
+    row = conn.execute('''
+        SELECT f.total_seats, m.bitmap FROM flights f
+        LEFT JOIN seat_maps m ON m.flight_id = f.flight_id AND m.cabin_class = ?
+        WHERE f.flight_id = ?
+    ''', (cabin_class, flight_id)).fetchone()
+    total_seats = row[0] if row else 0
+    return total_seats, fit_bitmap(row[1] if row else None, cabin_class, total_seats)
+
+
+def _store(conn, flight_id, cabin_class, bitmap):
+    conn.execute('''
+        INSERT INTO seat_maps (flight_id, cabin_class, bitmap) VALUES (?, ?, ?)
+        ON CONFLICT(flight_id, cabin_class) DO UPDATE SET bitmap = excluded.bitmap
+    ''', (flight_id, cabin_class, bytes(bitmap)))
+
+
+def claim_seats(conn, flight_id, cabin_class, seats):
+    """Mark seats occupied; raises SeatTaken if any is already claimed
+
+    Must run inside the booking's write transaction so the claim commits
+    or rolls back together with the inventory decrement. Raises SeatError
+    for a seat the flight's cabin does not have.
+    """
+    if not seats:
+        return
+    total_seats, bitmap = _load(conn, flight_id, cabin_class)
+    indexes = [seat_index(cabin_class, seat, total_seats) for seat in seats]
+    for seat, i in zip(seats, indexes):
+        if bitmap[i >> 3] & (1 << (i & 7)):
+            raise SeatTaken(seat)
+        bitmap[i >> 3] |= 1 << (i & 7)
+    _store(conn, flight_id, cabin_class, bitmap)
+
+
+def claim_free_seats(conn, flight_id, cabin_class, count):
+    """Claim the first `count` free seats of a cabin, front rows first; returns their labels
+
+    For bookings and holds that name no seats, so the seat map still
+    matches available_seats. Same transaction rules as claim_seats;
+    raises SeatError if the cabin has fewer free seats.
+    """
+    total_seats, bitmap = _load(conn, flight_id, cabin_class)
+    _, _, seats = layout(cabin_class, total_seats)
+    free = []
+    for i in range(seats):
+        if len(free) == count:
+            break
+        if not bitmap[i >> 3] & (1 << (i & 7)):
+            free.append(i)
+    if len(free) < count:
+        raise SeatError(f'Only {len(free)} seats left in {cabin_class}')
+    for i in free:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    _store(conn, flight_id, cabin_class, bitmap)
+    return [seat_label(cabin_class, i) for i in free]
+
+
+def release_seats(conn, flight_id, cabin_class, seats):
+    """Mark seats free again"""
+    if not seats:
+        return
+    total_seats, bitmap = _load(conn, flight_id, cabin_class)
+    for seat in seats:
+        i = seat_index(cabin_class, seat, total_seats)
+        bitmap[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+    _store(conn, flight_id, cabin_class, bitmap)
+
+
+def bitmap_size(cabin_class, total_seats):
+    """Bytes in a cabin's occupancy bitmap; the one place that size is worked out"""
+    _, _, seats = layout(cabin_class, total_seats)
+    return (seats + 7) // 8
+
+
+def empty_bitmap(cabin_class, total_seats):
+    return bytes(bitmap_size(cabin_class, total_seats))
+
+
+def fit_bitmap(stored, cabin_class, total_seats):
+    """A stored bitmap (or None) at the cabin's size
+
+    Maps stored before cabins were sized by total_seats are shorter.
+    """
+    size = bitmap_size(cabin_class, total_seats)
+    return bytearray(bytes(stored or b'')[:size].ljust(size, b'\0'))
+
+
+def get_seat_map(conn, flight_id):
+    """All cabins of a flight with occupancy as base64 bitmaps (bit i = seat i, LSB first)"""
+    row = conn.execute('SELECT total_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    total_seats = row[0] if row else 0
+    stored = {
+        row[0]: row[1] for row in conn.execute(
+            'SELECT cabin_class, bitmap FROM seat_maps WHERE flight_id = ?', (flight_id,)
+        )
+    }
+    cabins = {}
+    for cabin_class, (rows, columns, seats) in cabin_sizes(total_seats).items():
+        bitmap = bytes(fit_bitmap(stored.get(cabin_class), cabin_class, total_seats))
+        cabins[cabin_class] = {
+            'rows': rows,
+            'columns': columns,
+            'seats': seats,
+            'occupied': base64.b64encode(bitmap).decode('ascii'),
+        }
+    return cabins
+
+
+# ==================== SEEDING ====================
+
+def _seed_patterns(total_seats, cabin_class):
+    """SEED_PATTERNS random seat orders of a cabin, as cumulative bitmasks (mask[k] = first k seats taken)"""
+    _, _, seats = layout(cabin_class, total_seats)
+    rng = random.Random(f'{total_seats}:{cabin_class}')
+    patterns = []
+    for _ in range(SEED_PATTERNS):
+        order = rng.sample(range(seats), seats)
+        masks, mask = [0], 0
+        for i in order:
+            mask |= 1 << i
+            masks.append(mask)
+        patterns.append(masks)
+    return patterns
+
+
+def seed_sold_seats(conn, after_flight_id=0):
+    """Mark the already-sold seats of newly generated flights (flight_id > after_flight_id) as occupied
+
+    Generated flights start partly sold; without this their seat maps
+    would show every seat free. Sold seats are split between cabins by
+    size and scattered over each cabin. Call inside the inserting
+    transaction.
+    """
+    patterns = {}
+
+    def rows():
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT flight_id, total_seats, available_seats FROM flights
+            WHERE flight_id > ? AND available_seats < total_seats
+        ''', (after_flight_id,))
+        for flight_id, total_seats, available_seats in cursor:
+            sizes = cabin_sizes(total_seats)
+            sold = min(total_seats - available_seats, total_seats)
+            remaining = sold
+            for cabin_class, (_, _, seats) in sizes.items():
+                if cabin_class == 'Economy':
+                    taken = min(remaining, seats)
+                else:
+                    taken = min(round(sold * seats / max(total_seats, 1)), seats, remaining)
+                remaining -= taken
+                if not taken:
+                    continue
+                key = (total_seats, cabin_class)
+                if key not in patterns:
+                    patterns[key] = _seed_patterns(total_seats, cabin_class)
+                mask = patterns[key][flight_id % SEED_PATTERNS][taken]
+                yield flight_id, cabin_class, mask.to_bytes(bitmap_size(cabin_class, total_seats), 'little')
+
+    conn.executemany('''
+        INSERT INTO seat_maps (flight_id, cabin_class, bitmap) VALUES (?, ?, ?)
+        ON CONFLICT(flight_id, cabin_class) DO NOTHING
+    ''', rows())
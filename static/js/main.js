@@ -1,6 +1,7 @@
 // ==================== SEARCH & FILTERS ====================
 
 let currentBooking = {};
+let seatStream = null;
 
 document.addEventListener('DOMContentLoaded', function () {
     // Set minimum date to today
@@ -29,6 +30,18 @@ document.addEventListener('DOMContentLoaded', function () {
             document.getElementById(id).addEventListener('input', debounce(applyFilters, 500));
         }
     });
+
+    // Airport autocomplete
+    ['source', 'destination'].forEach(id => {
+        if (document.getElementById(id)) {
+            document.getElementById(id).addEventListener('input', e => suggestAirports(e.target));
+        }
+    });
+
+    // Closing the booking wizard gives held seats back
+    if (document.getElementById('bookingModal')) {
+        document.getElementById('bookingModal').addEventListener('hidden.bs.modal', releaseHold);
+    }
 });
 
 async function searchFlights() {
@@ -47,6 +60,9 @@ async function searchFlights() {
     document.getElementById('noResults').style.display = 'none';
     document.getElementById('filtersSection').style.display = 'none';
 
+    // One call for the whole month's fares, alongside the day's search
+    loadFareCalendar(source, destination, date);
+
     try {
         const response = await fetch(`/api/flights/search?source=${encodeURIComponent(source)}&destination=${encodeURIComponent(destination)}&date=${date}`);
         const data = await response.json();
@@ -80,6 +96,107 @@ async function searchFlights() {
     }
 }
 
+async function loadFareCalendar(source, destination, date) {
+    const container = document.getElementById('fareCalendar');
+    if (!container) return;
+
+    try {
+        const month = date.slice(0, 7);
+        const response = await fetch(`/api/fares/calendar?source=${encodeURIComponent(source)}&destination=${encodeURIComponent(destination)}&month=${month}`);
+        const data = await response.json();
+
+        if (!response.ok || data.days.length === 0) {
+            container.style.display = 'none';
+            return;
+        }
+
+        const cheapest = Math.min(...data.days.map(d => d.min_price));
+        document.getElementById('fareCalendarDays').innerHTML = data.days.map(d => `
+            <button type="button" class="btn btn-sm ${d.date === date ? 'btn-primary' : (d.min_price === cheapest ? 'btn-success' : 'btn-outline-secondary')}"
+                onclick="document.getElementById('date').value='${d.date}'; searchFlights();">
+                <div class="fw-bold">${formatDate(d.date)}</div>
+                <small>₹${d.min_price.toFixed(0)} · ${d.flights_available} flights</small>
+            </button>
+        `).join('');
+        container.style.display = 'block';
+    } catch (error) {
+        console.error('Error loading fare calendar:', error);
+        container.style.display = 'none';
+    }
+}
+
+const airportRequests = {};
+
+async function suggestAirports(input) {
+    const list = document.getElementById(`${input.id}Suggestions`);
+    const query = input.value.trim();
+    if (!list) return;
+
+    // Only the latest keystroke's answer matters
+    if (airportRequests[input.id]) airportRequests[input.id].abort();
+    if (query.length === 0) {
+        list.innerHTML = '';
+        return;
+    }
+
+    const controller = new AbortController();
+    airportRequests[input.id] = controller;
+    try {
+        const response = await fetch(`/api/airports/suggest?q=${encodeURIComponent(query)}`, { signal: controller.signal });
+        const data = await response.json();
+        if (!response.ok) return;
+
+        list.innerHTML = data.airports.map(a => `
+            <option value="${a.label}">${a.matched !== a.city && a.matched !== a.label ? a.matched + ' · ' : ''}${a.region}</option>
+        `).join('');
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('Error loading airport suggestions:', error);
+    }
+}
+
+// Live seat counts for the listed flights, and live seat map while choosing seats
+function watchSeats(flightIds) {
+    if (seatStream) seatStream.close();
+    seatStream = null;
+    if (!window.SEAT_STREAM || !window.EventSource || flightIds.length === 0) return;
+
+    seatStream = new EventSource(`/api/flights/stream?ids=${flightIds.slice(0, 100).join(',')}`);
+    seatStream.addEventListener('seats', event => applySeatUpdate(JSON.parse(event.data)));
+}
+
+function applySeatUpdate(update) {
+    document.querySelectorAll(`[data-seats-for="${update.flight_id}"]`).forEach(el => {
+        el.textContent = update.available_seats;
+    });
+
+    // The seat grid only follows deltas; the first (full) event matches what renderSeatMap fetched
+    if (String(update.flight_id) !== String(currentBooking.flightId) || currentBooking.holdId) return;
+    const cabin = update.cabins[currentBooking.class];
+    if (!cabin || !cabin.taken) return;
+
+    cabin.freed.forEach(seatId => {
+        const seat = document.querySelector(`#seatGrid [data-seat="${seatId}"]`);
+        if (!seat) return;
+        seat.classList.remove('occupied');
+        seat.style.cursor = 'pointer';
+        seat.onclick = () => selectSeat(seatId, seat);
+    });
+    cabin.taken.forEach(seatId => {
+        const seat = document.querySelector(`#seatGrid [data-seat="${seatId}"]`);
+        if (!seat) return;
+        const index = currentBooking.seats.indexOf(seatId);
+        if (index > -1) {
+            currentBooking.seats.splice(index, 1);
+            seat.classList.remove('selected');
+            updateSeatUI();
+            showAlert(`Seat ${seatId} was just booked by someone else. Please pick another.`, 'warning');
+        }
+        seat.classList.add('occupied');
+        seat.style.cursor = 'not-allowed';
+        seat.onclick = null;
+    });
+}
+
 function displayFlights(flights) {
     const resultsContainer = document.getElementById('flightResults');
 
@@ -123,7 +240,7 @@ function displayFlights(flights) {
                     </div>
                     <div class="flight-info">
                         <i class="bi bi-people-fill"></i>
-                        <strong>${flight.available_seats}</strong>
+                        <strong data-seats-for="${flight.flight_id}">${flight.available_seats}</strong>
                         <small>Seats</small>
                     </div>
                 </div>
@@ -136,6 +253,7 @@ function displayFlights(flights) {
     `).join('');
 
     document.getElementById('resultsSection').style.display = 'block';
+    watchSeats(flights.map(flight => flight.flight_id));
 
     // Update flight count badge
     if (document.getElementById('flightCount')) {
@@ -208,6 +326,10 @@ function resetFilters() {
     displayFlights(window.allFlights);
 }
 
+function assetUrl(path) {
+    return (window.ASSET_URLS && window.ASSET_URLS[path]) || `/static/${path}`;
+}
+
 function debounce(func, wait) {
     let timeout;
     return function executedFunction(...args) {
@@ -254,20 +376,29 @@ function openBookingModal(flightId, flightNumber, source, destination, date, pri
 
             // Init State
             currentBooking = {
-                flightId, flightNumber, source, destination, date, basePrice: price,
+                flightId, flightNumber, source, destination, date,
                 class: null,
                 seats: [], // Array for multiple seats
                 seatsBooked: 0,
-                multiplier: 1,
-                isGroup: false
+                fares: { Economy: price },
+                fare: price,
+                isGroup: false,
+                holdId: null
             };
 
-            // Setup
-            renderClassOptions();
-            switchStep('class');
+            // Fares come from the server's pricing job; the browser never computes them
+            return fetch(`/api/flights/${flightId}/fares`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.fares) currentBooking.fares = data.fares;
 
-            const modal = new bootstrap.Modal(document.getElementById('bookingModal'));
-            modal.show();
+                    // Setup
+                    renderClassOptions();
+                    switchStep('class');
+
+                    const modal = new bootstrap.Modal(document.getElementById('bookingModal'));
+                    modal.show();
+                });
         });
 }
 
@@ -286,28 +417,28 @@ function renderClassOptions() {
 
     // Define classes
     const classes = [
-        { id: 'Economy', name: 'Economy Class', mult: 1, img: `cabin_eco_${suffix}.png`, desc: 'Comfortable seating with great service.' },
-        { id: 'Business', name: 'Business Class', mult: 2.5, img: `cabin_bus_${suffix}.png`, desc: 'Premium seating, extra legroom, and priority.' },
-        { id: 'First', name: 'First Class', mult: 4, img: `cabin_first_${suffix}.png`, desc: 'Absolute luxury, privacy, and fine dining.' }
-    ];
+        { id: 'Economy', name: 'Economy Class', img: `cabin_eco_${suffix}.png`, desc: 'Comfortable seating with great service.' },
+        { id: 'Business', name: 'Business Class', img: `cabin_bus_${suffix}.png`, desc: 'Premium seating, extra legroom, and priority.' },
+        { id: 'First', name: 'First Class', img: `cabin_first_${suffix}.png`, desc: 'Absolute luxury, privacy, and fine dining.' }
+    ].filter(c => currentBooking.fares[c.id] !== undefined);
 
     container.innerHTML = classes.map(c => `
         <div class="col-md-4">
-            <div class="class-card h-100" onclick="selectClass('${c.id}', ${c.mult})" id="card-${c.id}">
-                <img src="/static/img/${c.img}" class="class-img" alt="${c.name}">
+            <div class="class-card h-100" onclick="selectClass('${c.id}')" id="card-${c.id}">
+                <img src="${assetUrl(`img/${c.img}`)}" class="class-img" alt="${c.name}">
                 <div class="p-3">
                     <h6 class="fw-bold mb-1">${c.name}</h6>
                     <small class="text-muted d-block mb-2" style="font-size:0.75rem">${c.desc}</small>
-                    <div class="text-primary fw-bold">₹${(currentBooking.basePrice * c.mult).toFixed(0)}</div>
+                    <div class="text-primary fw-bold">₹${currentBooking.fares[c.id].toFixed(0)}</div>
                 </div>
             </div>
         </div>
     `).join('');
 }
 
-function selectClass(className, multiplier) {
+function selectClass(className) {
     currentBooking.class = className;
-    currentBooking.multiplier = multiplier;
+    currentBooking.fare = currentBooking.fares[className];
 
     // Highlight UI
     document.querySelectorAll('.class-card').forEach(el => el.classList.remove('selected'));
@@ -333,7 +464,19 @@ function toggleGroupBooking() {
     }
 }
 
-function renderSeatMap() {
+function decodeSeatBitmap(encoded) {
+    // Bit i (LSB first) of the base64 bitmap is seat i, row-major
+    const raw = atob(encoded || '');
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    return bytes;
+}
+
+function isSeatOccupied(bitmap, index) {
+    return (index >> 3) < bitmap.length && (bitmap[index >> 3] & (1 << (index & 7))) !== 0;
+}
+
+async function renderSeatMap() {
     console.log("Rendering Seat Map...");
     const grid = document.getElementById('seatGrid');
     if (!grid) {
@@ -341,9 +484,25 @@ function renderSeatMap() {
         return;
     }
 
+    // Real occupancy for the selected cabin
+    let cabin = { rows: 8, columns: 'ABCDEF', seats: 48, occupied: '' };
+    try {
+        const response = await fetch(`/api/flights/${currentBooking.flightId}/seats`);
+        const data = await response.json();
+        if (response.ok && data.cabins[currentBooking.class]) {
+            cabin = data.cabins[currentBooking.class];
+        }
+    } catch (error) {
+        console.error('Error loading seat map:', error);
+    }
+    const occupied = decodeSeatBitmap(cabin.occupied);
+    const columns = cabin.columns.split('');
+    const half = Math.ceil(columns.length / 2);
+    const layout = [...columns.slice(0, half), '', ...columns.slice(half)];
+
     grid.innerHTML = ''; // Clear existing
 
-    for (let r = 1; r <= 8; r++) { // 8 Rows
+    for (let r = 1; r <= cabin.rows; r++) {
         const row = document.createElement('div');
         row.className = 'seat-row';
         // Force flex display in style to be sure
@@ -352,7 +511,7 @@ function renderSeatMap() {
         row.style.justifyContent = 'center';
         row.style.marginBottom = '10px';
 
-        ['A', 'B', 'C', '', 'D', 'E', 'F'].forEach(col => {
+        layout.forEach(col => {
             if (col === '') {
                 const aisle = document.createElement('div');
                 aisle.className = 'seat-aisle';
@@ -361,10 +520,16 @@ function renderSeatMap() {
                 aisle.style.textAlign = 'center';
                 aisle.style.lineHeight = '40px'; // Vertically center
                 row.appendChild(aisle);
+            } else if ((r - 1) * columns.length + columns.indexOf(col) >= cabin.seats) {
+                // Economy's last row can be partial
+                const gap = document.createElement('div');
+                gap.style.width = '40px';
+                row.appendChild(gap);
             } else {
                 const seatId = `${r}${col}`;
                 const seat = document.createElement('div');
                 seat.className = 'seat';
+                seat.dataset.seat = seatId;
                 seat.innerText = col;
 
                 // Inline styles to guarantee visibility even if CSS fails
@@ -383,11 +548,8 @@ function renderSeatMap() {
 
                 seat.onclick = () => selectSeat(seatId, seat);
 
-                // Deterministic occupancy
-                let hash = 0;
-                for (let i = 0; i < seatId.length; i++) hash += seatId.charCodeAt(i);
-
-                if ((hash % 10) < 2 && !currentBooking.seats.includes(seatId)) {
+                const seatIndex = (r - 1) * columns.length + columns.indexOf(col);
+                if (isSeatOccupied(occupied, seatIndex) && !currentBooking.seats.includes(seatId)) {
                     seat.classList.add('occupied');
                     seat.style.cursor = 'not-allowed';
                     seat.onclick = null;
@@ -438,12 +600,69 @@ function updateSeatUI() {
     document.getElementById('btnConfirmSeat').disabled = (count === 0);
 }
 
+// ==================== SEAT HOLDS ====================
+
+// Reserve the chosen seats before the passenger step so they can't be lost at checkout
+async function holdSeats() {
+    const button = document.getElementById('btnConfirmSeat');
+    button.disabled = true;
+    await releaseHold();
+
+    try {
+        const response = await fetch('/api/holds', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                flight_id: parseInt(currentBooking.flightId),
+                seats_booked: currentBooking.seats.length,
+                booking_class: currentBooking.class,
+                seat_numbers: currentBooking.seats.join(', ')
+            })
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            currentBooking.holdId = data.hold.hold_id;
+            currentBooking.holdExpiresAt = data.hold.expires_at;
+            switchStep('passenger');
+        } else if (response.status === 409) {
+            alert(data.error || 'Seat no longer available');
+            currentBooking.seats = currentBooking.seats.filter(seat => seat !== data.seat);
+            switchStep('seat');
+            updateSeatUI();
+        } else {
+            alert(data.error || 'Could not hold seats');
+        }
+    } catch (e) {
+        console.error(e);
+        alert('Error holding seats');
+    } finally {
+        button.disabled = currentBooking.seats.length === 0;
+    }
+}
+
+async function releaseHold() {
+    if (!currentBooking || !currentBooking.holdId) return;
+    const holdId = currentBooking.holdId;
+    currentBooking.holdId = null;
+    try {
+        await fetch(`/api/holds/${encodeURIComponent(holdId)}`, { method: 'DELETE' });
+    } catch (e) {
+        console.error(e);  // expires on its own
+    }
+}
+
+async function backToSeats() {
+    await releaseHold();
+    switchStep('seat');
+}
+
 function renderSummary() {
     document.getElementById('finalFlightInfo').innerText = currentBooking.flightNumber;
     document.getElementById('finalClass').innerText = currentBooking.class;
     document.getElementById('finalSeat').innerText = currentBooking.seats.join(', ');
 
-    const total = currentBooking.basePrice * currentBooking.multiplier * currentBooking.seatsBooked;
+    const total = currentBooking.fare * currentBooking.seatsBooked;
     document.getElementById('finalPrice').innerText = `₹${total.toFixed(0)}`;
 }
 
@@ -518,6 +737,7 @@ async function processBooking() {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
+                    hold_id: currentBooking.holdId,
                     flight_id: parseInt(currentBooking.flightId),
                     seats_booked: currentBooking.seatsBooked,
                     passenger_names: passengerString,
@@ -528,10 +748,22 @@ async function processBooking() {
             const data = await response.json();
 
             if (response.ok) {
+                currentBooking.holdId = null;
                 const modal = bootstrap.Modal.getInstance(document.getElementById('bookingModal'));
                 modal.hide();
                 alert(`Payment Successful! Tickets Confirmed.\nBooking ID: #${data.booking_id}`);
                 window.location.href = '/bookings';
+            } else if (response.status === 409) {
+                // Someone else took a chosen seat: drop it and pick again
+                alert(data.error || 'Seat no longer available');
+                currentBooking.seats = currentBooking.seats.filter(seat => seat !== data.seat);
+                switchStep('seat');
+                updateSeatUI();
+            } else if (response.status === 410) {
+                // Hold expired: the seats may be gone, pick again
+                currentBooking.holdId = null;
+                alert(data.error || 'Your seat hold expired');
+                switchStep('seat');
             } else {
                 alert(data.error || 'Booking failed');
                 switchStep('passenger');
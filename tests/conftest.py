@@ -0,0 +1,81 @@
+"""Fixtures: every test gets a private copy of one seeded database (built once per session)"""
+import base64
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+# Set before any app module is imported: no scheduler threads, and no default database to migrate
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['DATABASE'] = os.path.join(tempfile.mkdtemp(prefix='flight-tests-'), 'unused.db')
+
+
+@pytest.fixture(scope='session')
+def seeded_database(tmp_path_factory):
+    from init_db import init_database
+
+    path = str(tmp_path_factory.mktemp('seed') / 'seed.db')
+    init_database(path)
+    return path
+
+
+@pytest.fixture
+def database(seeded_database, tmp_path, monkeypatch):
+    """Path of this test's database; get_db() and pooled_connection() use it too"""
+    import db
+
+    path = str(tmp_path / 'flights.db')
+    source, target = sqlite3.connect(seeded_database), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    monkeypatch.setattr(db, 'DATABASE', path)
+    monkeypatch.setattr(db, '_pool', None)
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    import db
+
+    connection = db.connect(database)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def flight_with_seats(conn):
+    """flight_with_seats(n): id of a future flight cut down to n free seats"""
+    def make(seats):
+        flight_id = conn.execute('''
+            SELECT flight_id FROM flights WHERE date > date('now') AND available_seats >= ? LIMIT 1
+        ''', (seats,)).fetchone()[0]
+        conn.execute('UPDATE flights SET available_seats = ? WHERE flight_id = ?', (seats, flight_id))
+        conn.commit()
+        return flight_id
+    return make
+
+
+@pytest.fixture
+def free_seats(conn):
+    """free_seats(flight_id, n, cabin_class='Economy'): labels of the first n unoccupied seats"""
+    import seatmap
+
+    def find(flight_id, count, cabin_class='Economy'):
+        cabin = seatmap.get_seat_map(conn, flight_id)[cabin_class]
+        occupied = base64.b64decode(cabin['occupied'])
+        free = [i for i in range(cabin['seats']) if not occupied[i >> 3] & (1 << (i & 7))]
+        return [seatmap.seat_label(cabin_class, i) for i in free[:count]]
+    return find
+
+
+@pytest.fixture
+def admin(database):
+    """Flask test client logged in as the seeded admin"""
+    from app import app
+
+    client = app.test_client()
+    response = client.post('/api/login', json={'email': 'admin@flight.com', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
@@ -0,0 +1,94 @@
+"""Archiving departed flights keeps booking history whole"""
+from datetime import date, timedelta
+
+import bookings
+import db
+import history
+import partitions
+import scheduler
+
+USER_ID = 1  # the seeded admin
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def past_booking(conn, number, days, booked_days_before=7):
+    """A confirmed booking on a copy of a seeded flight that departed `days` ago"""
+    flight_id = conn.execute('''
+        INSERT INTO flights (flight_number, airline, aircraft, source, destination, source_id, destination_id,
+                             date, departure_time, arrival_time, price, total_seats, available_seats)
+        SELECT ?, airline, aircraft, source, destination, source_id, destination_id,
+               ?, departure_time, arrival_time, price, total_seats, available_seats - 1
+        FROM flights LIMIT 1
+    ''', (f'PAST{number}', days_ago(days))).lastrowid
+    booking_id = conn.execute('''
+        INSERT INTO bookings (user_id, flight_id, seats_booked, passenger_names, total_price, booking_date)
+        VALUES (?, ?, 1, 'A', 100, ?)
+    ''', (USER_ID, flight_id, f'{days_ago(days + booked_days_before)} 10:00:00')).lastrowid
+    history.record_trip(conn, booking_id)
+    conn.commit()
+    return booking_id
+
+
+def future_booking(conn):
+    flight_id = conn.execute("SELECT flight_id FROM flights WHERE date > date('now', '+1 day') LIMIT 1").fetchone()[0]
+    db.begin_immediate(conn)
+    result, _ = bookings.book(conn, USER_ID, {'flight_id': flight_id, 'seats_booked': 1})
+    conn.commit()
+    return result['booking_id']
+
+
+def all_history(conn, limit=2):
+    """Every history row, walked a small page at a time"""
+    rows, after = [], None
+    while True:
+        page, after = history.history_page(conn, USER_ID, after=after, limit=limit)
+        rows.extend(page)
+        if after is None:
+            return rows
+
+
+def test_archived_bookings_stay_in_history_and_leave_upcoming(conn):
+    older = [past_booking(conn, 1, 70), past_booking(conn, 2, 68), past_booking(conn, 3, 40)]
+    # A booking archived before partitions existed
+    with conn:
+        conn.execute('''
+            INSERT INTO bookings_archive (booking_id, user_id, flight_id, seats_booked, passenger_names, total_price,
+                                          booking_date, status, flight_number, date)
+            VALUES (900000, ?, 900000, 1, 'A', 100, ?, 'confirmed', 'OLD1', ?)
+        ''', (USER_ID, f'{days_ago(130)} 09:00:00', days_ago(120)))
+    upcoming = [future_booking(conn), future_booking(conn)]
+
+    before = all_history(conn)
+    assert {900000, *older, *upcoming} <= {row['booking_id'] for row in before}
+
+    moved = scheduler.archive_departed_flights(conn)
+
+    assert moved >= 3
+    assert conn.execute("SELECT COUNT(*) FROM flights WHERE flight_number LIKE 'PAST%'").fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM bookings_archive').fetchone()[0] == 0
+    assert {days_ago(70)[:7], days_ago(40)[:7], days_ago(120)[:7]} <= set(partitions.months(conn))
+
+    after = all_history(conn)
+    assert [row['booking_id'] for row in after] == [row['booking_id'] for row in before]
+    archived = {row['booking_id']: row for row in after if row['booking_id'] in older}
+    assert {row['flight_number'] for row in archived.values()} == {'PAST1', 'PAST2', 'PAST3'}
+
+    trips, _ = history.upcoming_trips(conn, USER_ID)
+    assert {trip['booking_id'] for trip in trips} == set(upcoming)
+    assert conn.execute(f"SELECT COUNT(*) FROM trip_summaries WHERE booking_id IN ({','.join('?' * 3)})",
+                        older).fetchone()[0] == 0
+
+
+def test_page_boundary_inside_a_partition(conn):
+    ids = [past_booking(conn, n, 50, booked_days_before=n) for n in range(5)]
+    scheduler.archive_departed_flights(conn)
+
+    first, after = history.history_page(conn, USER_ID, limit=2)
+    second, after = history.history_page(conn, USER_ID, after=after, limit=2)
+    third, _ = history.history_page(conn, USER_ID, after=after, limit=2)
+
+    # Booked n days before departure: the largest n was booked first
+    assert [row['booking_id'] for row in first + second + third][:5] == ids
@@ -0,0 +1,63 @@
+"""POST /api/bookings/batch: per-item results, partial or all-or-nothing"""
+
+
+def seats_left(conn, flight_id):
+    return conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0]
+
+
+def booking_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0]
+
+
+def test_failed_items_are_skipped_and_the_rest_commit(admin, conn, flight_with_seats, free_seats):
+    flight_id = flight_with_seats(10)
+    taken = free_seats(flight_id, 3)[2]  # the first two go to item 0
+    before = booking_count(conn)
+
+    response = admin.post('/api/bookings/batch', json={'bookings': [
+        {'flight_id': flight_id, 'seats_booked': 2},
+        {'flight_id': flight_id, 'seats_booked': 1, 'seat_numbers': taken},
+        {'flight_id': flight_id, 'seats_booked': 1, 'seat_numbers': taken},  # already taken by item 1
+        {'flight_id': 999999, 'seats_booked': 1},
+        {'flight_id': flight_id, 'seats_booked': 50},
+        'not an object',
+    ]})
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['booked'], body['failed']) == (2, 4)
+    assert [r['status'] for r in body['results']] == [201, 201, 409, 404, 400, 400]
+    assert [r['index'] for r in body['results']] == list(range(6))
+    assert body['results'][2]['seat'] == taken
+    assert body['results'][4]['available_seats'] == 7
+    assert seats_left(conn, flight_id) == 7
+    assert booking_count(conn) == before + 2
+
+
+def test_atomic_batch_books_nothing_when_one_item_fails(admin, conn, flight_with_seats):
+    flight_id = flight_with_seats(10)
+    before = booking_count(conn)
+
+    response = admin.post('/api/bookings/batch', json={'atomic': True, 'bookings': [
+        {'flight_id': flight_id, 'seats_booked': 2},
+        {'flight_id': 999999, 'seats_booked': 1},
+        {'flight_id': flight_id, 'seats_booked': 1},
+    ]})
+
+    assert response.status_code == 400
+    results = response.get_json()['results']
+    # Stops at the first failure
+    assert [r['status'] for r in results] == [201, 404]
+    assert seats_left(conn, flight_id) == 10
+    assert booking_count(conn) == before
+
+
+def test_all_items_booked_is_a_plain_200(admin, conn, flight_with_seats):
+    flight_id = flight_with_seats(10)
+    response = admin.post('/api/bookings/batch', json={'bookings': [
+        {'flight_id': flight_id, 'seats_booked': 1},
+        {'flight_id': flight_id, 'seats_booked': 3},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['booked'] == 2
+    assert seats_left(conn, flight_id) == 6
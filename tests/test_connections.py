@@ -0,0 +1,17 @@
+"""GET /api/flights/connections parameter checks"""
+import pytest
+
+
+@pytest.mark.parametrize('date', ['foo', '2099-13-01', '2099-02-30'])
+def test_bad_date_is_a_client_error(admin, date):
+    response = admin.get('/api/flights/connections', query_string={
+        'source': 'Delhi', 'destination': 'Mumbai', 'date': date})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'date must be YYYY-MM-DD'}
+
+
+def test_valid_date_is_searched(admin):
+    response = admin.get('/api/flights/connections', query_string={
+        'source': 'Delhi', 'destination': 'Mumbai', 'date': '2099-01-15'})
+    assert response.status_code == 200
+    assert response.get_json() == {'itineraries': []}
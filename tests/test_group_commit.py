@@ -0,0 +1,109 @@
+"""Group-commit writer: batched bookings never oversell, and a failed item fails alone"""
+import threading
+import time
+
+import pytest
+
+import bookings
+import db
+import group_commit
+
+USER_ID = 1  # the seeded admin
+
+
+@pytest.fixture
+def writer(database):
+    return group_commit.GroupCommitWriter(connect=lambda: db.connect(database), window_ms=20)
+
+
+def booking(flight_id, seats=1, seat_numbers=''):
+    return {'flight_id': flight_id, 'seats_booked': seats, 'passenger_names': 'Test', 'seat_numbers': seat_numbers}
+
+
+def run_in_threads(fns):
+    """Start fn() for each fn at once; returns {index: result or exception}"""
+    outcomes = {}
+    barrier = threading.Barrier(len(fns))
+
+    def run(index, fn):
+        barrier.wait()
+        try:
+            outcomes[index] = fn()
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=item) for item in enumerate(fns)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_bookings_never_oversell(conn, writer, flight_with_seats):
+    flight_id = flight_with_seats(5)
+
+    outcomes = run_in_threads([lambda: writer.submit(bookings.book, USER_ID, booking(flight_id))] * 20)
+
+    booked = [o for o in outcomes.values() if not isinstance(o, Exception)]
+    refused = [o for o in outcomes.values() if isinstance(o, Exception)]
+    assert len(booked) == 5
+    assert len(refused) == 15
+    assert all(isinstance(e, bookings.BookingError) and e.status == 400 for e in refused)
+    assert conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM bookings WHERE flight_id = ?', (flight_id,)).fetchone()[0] == 5
+    assert writer.items == 20
+
+
+def test_failed_item_rolls_back_alone_within_its_batch(conn, writer, flight_with_seats, free_seats):
+    flight_id = flight_with_seats(10)
+    first, second = free_seats(flight_id, 2)
+
+    # Hold the writer inside a transaction so the next three bookings queue up and share one batch
+    entered, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        entered.set()
+        release.wait()
+
+    blocker = threading.Thread(target=writer.submit, args=(block,))
+    blocker.start()
+    entered.wait()
+
+    results = {}
+
+    def submit(name, data):
+        try:
+            results[name] = writer.submit(bookings.book, USER_ID, data)
+        except Exception as e:
+            results[name] = e
+
+    threads = [
+        threading.Thread(target=submit, args=('good', booking(flight_id, seat_numbers=first))),
+        # Reserves a seat, then fails on the seat the first booking takes: its decrement must roll back
+        threading.Thread(target=submit, args=('taken', booking(flight_id, 2, f'{second}, {first}'))),
+        threading.Thread(target=submit, args=('missing', booking(10 ** 9))),
+    ]
+    threads[0].start()
+    while writer._queue.qsize() < 1:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    while writer._queue.qsize() < 3:
+        time.sleep(0.001)
+    release.set()
+    blocker.join()
+    for thread in threads:
+        thread.join()
+
+    assert writer.batches == 2
+    assert writer.items == 4
+    result, flight = results['good']
+    assert result['seats_booked'] == 1
+    assert isinstance(results['taken'], bookings.BookingError) and results['taken'].status == 409
+    assert isinstance(results['missing'], bookings.BookingError) and results['missing'].status == 404
+
+    assert conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0] == 9
+    assert [row[0] for row in conn.execute('SELECT seat_numbers FROM bookings WHERE flight_id = ?', (flight_id,))] \
+        == [first]
+    assert free_seats(flight_id, 1) == [second]
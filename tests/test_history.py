@@ -0,0 +1,49 @@
+"""GET /api/bookings/history and /upcoming: keyset pages over live bookings"""
+import history
+
+
+def book(admin, flight_id, seats=1):
+    response = admin.post('/api/bookings', json={'flight_id': flight_id, 'seats_booked': seats,
+                                                 'passenger_names': 'A'})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['booking_id']
+
+
+def walk(admin, path, key, **params):
+    rows, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = admin.get(path, query_string=query).get_json()
+        rows.extend(body[key])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return rows
+
+
+def test_history_pages_cover_every_booking_once_newest_first(admin, conn):
+    flights = [row[0] for row in conn.execute(
+        "SELECT flight_id FROM flights WHERE date > date('now') ORDER BY date DESC LIMIT 7")]
+    ids = [book(admin, flight_id) for flight_id in flights]
+
+    rows = walk(admin, '/api/bookings/history', 'bookings', limit=3)
+    assert [row['booking_id'] for row in rows] == sorted(ids, reverse=True)
+    # Flight details come with each row
+    assert all(row['flight_number'] and row['date'] for row in rows)
+
+    with conn:
+        conn.execute('UPDATE bookings SET status = ? WHERE booking_id = ?', ('cancelled', ids[2]))
+        history.record_trip(conn, ids[2])
+    cancelled = walk(admin, '/api/bookings/history', 'bookings', status='cancelled', limit=3)
+    assert [row['booking_id'] for row in cancelled] == [ids[2]]
+
+    # The summary row follows the booking: cancelled trips are not upcoming
+    trips = walk(admin, '/api/bookings/upcoming', 'trips', limit=2)
+    assert {trip['booking_id'] for trip in trips} == set(ids) - {ids[2]}
+    assert [(trip['date'], trip['departure_time']) for trip in trips] == \
+        sorted((trip['date'], trip['departure_time']) for trip in trips)
+
+
+def test_bad_parameters_are_client_errors(admin):
+    assert admin.get('/api/bookings/history', query_string={'cursor': 'garbage'}).status_code == 400
+    assert admin.get('/api/bookings/history', query_string={'status': 'lost'}).status_code == 400
+    assert admin.get('/api/bookings/upcoming', query_string={'cursor': 'garbage'}).status_code == 400
@@ -0,0 +1,80 @@
+"""Seat holds: seats leave inventory while held and come back exactly once"""
+import pytest
+
+import bookings
+import db
+import holds
+import seatmap
+
+USER_ID = 1  # the seeded admin
+
+
+def write(conn, fn, *args, **kwargs):
+    db.begin_immediate(conn)
+    try:
+        result = fn(conn, *args, **kwargs)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def available(conn, flight_id):
+    return conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0]
+
+
+def test_held_seats_are_taken_until_released(conn, flight_with_seats, free_seats):
+    flight_id = flight_with_seats(10)
+    seats = free_seats(flight_id, 2)
+
+    hold, _ = write(conn, holds.create_hold, USER_ID, flight_id, 2, 'Economy', seats)
+    assert available(conn, flight_id) == 8
+    with pytest.raises(seatmap.SeatTaken):
+        write(conn, seatmap.claim_seats, flight_id, 'Economy', seats[:1])
+
+    write(conn, holds.release_hold, hold['hold_id'], USER_ID)
+    assert available(conn, flight_id) == 10
+    assert free_seats(flight_id, 2) == seats
+    with pytest.raises(holds.HoldNotFound):
+        write(conn, holds.release_hold, hold['hold_id'], USER_ID)
+
+
+def test_booking_a_hold_does_not_take_the_seats_twice(conn, flight_with_seats, free_seats):
+    flight_id = flight_with_seats(10)
+    seats = free_seats(flight_id, 2)
+    hold, _ = write(conn, holds.create_hold, USER_ID, flight_id, 2, 'Economy', seats)
+
+    result, _ = write(conn, bookings.book, USER_ID, {'hold_id': hold['hold_id'], 'passenger_names': 'A, B'})
+    assert result['seats_booked'] == 2
+    assert available(conn, flight_id) == 8
+    assert conn.execute('SELECT COUNT(*) FROM seat_holds').fetchone()[0] == 0
+
+    # The hold is gone: converting it again fails instead of booking more seats
+    with pytest.raises(bookings.BookingError) as excinfo:
+        write(conn, bookings.book, USER_ID, {'hold_id': hold['hold_id'], 'passenger_names': 'A, B'})
+    assert excinfo.value.status == 410
+    assert available(conn, flight_id) == 8
+
+
+def test_expired_holds_are_reclaimed(conn, flight_with_seats, free_seats):
+    flight_id = flight_with_seats(10)
+    seats = free_seats(flight_id, 3)
+    write(conn, holds.create_hold, USER_ID, flight_id, 1, 'Economy', seats[:1], ttl=-1)
+    write(conn, holds.create_hold, USER_ID, flight_id, 2, 'Economy', seats[1:], ttl=-1)
+    live, _ = write(conn, holds.create_hold, USER_ID, flight_id, 1)
+    assert available(conn, flight_id) == 6
+
+    assert holds.reclaim_expired(conn, batch_size=1) == 2
+    assert available(conn, flight_id) == 9
+    assert free_seats(flight_id, 3) == seats
+    assert [row[0] for row in conn.execute('SELECT hold_id FROM seat_holds')] == [live['hold_id']]
+
+
+def test_holds_per_user_are_limited(conn, flight_with_seats):
+    flight_id = flight_with_seats(holds.MAX_HOLDS_PER_USER + 1)
+    for _ in range(holds.MAX_HOLDS_PER_USER):
+        write(conn, holds.create_hold, USER_ID, flight_id, 1)
+    with pytest.raises(holds.TooManyHolds):
+        write(conn, holds.create_hold, USER_ID, flight_id, 1)
+    assert available(conn, flight_id) == 1
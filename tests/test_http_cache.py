@@ -0,0 +1,83 @@
+"""ETags: 304 while nothing changed, a fresh body once a write bumps data_versions"""
+import pytest
+
+
+@pytest.fixture
+def route(conn):
+    """(flight_id, search query) of a future flight"""
+    flight = conn.execute('''
+        SELECT flight_id, source, destination, date FROM flights
+        WHERE date > date('now') AND available_seats >= 5 ORDER BY date LIMIT 1
+    ''').fetchone()
+    return flight['flight_id'], {'source': flight['source'], 'destination': flight['destination'],
+                                 'date': flight['date']}
+
+
+def get(client, path, query, tag=None):
+    return client.get(path, query_string=query, headers={'If-None-Match': tag} if tag else {})
+
+
+def seats(response, flight_id):
+    return next(f['available_seats'] for f in response.get_json()['flights'] if f['flight_id'] == flight_id)
+
+
+def test_search_revalidates_until_a_booking_on_the_route(admin, route):
+    flight_id, query = route
+    first = get(admin, '/api/flights/search', query)
+    tag = first.headers['ETag']
+    assert first.status_code == 200 and tag
+
+    repeat = get(admin, '/api/flights/search', query, tag)
+    assert repeat.status_code == 304
+    assert repeat.headers['ETag'] == tag
+    assert repeat.data == b''
+
+    assert admin.post('/api/bookings', json={'flight_id': flight_id, 'seats_booked': 2,
+                                             'passenger_names': 'A, B'}).status_code == 201
+
+    changed = get(admin, '/api/flights/search', query, tag)
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != tag
+    assert seats(changed, flight_id) == seats(first, flight_id) - 2
+    assert get(admin, '/api/flights/search', query, changed.headers['ETag']).status_code == 304
+
+
+def test_writes_elsewhere_keep_the_tag(admin, conn, route):
+    flight_id, query = route
+    tag = get(admin, '/api/flights/search', query).headers['ETag']
+    other = conn.execute('''
+        SELECT flight_id FROM flights
+        WHERE date > date('now') AND available_seats >= 1 AND (source != ? OR destination != ? OR date != ?)
+        LIMIT 1
+    ''', (query['source'], query['destination'], query['date'])).fetchone()[0]
+
+    assert admin.post('/api/bookings', json={'flight_id': other, 'seats_booked': 1,
+                                             'passenger_names': 'A'}).status_code == 201
+
+    assert get(admin, '/api/flights/search', query, tag).status_code == 304
+
+
+def test_history_tag_follows_the_users_bookings(admin, route):
+    flight_id, _ = route
+    first = get(admin, '/api/bookings/history', {})
+    tag = first.headers['ETag']
+    assert get(admin, '/api/bookings/history', {}, tag).status_code == 304
+
+    booking_id = admin.post('/api/bookings', json={'flight_id': flight_id, 'seats_booked': 1,
+                                                   'passenger_names': 'A'}).get_json()['booking_id']
+
+    changed = get(admin, '/api/bookings/history', {}, tag)
+    assert changed.status_code == 200
+    assert changed.get_json()['bookings'][0]['booking_id'] == booking_id
+
+
+def test_new_flight_changes_the_admin_listing_tag(admin):
+    tag = get(admin, '/api/flights', {'limit': 5}).headers['ETag']
+    assert get(admin, '/api/flights', {'limit': 5}, tag).status_code == 304
+
+    assert admin.post('/api/flights', json={
+        'flight_number': 'ET100', 'source': 'Delhi', 'destination': 'Mumbai', 'date': '2099-05-01',
+        'departure_time': '07:00', 'arrival_time': '09:00', 'price': 4000, 'total_seats': 90,
+    }).status_code == 201
+
+    assert get(admin, '/api/flights', {'limit': 5}, tag).status_code == 200
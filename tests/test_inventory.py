@@ -0,0 +1,63 @@
+"""Seat inventory: concurrent reservations from separate connections never oversell"""
+import threading
+
+import pytest
+
+import db
+import inventory
+
+
+def test_concurrent_reservations_never_oversell(database, conn, flight_with_seats):
+    flight_id = flight_with_seats(10)
+    outcomes = []
+    barrier = threading.Barrier(8)
+
+    def reserve():
+        own = db.connect(database)
+        barrier.wait()
+        try:
+            for _ in range(5):
+                db.begin_immediate(own)
+                try:
+                    inventory.reserve_seats(own, flight_id, 1)
+                    own.commit()
+                    outcomes.append('booked')
+                except inventory.SoldOut:
+                    own.rollback()
+                    outcomes.append('sold out')
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count('booked') == 10
+    assert outcomes.count('sold out') == 30
+    assert conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0] == 0
+
+
+def test_reserve_reports_what_is_left(conn, flight_with_seats):
+    flight_id = flight_with_seats(3)
+    db.begin_immediate(conn)
+    with pytest.raises(inventory.SoldOut) as excinfo:
+        inventory.reserve_seats(conn, flight_id, 4)
+    conn.rollback()
+    assert excinfo.value.available == 3
+
+    db.begin_immediate(conn)
+    with pytest.raises(inventory.FlightNotFound):
+        inventory.reserve_seats(conn, 10 ** 9, 1)
+    conn.rollback()
+
+
+def test_release_never_exceeds_total_seats(conn, flight_with_seats):
+    flight_id = flight_with_seats(3)
+    total = conn.execute('SELECT total_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0]
+    db.begin_immediate(conn)
+    flight = inventory.release_seats(conn, flight_id, total)
+    conn.commit()
+    assert flight['available_seats'] == total
+    assert inventory.release_seats(conn, 10 ** 9, 1) is None
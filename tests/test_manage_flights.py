@@ -0,0 +1,39 @@
+"""POST /api/flights: the admin form's input is checked like a bulk-import row"""
+import pytest
+
+FLIGHT = {
+    'flight_number': 'TS100',
+    'source': 'Delhi',
+    'destination': 'Mumbai',
+    'date': '2099-01-15',
+    'departure_time': '08:00',
+    'arrival_time': '10:10',
+    'price': 4500,
+    'total_seats': 100,
+}
+
+
+def test_numbers_sent_as_strings_are_accepted(admin, conn):
+    response = admin.post('/api/flights', json=dict(FLIGHT, price='4500', total_seats='100'))
+    assert response.status_code == 201
+    row = conn.execute('SELECT price, total_seats, available_seats FROM flights WHERE flight_id = ?',
+                       (response.get_json()['flight_id'],)).fetchone()
+    assert tuple(row) == (4500.0, 100, 100)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('price', 'abc'),
+    ('price', 'nan'),
+    ('price', 'inf'),
+    ('price', -1),
+    ('total_seats', 0),
+    ('total_seats', 'many'),
+    ('date', 'tomorrow'),
+    ('flight_number', ''),
+])
+def test_bad_input_is_rejected_before_anything_is_written(admin, conn, field, value):
+    before = conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0]
+    response = admin.post('/api/flights', json=dict(FLIGHT, **{field: value}))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0] == before
@@ -0,0 +1,26 @@
+"""Password hashing pool: a dead hash worker is replaced, not leaked"""
+import os
+
+import pytest
+
+import passwords
+
+
+@pytest.mark.skipif(passwords.POOL_WORKERS <= 0, reason='hashing runs inline')
+def test_broken_pool_is_shut_down_and_replaced(database, monkeypatch):
+    broken = passwords.get_executor()
+    shutdowns = []
+    shutdown = broken.shutdown
+    monkeypatch.setattr(broken, 'shutdown', lambda **kwargs: (shutdowns.append(kwargs), shutdown(**kwargs)))
+
+    with pytest.raises(passwords.HashPoolBusy):
+        passwords._run(os._exit, 1)  # kills the hash worker
+
+    assert shutdowns == [{'wait': False, 'cancel_futures': True}]
+    assert passwords.get_executor() is not broken
+    assert passwords.verify_password(passwords.hash_password('secret'), 'secret')
+    # Every slot was handed back
+    slots = [passwords._slots.acquire() for _ in range(passwords.MAX_PENDING)]
+    assert None not in slots
+    for slot in slots:
+        passwords._slots.release(slot)
@@ -0,0 +1,81 @@
+"""The in-memory schedule snapshot answers exactly like the SQL search while writes interleave"""
+import random
+
+import pytest
+
+import bookings
+import db
+import holds
+import inventory
+import pricing
+import schedule_snapshot
+import search_engine
+from flight_utils import generate_flights
+
+USER_ID = 1  # the seeded admin
+
+
+def sql_search(conn, route):
+    source_id, destination_id, date = route
+    flights = search_engine.query_route(conn, [source_id], [destination_id], date)
+    # SQL orders by departure_time only; the snapshot also breaks ties by flight_id
+    return sorted(flights, key=lambda f: (f['departure_time'], f['flight_id']))
+
+
+def route_of(conn, flight_id):
+    return tuple(conn.execute('SELECT source_id, destination_id, date FROM flights WHERE flight_id = ?',
+                              (flight_id,)).fetchone())
+
+
+def write(conn, fn, *args):
+    db.begin_immediate(conn)
+    try:
+        result = fn(conn, *args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+@pytest.fixture
+def snapshot():
+    # A low merge threshold so the sorted region is rebuilt during the test, not only appended to
+    return schedule_snapshot.ScheduleSnapshot(merge_threshold=5)
+
+
+def test_snapshot_matches_sql_after_interleaved_writes(conn, snapshot):
+    rng = random.Random(7)
+    future = [row[0] for row in conn.execute("SELECT flight_id FROM flights WHERE date >= date('now')")]
+    routes = {route_of(conn, flight_id) for flight_id in rng.sample(future, 40)}
+
+    def check(touched=()):
+        for route in routes | {route_of(conn, flight_id) for flight_id in touched}:
+            assert snapshot.query_route(conn, [route[0]], [route[1]], route[2]) == sql_search(conn, route)
+
+    check()
+    for step in range(30):
+        flight_id = rng.choice(future)
+        action = step % 5
+        if action == 0:
+            write(conn, bookings.book, USER_ID, {'flight_id': flight_id, 'seats_booked': 1, 'passenger_names': 'Test'})
+        elif action == 1:
+            # Sell out: the flight must drop out of both results
+            available = conn.execute('SELECT available_seats FROM flights WHERE flight_id = ?',
+                                     (flight_id,)).fetchone()[0]
+            if available:
+                write(conn, inventory.reserve_seats, flight_id, available)
+        elif action == 2:
+            hold, _ = write(conn, holds.create_hold, USER_ID, flight_id, 1)
+            check([flight_id])
+            write(conn, holds.release_hold, hold['hold_id'], USER_ID)
+        elif action == 3:
+            pricing.reprice_all(conn)
+        else:
+            before = pricing.max_flight_id(conn)
+            assert generate_flights(conn, 20, seed=step, start_day=1, end_day=10)
+            added = [row[0] for row in conn.execute('SELECT flight_id FROM flights WHERE flight_id > ?', (before,))]
+            routes.update(route_of(conn, added_id) for added_id in added)
+        check([flight_id])
+
+    assert snapshot.stats()['flights'] > 0
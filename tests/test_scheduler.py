@@ -0,0 +1,71 @@
+"""Leader lease: renewed while jobs run, and a lost lease stops the tick"""
+import pytest
+
+import scheduler
+
+
+@pytest.fixture
+def renew_every_batch(monkeypatch):
+    monkeypatch.setattr(scheduler, 'RENEW_AFTER', 0)
+
+
+def expire_lease(conn):
+    with conn:
+        conn.execute('UPDATE scheduler_leases SET expires_at = 0')
+
+
+def lease_expiry(conn):
+    return conn.execute('SELECT expires_at FROM scheduler_leases').fetchone()[0]
+
+
+def test_long_job_renews_the_lease_between_batches(conn, renew_every_batch):
+    seen = []
+
+    def job(conn, between_batches):
+        for _ in range(3):
+            expire_lease(conn)  # as if each batch outlived the TTL
+            between_batches()
+            seen.append(lease_expiry(conn))
+        return 'done'
+
+    worker = scheduler.Scheduler(jobs=[('long', 0, job)])
+    assert scheduler.try_acquire_lease(conn, worker.owner)
+    results = worker.run_due(conn, keep_lease=lambda: worker.keep_lease(conn))
+
+    assert results == {'long': 'done'}
+    assert all(expiry > 0 for expiry in seen)
+    # Still ours: nobody else can take it
+    assert not scheduler.try_acquire_lease(conn, 'other-worker')
+
+
+def test_lost_lease_stops_the_job_and_the_tick(conn, renew_every_batch):
+    batches, later = [], []
+
+    def job(conn, between_batches):
+        for batch in range(3):
+            batches.append(batch)
+            if batch == 0:
+                expire_lease(conn)
+                assert scheduler.try_acquire_lease(conn, 'other-worker')
+            between_batches()
+
+    def later_job(conn, between_batches):
+        later.append(True)
+
+    worker = scheduler.Scheduler(jobs=[('long', 0, job), ('later', 0, later_job)])
+    assert scheduler.try_acquire_lease(conn, worker.owner)
+    results = worker.run_due(conn, keep_lease=lambda: worker.keep_lease(conn))
+
+    assert batches == [0]
+    assert later == []
+    assert results == {}
+    assert not worker.is_leader
+    assert conn.execute('SELECT owner FROM scheduler_leases').fetchone()[0] == 'other-worker'
+
+
+def test_real_jobs_accept_the_renewal_hook(conn):
+    calls = []
+    worker = scheduler.Scheduler()
+    results = worker.run_due(conn, force=True, keep_lease=lambda: calls.append(1))
+    assert not any(isinstance(result, Exception) for result in results.values()), results
+    assert len(calls) >= len(scheduler.JOBS)
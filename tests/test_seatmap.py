@@ -0,0 +1,75 @@
+"""Seat maps stay in step with flights.available_seats"""
+import base64
+
+import pytest
+
+import bookings
+import db
+import holds
+import seatmap
+
+USER_ID = 1  # the seeded admin
+
+
+def occupied(conn, flight_id):
+    return sum(bin(byte).count('1') for cabin in seatmap.get_seat_map(conn, flight_id).values()
+               for byte in base64.b64decode(cabin['occupied']))
+
+
+def sold(conn, flight_id):
+    total, available = conn.execute(
+        'SELECT total_seats, available_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()
+    return total - available
+
+
+def write(conn, fn, *args, **kwargs):
+    db.begin_immediate(conn)
+    try:
+        result = fn(conn, *args, **kwargs)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def a_flight(conn):
+    return conn.execute('''
+        SELECT flight_id FROM flights WHERE date > date('now') AND available_seats >= 10 LIMIT 1
+    ''').fetchone()[0]
+
+
+def test_seeded_flights_match_their_seat_counts(conn):
+    for (flight_id,) in conn.execute('SELECT flight_id FROM flights LIMIT 50').fetchall():
+        assert occupied(conn, flight_id) == sold(conn, flight_id)
+
+
+def test_bookings_and_holds_without_seat_numbers_take_seats(conn):
+    flight_id = a_flight(conn)
+
+    result, _ = write(conn, bookings.book, USER_ID, {'flight_id': flight_id, 'seats_booked': 3})
+    assert occupied(conn, flight_id) == sold(conn, flight_id)
+    seat_numbers = conn.execute('SELECT seat_numbers FROM bookings WHERE booking_id = ?',
+                                (result['booking_id'],)).fetchone()[0]
+    assert len(seatmap.parse_seat_numbers(seat_numbers)) == 3
+
+    hold, _ = write(conn, holds.create_hold, USER_ID, flight_id, 2, 'Business')
+    assert occupied(conn, flight_id) == sold(conn, flight_id)
+    write(conn, holds.release_hold, hold['hold_id'], USER_ID)
+    assert occupied(conn, flight_id) == sold(conn, flight_id)
+
+
+def test_full_cabin_is_refused_and_nothing_is_taken(conn):
+    flight_id = a_flight(conn)
+    _, _, first_class = seatmap.layout('First', conn.execute(
+        'SELECT total_seats FROM flights WHERE flight_id = ?', (flight_id,)).fetchone()[0])
+    free = first_class - sum(bin(byte).count('1') for byte in base64.b64decode(
+        seatmap.get_seat_map(conn, flight_id)['First']['occupied']))
+    before = sold(conn, flight_id)
+
+    with pytest.raises(bookings.BookingError) as excinfo:
+        write(conn, bookings.book, USER_ID, {'flight_id': flight_id, 'seats_booked': free + 1,
+                                             'booking_class': 'First'})
+    assert excinfo.value.status == 400
+    assert sold(conn, flight_id) == before
+    assert occupied(conn, flight_id) == before